@@ -0,0 +1,283 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmark harness
+
+    python -m benchmarks run [--count N] [--sizes 10,100,1000] [--output DIR]
+    python -m benchmarks compare BASELINE [CURRENT] [--threshold 0.1]
+
+run measures the checks against local stand-in servers and stores the results as
+DIR/COMMIT.json, compare reports the changes between two result files and fails if
+a benchmark got slower than THRESHOLD.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack, redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+from unittest import mock
+
+import fire
+import yaml
+
+from . import servers
+
+DEFAULT_OUTPUT = ".benchmarks"
+DEFAULT_SIZES = (10, 100, 1000)
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure(
+    function: Callable[[], object], count: int, ops: int = 1, warmup: bool = True
+) -> dict:
+    """
+    Call FUNCTION COUNT times and return the throughput in operations per second and
+    the latency percentiles in milliseconds, each call counts as OPS operations
+
+    With WARMUP the function is called once more before the measurement.
+    """
+    durations = []
+    with redirect_stdout(io.StringIO()):  # the checks print their results
+        if warmup:
+            function()
+        start = time.perf_counter()
+        for _ in range(count):
+            call_start = time.perf_counter()
+            function()
+            durations.append((time.perf_counter() - call_start) * 1000)
+        total = time.perf_counter() - start
+    durations.sort()
+    return {
+        "count": count,
+        "ops_per_second": count * ops / total,
+        "p50_ms": statistics.median(durations),
+        "p99_ms": durations[min(len(durations) - 1, int(len(durations) * 0.99))],
+    }
+
+
+class Benchmarks:
+    "Benchmarks of the connectivity checks against local stand-in servers"
+
+    def run(
+        self,
+        count: int = 50,
+        sizes: tuple[int, ...] = DEFAULT_SIZES,
+        output: str = DEFAULT_OUTPUT,
+    ) -> str:
+        """
+        Run all benchmarks and store the results
+
+        Run the single check benchmarks COUNT times and the batch and Datadog
+        benchmarks with SIZES checks or metrics. The results are written to
+        OUTPUT/COMMIT.json, return the path of the result file.
+        """
+        sizes = [sizes] if isinstance(sizes, int) else list(sizes)
+        with ExitStack() as stack:
+            state = stack.enter_context(tempfile.TemporaryDirectory())
+            stack.enter_context(mock.patch.dict(os.environ, XDG_STATE_HOME=state))
+            sink = stack.enter_context(servers.statsd_sink())
+            # must be set before the metrics pipeline is created
+            from connectivity_check import datadog
+
+            datadog.close_pipeline()
+            stack.enter_context(
+                mock.patch.dict(datadog.DD_OPTIONS, statsd_port=sink.port)
+            )
+            # the pipeline sends to the sink, close it before the sink
+            stack.callback(datadog.close_pipeline)
+            targets = {
+                "http": stack.enter_context(servers.http_server()),
+                "http_large": stack.enter_context(
+                    servers.http_server(body_size=1024 * 1024)
+                ),
+                "tls": stack.enter_context(servers.tls_server()),
+                "tcp": stack.enter_context(servers.tcp_sink()),
+            }
+            results = {}
+            results.update(self._single_checks(targets, count))
+            for size in sizes:
+                results.update(self._batch(targets, size, Path(state), count=3))
+                results.update(self._datadog(sink, size))
+
+        path = Path(output) / f"{_commit()}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(
+            json.dumps(
+                {
+                    "commit": _commit(),
+                    "date": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+        for name, result in results.items():
+            print(
+                f"{name:40} {result['ops_per_second']:10.1f} ops/s"
+                f" p50 {result['p50_ms']:8.2f} ms p99 {result['p99_ms']:8.2f} ms"
+            )
+        return str(path)
+
+    @staticmethod
+    def _single_checks(targets: dict, count: int) -> dict:
+        from connectivity_check import ConnectivityChecks
+
+        c = ConnectivityChecks()
+        http, http_large = targets["http"], targets["http_large"]
+        return {
+            "check_content": measure(
+                lambda: c.check_content(http + "/", "Lorem"), count
+            ),
+            "check_content_large_match": measure(
+                lambda: c.check_content(http_large + "/", "Lorem"), count
+            ),
+            "check_content_large_dump": measure(
+                lambda: c.check_content(http_large + "/"), max(1, count // 10)
+            ),
+            "check_cert": measure(
+                lambda: c.check_cert(targets["tls"], issuer="localhost"), count
+            ),
+            "check_cert_inventory": measure(
+                lambda: c.check_cert(targets["tls"], issuer="localhost", refresh=3600),
+                count,
+            ),
+            "check_latency": measure(
+                lambda: c.check_latency(targets["tcp"], 1000, runs=10, wait=0),
+                count,
+                ops=10,
+            ),
+            "check_latency_concurrent": measure(
+                lambda: c.check_latency(
+                    targets["tcp"], 1000, runs=10, wait=0, concurrency=10
+                ),
+                count,
+                ops=10,
+            ),
+        }
+
+    @staticmethod
+    def _batch(targets: dict, size: int, state: Path, count: int) -> dict:
+        from connectivity_check import ConnectivityChecks
+
+        def entry(i: int) -> dict:
+            # distinct URLs so that identical entries don't run only once
+            return [
+                {"content": {"target": f"{targets['http']}/{i}", "content": "Lorem"}},
+                {
+                    "latency": {
+                        "target": f"http://{targets['tcp']}/{i}",
+                        "latency": 1000,
+                        "runs": 1,
+                    }
+                },
+                {
+                    "cert": {
+                        "target": f"https://{targets['tls']}/{i}",
+                        "issuer": "localhost",
+                    }
+                },
+            ][i % 3]
+
+        config = {
+            "config": {"parallel": 10},
+            "checks": [entry(i) for i in range(size)],
+        }
+        config_file = state / f"batch-{size}.yaml"
+        config_file.write_text(yaml.safe_dump(config))
+
+        def batch():
+            ConnectivityChecks().checks(str(config_file))
+
+        # the first run compiles the plan
+        return {
+            f"checks_batch[{size}]_cold": measure(batch, 1, ops=size, warmup=False),
+            f"checks_batch[{size}]": measure(batch, count, ops=size),
+        }
+
+    @staticmethod
+    def _datadog(sink: servers.StatsdSink, size: int) -> dict:
+        from connectivity_check import ConnectivityChecks
+
+        c = ConnectivityChecks(datadog="benchmark")
+        c._update_config(datadog_verbose=False)
+
+        def submit():
+            for i in range(size):
+                c._datadog(f"target-{i}", "latency", {"average": i, "samples": [i]})
+            c._datadog_flush()
+
+        sink.reset()
+        result = measure(submit, 3, ops=size * 2)
+        sink.wait_idle()
+        result["datagrams"] = sink.datagrams
+        result["metrics"] = sink.metrics
+        return {f"datadog[{size}]": result}
+
+    def compare(self, baseline: str, current: str = None, threshold: float = 0.1):
+        """
+        Compare the throughput of two result files
+
+        CURRENT defaults to the newest result file next to BASELINE. Fail if a
+        benchmark has a THRESHOLD (ratio) lower throughput than in BASELINE.
+        """
+        if current is None:
+            files = sorted(Path(baseline).parent.glob("*.json"), key=os.path.getmtime)
+            current = str(files[-1])
+        old = json.loads(Path(baseline).read_text())
+        new = json.loads(Path(current).read_text())
+        regressions = []
+        print(f"{old['commit']} -> {new['commit']}")
+        for name, result in new["results"].items():
+            if name not in old["results"]:
+                print(f"{name:40} {result['ops_per_second']:10.1f} ops/s (new)")
+                continue
+            before = old["results"][name]["ops_per_second"]
+            change = result["ops_per_second"] / before - 1
+            regressed = change < -threshold
+            if regressed:
+                regressions.append(name)
+            print(
+                f"{name:40} {before:10.1f} -> {result['ops_per_second']:10.1f} ops/s"
+                f" {change:+7.1%}{' REGRESSION' if regressed else ''}"
+            )
+        if regressions:
+            raise SystemExit(f"{len(regressions)} benchmarks regressed")
+
+
+if __name__ == "__main__":
+    fire.Fire(Benchmarks)
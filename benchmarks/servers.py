@@ -0,0 +1,206 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Local loopback servers that stand in for the targets of the checks
+
+All servers run in daemon threads and are context managers that yield their address.
+"""
+
+from __future__ import annotations
+
+import socket
+import ssl
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        body = self.server.body
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # client stopped reading after a match
+
+    def log_message(self, *args):
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients close connections early on purpose
+
+
+@contextmanager
+def http_server(delay: float = 0, body_size: int = 1024):
+    """
+    HTTP server that answers every GET after DELAY seconds with a BODY_SIZE bytes body
+    that starts with "Lorem ipsum"
+
+    Yields the base URL
+    """
+    server = _HTTPServer(("127.0.0.1", 0), _Handler)
+    server.delay = delay
+    server.body = (b"Lorem ipsum " + b"x" * body_size)[:body_size]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _self_signed_certificate(directory: Path) -> tuple[Path, Path]:
+    "Write a self-signed certificate for localhost and its key, return their paths"
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=90))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+    cert_file, key_file = directory / "cert.pem", directory / "key.pem"
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return cert_file, key_file
+
+
+def _accept_loop(server: socket.socket, handle) -> None:
+    while True:
+        try:
+            conn, _ = server.accept()
+        except OSError:
+            return  # server closed
+        threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+
+@contextmanager
+def tls_server():
+    """
+    TLS server with a generated self-signed certificate for localhost that closes
+    every connection after the handshake
+
+    Yields the HOST:PORT target
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(*_self_signed_certificate(Path(directory)))
+
+    def handshake(conn: socket.socket) -> None:
+        try:
+            with context.wrap_socket(conn, server_side=True) as tls:
+                tls.recv(1)  # wait for the client to close
+        except OSError:
+            pass
+
+    with socket.create_server(("127.0.0.1", 0), backlog=128) as server:
+        threading.Thread(
+            target=_accept_loop, args=(server, handshake), daemon=True
+        ).start()
+        yield f"localhost:{server.getsockname()[1]}"
+
+
+@contextmanager
+def tcp_sink():
+    """
+    TCP server that accepts and closes connections
+
+    Yields the HOST:PORT target
+    """
+    with socket.create_server(("127.0.0.1", 0), backlog=1024) as server:
+        threading.Thread(
+            target=_accept_loop, args=(server, socket.socket.close), daemon=True
+        ).start()
+        yield f"127.0.0.1:{server.getsockname()[1]}"
+
+
+class StatsdSink:
+    "UDP server that counts the received StatsD datagrams and metric lines"
+
+    def __init__(self) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.datagrams = 0
+        self.metrics = 0
+
+    @property
+    def port(self) -> int:
+        return self.sock.getsockname()[1]
+
+    def reset(self) -> None:
+        self.datagrams = self.metrics = 0
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self.sock.recv(65535)
+            except OSError:
+                return  # sink closed
+            self.datagrams += 1
+            self.metrics += data.count(b"\n") + 1
+
+    def wait_idle(self, idle: float = 0.1) -> None:
+        "Wait until no datagram arrived for IDLE seconds"
+        while True:
+            datagrams = self.datagrams
+            time.sleep(idle)
+            if datagrams == self.datagrams:
+                return
+
+
+@contextmanager
+def statsd_sink():
+    "Yields a StatsdSink"
+    sink = StatsdSink()
+    threading.Thread(target=sink._receive, daemon=True).start()
+    try:
+        yield sink
+    finally:
+        sink.sock.close()
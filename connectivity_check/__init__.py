@@ -13,33 +13,69 @@
 # limitations under the License.
 
 from __future__ import annotations
+from importlib import import_module
+
 from box import Box
 
 
+class _LazyMember:
+    """
+    Import the implementation of a ConnectivityChecks member on first use
+
+    Keeps the CLI start-up fast as a single check loads only its own module and
+    third-party dependencies. The member replaces itself in the class upon first use.
+    """
+
+    def __init__(self, module: str) -> None:
+        self.module = module
+
+    def __set_name__(self, owner, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance, owner):
+        member = getattr(import_module(self.module, __package__), self.name)
+        setattr(owner, self.name, member)
+        return member.__get__(instance, owner)
+
+
 class ConnectivityChecks(object):
     """
     Run various network and HTTP connectivity checks
 
     Run given command for single check.
     Use checks command with YAML file for batch mode.
+    Use serve command with YAML file to run the checks periodically.
+    Use history command to show the results recorded with --record_history.
 
     --datadog PREFIX        Enable DogstatsD mode (UDP localhost:8125) and set prefix for metrics reporting
+    --record_history        Record the check results in the local history
 
     """
 
-    from .check_cert import check_cert
-    from .check_content import check_content
-    from .check_routing import check_routing
-    from .check_latency import check_latency
-    from .check_speed_ookla import check_speed_ookla
-    from .check_speed_cloudflare import check_speed_cloudflare
-    from .checks import checks
+    check_cert = _LazyMember(".check_cert")
+    check_content = _LazyMember(".check_content")
+    check_https = _LazyMember(".check_https")
+    check_routing = _LazyMember(".check_routing")
+    check_latency = _LazyMember(".check_latency")
+    check_speed_ookla = _LazyMember(".check_speed_ookla")
+    check_speed_cloudflare = _LazyMember(".check_speed_cloudflare")
+    checks = _LazyMember(".checks")
+    serve = _LazyMember(".serve")
+    history = _LazyMember(".history")
 
-    from .datadog import _datadog
+    _datadog = _LazyMember(".datadog")
+    _datadog_flush = _LazyMember(".datadog")
+    _record_history = _LazyMember(".history")
+    _http_get = _LazyMember(".session")
+    _http_summary = _LazyMember(".session")
 
     def _update_config(self, **kwargs):
         self._config.update(kwargs)
 
-    def __init__(self, datadog: str = None) -> ConnectivityChecks:
+    def __init__(
+        self, datadog: str = None, record_history: bool = False
+    ) -> ConnectivityChecks:
         self._config = Box()
         self._update_config(datadog=datadog)
+        if record_history:
+            self._update_config(history=True)
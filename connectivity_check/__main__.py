@@ -15,7 +15,8 @@
 import traceback
 import fire
 
-from .exceptions import *
+from . import exceptions
+from .exceptions import ConnectivityCheckException
 
 from . import ConnectivityChecks
 
@@ -27,9 +28,9 @@ def cli():
         raise SystemExit("ABORTED")
     except (
         ConnectivityCheckException,
-        SSLCertVerificationError,
-        MissingSchema,
-        SSLError,
+        exceptions.SSLCertVerificationError,
+        exceptions.MissingSchema,
+        exceptions.SSLError,
         TimeoutError,
         FileNotFoundError,
     ) as e:
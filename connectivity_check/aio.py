@@ -0,0 +1,422 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio variants of the connectivity checks
+
+The functions take a ConnectivityChecks instance as first argument, just like the
+methods of that class, and can be used to embed the checks into asyncio applications:
+
+    from connectivity_check import ConnectivityChecks
+    from connectivity_check import aio
+
+    results = await aio.run_checks(ConnectivityChecks(datadog="prefix"), "checks.yaml")
+"""
+
+import asyncio
+import socket
+import ssl
+import time
+from typing import Coroutine
+
+import httpx
+
+from .exceptions import ConnectivityCheckException
+from .check_cert import (
+    _split_target as _split_cert_target,
+    _refresh,
+    _cached_cert_details,
+    _parse_cert,
+    _check_cert_result,
+)
+from .check_content import (
+    CHUNK_SIZE,
+    ContentMatcher,
+    _check_content_result,
+    _check_phase_names,
+)
+from .check_latency import (
+    _split_target as _split_latency_target,
+    _statistic,
+    _check_latency_result,
+)
+from .checks import _load_config
+from .deadline import ISOLATED_CHECKS, BatchDeadline, DeadlineExceeded, _run_isolated
+from .history import recording
+from .profiling import elapsed
+from .resolver import getaddress, gethostbyname
+from .run_metrics import report_batch, report_run
+from .session import PHASES, finish_phases
+from .tcp import ConnectSample, describe, kernel_rtt
+
+DEFAULT_PARALLEL = 100
+
+
+async def _gethostbyname(host: str, cache: bool) -> str:
+    "Resolve HOST via the shared resolver cache without blocking the event loop"
+    return await asyncio.get_running_loop().run_in_executor(
+        None, gethostbyname, host, cache
+    )
+
+
+async def _getaddress(host: str, cache: bool) -> str:
+    "asyncio variant of resolver.getaddress, IPv6 addresses included"
+    return await asyncio.get_running_loop().run_in_executor(
+        None, getaddress, host, cache
+    )
+
+
+async def check_cert(
+    self,
+    target: str,
+    issuer: str = None,
+    validity: int = 5,
+    timeout=10,
+    dns_cache: bool = True,
+    refresh: float = None,
+) -> str:
+    "asyncio variant of ConnectivityChecks.check_cert"
+    host, port = _split_cert_target(target)
+    refresh = _refresh(self, refresh)
+    cert_details = _cached_cert_details(self, host, port, validity, refresh)
+    if cert_details:
+        return _check_cert_result(self, host, port, cert_details, issuer, validity)
+
+    # ignore SSL errors, we always want to fetch the details
+    context = ssl._create_unverified_context()
+    ip = await _getaddress(host, dns_cache)
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(ip, port, ssl=context, server_hostname=host),
+        timeout,
+    )
+    try:
+        der_cert = writer.get_extra_info("ssl_object").getpeercert(True)
+    finally:
+        writer.close()
+
+    cert_details = _parse_cert(self, host, port, der_cert, refresh)
+    return _check_cert_result(self, host, port, cert_details, issuer, validity)
+
+
+def _http_client(self, ca: str = None) -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client for the CA bundle, httpx binds the certificate
+    verification to the client and not to the request
+    """
+    if getattr(self, "_http_clients", None) is None:
+        self._http_clients = {}
+    if ca not in self._http_clients:
+        self._http_clients[ca] = httpx.AsyncClient(
+            verify=ca if ca else True, follow_redirects=True
+        )
+    return self._http_clients[ca]
+
+
+async def close_http_clients(self):
+    "Close the HTTP clients opened by check_content"
+    clients, self._http_clients = getattr(self, "_http_clients", None), None
+    for client in (clients or {}).values():
+        await client.aclose()
+
+
+def _dump_response(response: httpx.Response) -> str:
+    "Dump request and response like requests_toolbelt.utils.dump.dump_all"
+    request = response.request
+    lines = [f"< {request.method} {request.url.raw_path.decode()} HTTP/1.1"]
+    lines += [f"< {key}: {value}" for key, value in request.headers.items()]
+    lines += ["<", f"> {response.http_version} {response.status_code}"]
+    lines += [f"> {key}: {value}" for key, value in response.headers.items()]
+    lines += [">", response.text]
+    return "\r\n".join(lines)
+
+
+async def check_content(
+    self,
+    target: str,
+    content: str = None,
+    ca: str = None,
+    timeout=10,
+    max_bytes: int = None,
+    phases: dict = None,
+) -> str:
+    """
+    asyncio variant of ConnectivityChecks.check_content, the name resolution is part
+    of the connect phase
+    """
+    _check_phase_names(phases)
+    events = {}
+
+    async def trace(event: str, info: dict):
+        events[event] = time.perf_counter_ns()
+
+    start = time.perf_counter_ns()
+    async with _http_client(self, ca).stream(
+        "GET", target, timeout=timeout, extensions={"trace": trace}
+    ) as response:
+        headers = time.perf_counter_ns()
+        if not content:
+            await response.aread()
+            return _dump_response(response)
+
+        timing = dict.fromkeys(PHASES, 0.0)
+        for phase, step in (("connect", "connect_tcp"), ("tls", "start_tls")):
+            if f"connection.{step}.complete" in events:
+                timing[phase] = elapsed(
+                    events[f"connection.{step}.started"],
+                    events[f"connection.{step}.complete"],
+                )
+        timing["ttfb"] = elapsed(start, headers) - timing["connect"] - timing["tls"]
+        matcher = ContentMatcher(str(content), max_bytes, response.encoding)
+        async for chunk in response.aiter_bytes(CHUNK_SIZE):
+            if matcher.feed(chunk):
+                break
+        else:
+            matcher.finish()
+    finish_phases(timing, headers)
+
+    return _check_content_result(self, target, matcher, timing, phases)
+
+
+async def _probe(address: tuple[str, int], timeout: float) -> ConnectSample | None:
+    "Return the timing of a TCP connection or None if the connection failed"
+    loop = asyncio.get_running_loop()
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setblocking(False)
+        start = time.perf_counter_ns()
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+        except (OSError, asyncio.TimeoutError):
+            return None
+        elapsed = time.perf_counter_ns() - start
+        return ConnectSample(elapsed / 1e6, *kernel_rtt(sock))
+
+
+async def _measure_latency(
+    host: str,
+    port: int,
+    timeout: float,
+    runs: int,
+    wait: float,
+    verbose: bool,
+    dns_cache: bool,
+    concurrency: int = 1,
+) -> list[ConnectSample | None]:
+    """
+    Time TCP connections with non-blocking sockets, None for failed connections
+
+    Resolves the host name only once. With CONCURRENCY above 1 the connections are
+    made concurrently without waiting.
+    """
+    try:
+        address = (await _gethostbyname(host, dns_cache), port)
+    except socket.gaierror:
+        return []
+
+    if concurrency > 1:
+        limit = asyncio.Semaphore(concurrency)
+
+        async def limited_probe():
+            async with limit:
+                return await _probe(address, timeout)
+
+        samples = await asyncio.gather(*(limited_probe() for _ in range(runs)))
+    else:
+        samples = []
+        for run in range(runs):
+            if run > 0:
+                await asyncio.sleep(wait)
+            samples.append(await _probe(address, timeout))
+    if verbose:
+        for seq, sample in enumerate(samples):
+            print(f"Connection to {host}:{port} seq={seq} {describe(sample)}")
+    return samples
+
+
+async def check_latency(
+    self,
+    target: str,
+    latency: int,
+    timeout: float = 5,
+    runs: int = 3,
+    wait: float = 1,
+    verbose: bool = False,
+    dns_cache: bool = True,
+    concurrency: int = 1,
+    statistic: str = "average",
+    percentile: float = None,
+    max_loss: float = None,
+    kernel_rtt: bool = False,
+) -> str:
+    "asyncio variant of ConnectivityChecks.check_latency"
+    target, host, port = _split_latency_target(target)
+    statistic = _statistic(statistic, percentile)
+
+    samples = await _measure_latency(
+        host, port, timeout, runs, wait, verbose, dns_cache, concurrency
+    )
+    measures = [sample.value(kernel_rtt) for sample in samples if sample is not None]
+
+    return _check_latency_result(
+        self, target, host, port, latency, measures, runs, statistic, max_loss
+    )
+
+
+async def check_routing(self, *args, **kwargs) -> str:
+    "asyncio variant of ConnectivityChecks.check_routing, route lookups are local kernel calls"
+    return await asyncio.to_thread(self.check_routing, *args, **kwargs)
+
+
+async def check_https(self, *args, **kwargs) -> str:
+    "asyncio variant of ConnectivityChecks.check_https, runs in a worker thread"
+    return await asyncio.to_thread(self.check_https, *args, **kwargs)
+
+
+async def check_speed_ookla(self, *args, **kwargs):
+    "asyncio variant of ConnectivityChecks.check_speed_ookla, runs in a worker thread"
+    return await asyncio.to_thread(self.check_speed_ookla, *args, **kwargs)
+
+
+async def check_speed_cloudflare(self, *args, **kwargs) -> str:
+    "asyncio variant of ConnectivityChecks.check_speed_cloudflare, runs in a worker thread"
+    return await asyncio.to_thread(self.check_speed_cloudflare, *args, **kwargs)
+
+
+ASYNC_CHECKS = {
+    "cert": check_cert,
+    "content": check_content,
+    "https": check_https,
+    "latency": check_latency,
+    "routing": check_routing,
+    "speed_ookla": check_speed_ookla,
+    "speed_cloudflare": check_speed_cloudflare,
+}
+
+
+async def _with_deadline(
+    self, check: str, kwargs: dict, coroutine: Coroutine, deadline: float
+):
+    """
+    Await the check COROUTINE, fail at the DEADLINE
+
+    The speed tests run in a worker process instead that is killed at the DEADLINE.
+    """
+    if check in ISOLATED_CHECKS:
+        coroutine.close()
+        return await asyncio.to_thread(
+            _run_isolated, self, f"check_{check}", kwargs, deadline
+        )
+    start = time.monotonic()
+    try:
+        return await asyncio.wait_for(coroutine, deadline)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(
+            f"check_{check} exceeded its deadline of {deadline:.1f}s after {time.monotonic() - start:.1f}s"
+        )
+
+
+async def _run_check(
+    self,
+    check: str,
+    kwargs: dict,
+    limit: asyncio.Semaphore,
+    deadline: float | None,
+    batch: BatchDeadline,
+):
+    async with limit:
+        start = time.perf_counter_ns()
+        try:
+            deadline = batch.remaining(deadline)
+            coroutine = ASYNC_CHECKS[check](self, **kwargs)
+        except TypeError as e:
+            raise ConnectivityCheckException(
+                f"Error in check parameters: {e}\nProblematic parameter block: {kwargs}\nUse check_{check} --help for details"
+            )
+        except DeadlineExceeded:
+            report_run(self, check, kwargs, start, timeout=True)
+            raise
+        if deadline is not None:
+            coroutine = _with_deadline(self, check, kwargs, coroutine, deadline)
+        timeout = False
+        try:
+            with recording(self, check, kwargs):
+                return await coroutine
+        except DeadlineExceeded:
+            timeout = True
+            raise
+        except ConnectivityCheckException:
+            raise
+        except Exception as e:
+            raise ConnectivityCheckException(str(e))
+        finally:
+            # the CPU time of a coroutine is not known, it shares the thread
+            report_run(self, check, kwargs, start, timeout=timeout)
+
+
+async def run_checks(
+    self, config: str, all: bool = False, parallel: int = None
+) -> list[tuple[str, str | ConnectivityCheckException]]:
+    """
+    Run all checks in config file concurrently
+
+    Return a list of (description, result) tuples in config order, the result is the
+    ConnectivityCheckException for failed checks. Raise the first failure and cancel
+    the remaining checks unless ALL is set.
+
+    Run up to PARALLEL checks at the same time, default is the parallel setting from
+    the config file or 100.
+
+    Checks fail when they exceed their deadline or the batch_deadline from the config
+    file.
+    """
+    start = time.perf_counter_ns()
+    checks_to_run = _load_config(self, config)
+    if parallel is None:
+        parallel = self._config.get("parallel", DEFAULT_PARALLEL)
+    limit = asyncio.Semaphore(parallel)
+    batch = BatchDeadline(self._config.get("batch_deadline"))
+    setup = time.perf_counter_ns()
+
+    tasks = [
+        asyncio.create_task(
+            _run_check(
+                self,
+                check,
+                kwargs,
+                limit,
+                options.get("deadline", self._config.get("deadline")),
+                batch,
+            )
+        )
+        for check, kwargs, options in checks_to_run
+    ]
+    results = []
+    ran = 0
+    try:
+        for planned, task in zip(checks_to_run, tasks):
+            description = planned.description
+            ran = len(results) + 1
+            try:
+                results.append((description, await task))
+            except ConnectivityCheckException as e:
+                if not all:
+                    raise
+                results.append((description, e))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_http_clients(self)
+        succeeded = sum(not isinstance(result, Exception) for _, result in results)
+        report_batch(self, config, start, setup, ran, ran - succeeded)
+    return results
@@ -0,0 +1,120 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certs (
+    host TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    issuer TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    alt_names TEXT NOT NULL,
+    not_valid_before TEXT NOT NULL,
+    not_valid_after TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (host, port)
+);
+CREATE INDEX IF NOT EXISTS certs_expiry ON certs (not_valid_after);
+"""
+
+FIELDS = (
+    "fingerprint",
+    "issuer",
+    "subject",
+    "alt_names",
+    "not_valid_before",
+    "not_valid_after",
+    "fetched_at",
+)
+
+
+class CertStore:
+    """
+    SQLite inventory of the certificates fetched by check_cert, keyed by host and port
+
+    Stores the certificate details with the SHA-256 fingerprint and the fetch time,
+    the expiry index allows to list the certificates that expire next.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            self._db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def get(self, host: str, port: int) -> dict | None:
+        "Return the stored fields of the certificate of HOST:PORT or None"
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(FIELDS)} FROM certs WHERE host = ? AND port = ?",
+                (host, port),
+            ).fetchone()
+        if row is None:
+            return None
+        fields = dict(zip(FIELDS, row))
+        fields["alt_names"] = json.loads(fields["alt_names"])
+        for key in ("not_valid_before", "not_valid_after"):
+            fields[key] = datetime.fromisoformat(fields[key])
+        return fields
+
+    def put(
+        self,
+        host: str,
+        port: int,
+        fingerprint: str,
+        issuer: str,
+        subject: str,
+        alt_names: list[str],
+        not_valid_before: datetime,
+        not_valid_after: datetime,
+        fetched_at: float,
+    ) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO certs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    host,
+                    port,
+                    fingerprint,
+                    issuer,
+                    subject,
+                    json.dumps(alt_names),
+                    not_valid_before.isoformat(),
+                    not_valid_after.isoformat(),
+                    fetched_at,
+                ),
+            )
+
+    def expiring(self, before: datetime) -> list[tuple[str, int, datetime]]:
+        "Return (host, port, expiry) of the certificates that expire BEFORE, soonest first"
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT host, port, not_valid_after FROM certs"
+                " WHERE not_valid_after < ? ORDER BY not_valid_after",
+                (before.isoformat(),),
+            ).fetchall()
+        return [
+            (host, port, datetime.fromisoformat(expiry)) for host, port, expiry in rows
+        ]
@@ -12,15 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
+from __future__ import annotations
+
 import ssl
 import socket
+import threading
 from datetime import datetime
 
 from cryptography import x509
+from cryptography.hazmat.primitives import hashes
 from urllib.parse import urlparse
 
+from .cert_store import CertStore
 from .exceptions import ConnectivityCheckException
+from .plan import compile_pattern, shared_step
+from .profiling import span
+from .resolver import getaddress
+from .state import state_dir
+
+__store_lock = threading.Lock()
 
 
 class CertDetails:
@@ -32,15 +42,37 @@ class CertDetails:
         ).value.get_values_for_type(x509.DNSName)
         self.not_valid_before = cert.not_valid_before
         self.not_valid_after = cert.not_valid_after
+        self.fingerprint = cert.fingerprint(hashes.SHA256()).hex()
         self.validity = (self.not_valid_after - datetime.now()).days
 
+    @classmethod
+    def from_fields(cls, fields: dict) -> CertDetails:
+        "Restore the details of a certificate from the certificate inventory"
+        cert_details = cls.__new__(cls)
+        cert_details.issuer = fields["issuer"]
+        cert_details.subject = fields["subject"]
+        cert_details.altNames = fields["alt_names"]
+        cert_details.not_valid_before = fields["not_valid_before"]
+        cert_details.not_valid_after = fields["not_valid_after"]
+        cert_details.fingerprint = fields["fingerprint"]
+        cert_details.validity = (cert_details.not_valid_after - datetime.now()).days
+        return cert_details
+
     def __str__(self) -> str:
         return f"Certificate {self.subject}\n  issued by {self.issuer}\n  alt names {', '.join(self.altNames)}\n  expires in {self.validity} days at {self.not_valid_after}"
 
     __repr__ = __str__
 
 
-def check_cert(self, target: str, issuer: str = None, validity: int = 5, timeout=10):
+def check_cert(
+    self,
+    target: str,
+    issuer: str = None,
+    validity: int = 5,
+    timeout=10,
+    dns_cache: bool = True,
+    refresh: float = None,
+):
     """
     Check the certificate issuer
 
@@ -53,8 +85,47 @@ def check_cert(self, target: str, issuer: str = None, validity: int = 5, timeout
 
     Accepts also HTTPS URLs.
     Will ignore most TLS certificate errors to retrieve more certificates.
+
+    Use --nodns_cache to resolve the host name without the shared DNS cache.
+
+    Set REFRESH to reuse the certificate from the certificate inventory in the state
+    directory for up to REFRESH seconds. Certificates that expire within VALIDITY days
+    are always fetched again. Default is the cert_refresh config setting or 0.
     """
 
+    host, port = _split_target(target)
+    refresh = _refresh(self, refresh)
+    cert_details = _cached_cert_details(self, host, port, validity, refresh)
+    if cert_details:
+        return _check_cert_result(self, host, port, cert_details, issuer, validity)
+
+    # checks of the same batch share the certificate
+    der_cert = shared_step(
+        self,
+        ("certificate", host, port),
+        lambda: _fetch_cert(host, port, timeout, dns_cache),
+    )
+    cert_details = _parse_cert(self, host, port, der_cert, refresh)
+    return _check_cert_result(self, host, port, cert_details, issuer, validity)
+
+
+def _fetch_cert(host: str, port: int, timeout: float, dns_cache: bool) -> bytes:
+    "Return the DER certificate of HOST:PORT"
+    # ignore SSL errors, we always want to fetch the details
+    context = ssl._create_unverified_context()
+    # the timeout applies to the connection and the TLS handshake
+    ip = getaddress(host, dns_cache)
+    with span("connect", host=host, port=port):
+        conn = socket.create_connection((ip, port), timeout=timeout)
+    with span("handshake", host=host, port=port):
+        sock = context.wrap_socket(conn, server_hostname=host)
+    try:
+        return sock.getpeercert(True)
+    finally:
+        sock.close()
+
+
+def _split_target(target: str) -> tuple[str, int]:
     url = urlparse(target)  # try to decode arg as URL
     if url.scheme == "https" and url.netloc:
         target = url.netloc
@@ -65,23 +136,65 @@ def check_cert(self, target: str, issuer: str = None, validity: int = 5, timeout
     except:
         host = target
         port = 443
+    return host, port
+
+
+def _refresh(self, refresh: float = None) -> float:
+    return self._config.get("cert_refresh", 0) if refresh is None else refresh
+
+
+def _cert_store(self) -> CertStore:
+    "Return the certificate inventory of this instance"
+    with __store_lock:
+        if getattr(self, "_cert_inventory", None) is None:
+            self._cert_inventory = CertStore(state_dir(self) / "certs.sqlite")
+        return self._cert_inventory
+
+
+def _cached_cert_details(
+    self, host: str, port: int, validity: int, refresh: float
+) -> CertDetails | None:
+    "Return the details from the inventory if they are younger than REFRESH seconds"
+    if not refresh:
+        return None
+    fields = _cert_store(self).get(host, port)
+    if fields is None or datetime.now().timestamp() - fields["fetched_at"] >= refresh:
+        return None
+    cert_details = CertDetails.from_fields(fields)
+    # fetch certificates close to expiry again, they might have been renewed
+    if cert_details.validity <= validity:
+        return None
+    return cert_details
+
+
+def _parse_cert(
+    self, host: str, port: int, der_cert: bytes, refresh: float
+) -> CertDetails:
+    "Parse the certificate and add it to the inventory if REFRESH is set"
+    with span("parse", host=host, port=port):
+        cert_details = CertDetails(x509.load_der_x509_certificate(der_cert))
+    if refresh:
+        _cert_store(self).put(
+            host,
+            port,
+            fingerprint=cert_details.fingerprint,
+            issuer=cert_details.issuer,
+            subject=cert_details.subject,
+            alt_names=cert_details.altNames,
+            not_valid_before=cert_details.not_valid_before,
+            not_valid_after=cert_details.not_valid_after,
+            fetched_at=datetime.now().timestamp(),
+        )
+    return cert_details
 
-    # ignore SSL errors, we always want to fetch the details
-    context = ssl._create_unverified_context()
-    conn = socket.create_connection((host, port))
-    sock = context.wrap_socket(conn, server_hostname=host)
-    sock.settimeout(timeout)
-    try:
-        der_cert = sock.getpeercert(True)
-    finally:
-        sock.close()
 
-    cert = x509.load_der_x509_certificate(der_cert)
-    cert_details = CertDetails(cert)
+def _check_cert_result(
+    self, host: str, port: int, cert_details: CertDetails, issuer: str, validity: int
+) -> str:
     if issuer:
         issuer = str(issuer)
         check_result_issuer = (
-            re.search(issuer, cert_details.issuer, re.IGNORECASE) is not None
+            compile_pattern(issuer).search(cert_details.issuer) is not None
         )
         check_result_validity = cert_details.validity >= validity
         check_result = check_result_issuer and check_result_validity
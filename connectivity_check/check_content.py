@@ -12,16 +12,104 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
+import codecs
 import re
+import time
 
 import requests
-from requests_toolbelt.utils import dump
 
 from .exceptions import ConnectivityCheckException
+from .plan import compile_pattern
+from .resolver import caching
+from .session import PHASES, finish_phases
+
+CHUNK_SIZE = 16384
+# characters after a match that decide \b, \B, $ and \Z at its end
+LOOKAHEAD = 2
+
+
+class ContentMatcher:
+    """
+    Match a regex against a response body that arrives in chunks
+
+    Matches may span chunk boundaries. The text is searched again whenever it has
+    doubled since the last search, which keeps the search time linear in the body size
+    and stops reading soon after the first match. Reading stops after MAX_BYTES.
+
+    Before the end of the body only matches followed by LOOKAHEAD more characters are
+    accepted, as the following text can still decide them. Patterns with lookahead
+    assertions are matched against the complete body.
+    """
+
+    def __init__(self, content: str, max_bytes: int = None, encoding: str = None):
+        self.content = content
+        self.max_bytes = max_bytes
+        self.matched = False
+        self.truncated = False
+        self.size = 0
+        self._pattern = compile_pattern(content)
+        self._early = re.search(r"\(\?[=!]", content) is None
+        self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(
+            errors="replace"
+        )
+        self._parts: list[str] = []
+        self._length = 0
+        self._searched = 0
+
+    @property
+    def text(self) -> str:
+        "The body text read so far"
+        return "".join(self._parts)
+
+    def _add(self, text: str) -> None:
+        self._parts.append(text)
+        self._length += len(text)
+
+    def _search(self, final: bool = False) -> None:
+        text = self.text
+        self._parts = [text]
+        self._searched = len(text)
+        if final:
+            self.matched = self._pattern.search(text) is not None
+        elif self._early:
+            end = len(text) - LOOKAHEAD
+            match = self._pattern.search(text)
+            while match and match.end() > end:
+                match = self._pattern.search(text, match.start() + 1)
+            self.matched = match is not None
+
+    def feed(self, chunk: bytes) -> bool:
+        "Add the next CHUNK of the body, return whether reading can stop"
+        if self.max_bytes is not None and len(chunk) > self.max_bytes - self.size:
+            chunk = chunk[: self.max_bytes - self.size]
+            self.truncated = True
+        self.size += len(chunk)
+        self._add(self._decoder.decode(chunk))
+        if self.truncated:
+            # the body ends here
+            self._search(final=True)
+        elif self._length >= 2 * self._searched:
+            self._search()
+        return self.matched or self.truncated
+
+    def finish(self) -> None:
+        "Search the complete body unless it already matched"
+        self._add(self._decoder.decode(b"", final=True))
+        if not self.matched:
+            self._search(final=True)
 
 
 def check_content(
-    self, target: str, content: str = None, ca: str = None, timeout=10
+    self,
+    target: str,
+    content: str = None,
+    ca: str = None,
+    timeout=10,
+    dns_cache: bool = True,
+    max_bytes: int = None,
+    phases: dict = None,
 ) -> str:
     """
     Check the content of remote location
@@ -29,24 +117,90 @@ def check_content(
     Check the content found at given TARGET against CONTENT regex or plain string.
     Show request details and content without validation pattern.
 
+    The body is read until CONTENT matches, the connection is closed if the rest of
+    the body is not read. Use --max_bytes to read at most MAX_BYTES of the body.
+
     Will validate also certificates for HTTPS TARGET, using the system key store.
 
     Use --ca parameter to load custom CA certificates bundle (PEM) or specify a CA
     certificates directory to lookup certificates by hash.
+
+    Connections are kept open and reused by following content checks.
+    Use --nodns_cache to resolve the host name without the shared DNS cache.
+
+    The time of the request phases dns, connect, tls, ttfb (time to first byte),
+    transfer (of the body until CONTENT matches) and total is reported in ms. Set
+    PHASES to a mapping of phase to maximum ms to fail slower requests.
     """
-    response = requests.get(target, timeout=timeout, verify=ca if ca else True)
-
-    request_dump = dump.dump_all(response).decode(response.encoding)
-    if content:
-        content = str(content)
-        check_result = re.search(content, response.text, re.IGNORECASE) is not None
-        self._datadog(target=target, check="content", values=check_result)
-        if check_result:
-            return f"Content from {target} matches »{content}«"
+    _check_phase_names(phases)
+    with caching(dns_cache):
+        response, reused = self._http_get(
+            target, stream=bool(content), timeout=timeout, verify=ca if ca else True
+        )
+    if not content:
+        return _dump_response(response)
+
+    with response:
+        matcher = ContentMatcher(str(content), max_bytes, response.encoding)
+        headers = time.perf_counter_ns()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if matcher.feed(chunk):
+                break
         else:
-            raise ConnectivityCheckException(
-                f"Content from {target} fails content match »{content}«\n\n"
-                + response.text
-            )
-    else:
-        return request_dump
+            matcher.finish()
+    finish_phases(response.phases, headers)
+
+    return _check_content_result(self, target, matcher, response.phases, phases, reused)
+
+
+def _check_phase_names(thresholds: dict | None) -> None:
+    unknown = set(thresholds or ()) - set(PHASES)
+    if unknown:
+        raise ConnectivityCheckException(
+            f"Unknown phases {', '.join(sorted(unknown))}, use {', '.join(PHASES)}"
+        )
+
+
+def _describe_phases(timing: dict) -> str:
+    return ", ".join(f"{phase} {timing[phase]:.1f} ms" for phase in PHASES)
+
+
+def _dump_response(response: requests.Response) -> str:
+    # lazy-load requests_toolbelt as the dump is only needed without content pattern
+    from requests_toolbelt.utils import dump
+
+    return dump.dump_all(response).decode(response.encoding)
+
+
+def _check_content_result(
+    self,
+    target: str,
+    matcher: ContentMatcher,
+    timing: dict,
+    thresholds: dict = None,
+    reused: bool = False,
+) -> str:
+    content = matcher.content
+    self._datadog(target=target, check="content", values=matcher.matched)
+    self._datadog(target=target, check="content", values=timing)
+    if not matcher.matched:
+        raise ConnectivityCheckException(
+            f"Content from {target} fails content match »{content}«"
+            + (f" in the first {matcher.max_bytes} bytes" if matcher.truncated else "")
+            + "\n\n"
+            + matcher.text
+        )
+    slow = [
+        f"{phase} {timing[phase]:.1f} ms ({limit})"
+        for phase, limit in (thresholds or {}).items()
+        if timing[phase] > limit
+    ]
+    if slow:
+        raise ConnectivityCheckException(
+            f"Content from {target} matches »{content}« but exceeds the phase thresholds "
+            + ", ".join(slow)
+            + f"\n{_describe_phases(timing)}"
+        )
+    return f"Content from {target} matches »{content}«" + (
+        " (reused connection)" if reused else ""
+    )
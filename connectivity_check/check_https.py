@@ -0,0 +1,215 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import http.client
+import os
+import socket
+import ssl
+import time
+from urllib.parse import urlparse
+
+from .check_cert import _fetch_cert, _parse_cert, _refresh
+from .check_content import CHUNK_SIZE, ContentMatcher
+from .exceptions import ConnectivityCheckException
+from .plan import compile_pattern, shared_step
+from .profiling import elapsed, span
+from .resolver import getaddress
+
+
+def check_https(
+    self,
+    target: str,
+    content: str = None,
+    issuer: str = None,
+    validity: int = 5,
+    latency: float = None,
+    ca: str = None,
+    timeout=10,
+    dns_cache: bool = True,
+    max_bytes: int = None,
+):
+    """
+    Check certificate, content and latency of an HTTPS URL with a single connection
+
+    Connect to the TARGET URL, time the TCP connect and the TLS handshake, take the
+    certificate of the handshake and GET the URL on the same connection.
+
+    Check the certificate issuer against ISSUER regex or plain string and its
+    expiration against VALIDITY days, the body against CONTENT regex or plain string
+    (read at most MAX_BYTES) and the TCP connect time against LATENCY (ms). Without
+    ISSUER, CONTENT and LATENCY only the details are shown.
+
+    Will validate the certificate using the system key store or the CA bundle (PEM) or
+    directory given by CA. Use --nodns_cache to resolve the host name without the
+    shared DNS cache. Certificates that fail the verification are fetched again
+    without verification to show their details, like cert checks of the same batch
+    this fetch is shared. The timed connection itself is never shared.
+    """
+    url = urlparse(target)
+    if url.scheme != "https" or not url.hostname:
+        raise ConnectivityCheckException(f"{target} is not an HTTPS URL")
+    host = url.hostname
+    port = url.port or 443
+    path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+
+    if ca and os.path.isdir(ca):
+        context = ssl.create_default_context(capath=ca)
+    else:
+        context = ssl.create_default_context(cafile=ca)
+
+    ip = getaddress(host, dns_cache)
+    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+    conn = socket.socket(family, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    connect_time = None
+    start = time.perf_counter_ns()
+    try:
+        with span("connect", host=host, port=port):
+            conn.connect((ip, port))
+        connect_time = elapsed(start)
+        start = time.perf_counter_ns()
+        with span("handshake", host=host, port=port):
+            sock = context.wrap_socket(conn, server_hostname=host)
+    except (OSError, ssl.SSLError) as e:
+        conn.close()
+        _connection_failed(
+            self,
+            target,
+            host,
+            port,
+            e,
+            connect_time,
+            (issuer, content, latency),
+            timeout,
+            dns_cache,
+        )
+    handshake_time = elapsed(start)
+
+    with sock:
+        cert_details = _parse_cert(
+            self, host, port, sock.getpeercert(True), _refresh(self)
+        )
+        connection = http.client.HTTPSConnection(host, port, timeout=timeout)
+        connection.sock = sock  # send the request on the connection we timed
+        start = time.perf_counter_ns()
+        with span("request", url=target):
+            connection.request(
+                "GET",
+                path,
+                headers={"Accept-Encoding": "identity", "Connection": "close"},
+            )
+            response = connection.getresponse()
+        response_time = elapsed(start)
+        matcher = None
+        if content:
+            matcher = ContentMatcher(
+                str(content), max_bytes, response.headers.get_content_charset()
+            )
+            while chunk := response.read(CHUNK_SIZE):
+                if matcher.feed(chunk):
+                    break
+            else:
+                matcher.finish()
+        response.close()
+
+    values = {
+        "connect": connect_time,
+        "handshake": handshake_time,
+        "response": response_time,
+        "status": response.status,
+        "validity": cert_details.validity,
+    }
+    failures = []
+    if issuer:
+        issuer = str(issuer)
+        values["cert"] = (
+            compile_pattern(issuer).search(cert_details.issuer) is not None
+            and cert_details.validity >= validity
+        )
+        if not values["cert"]:
+            failures.append(
+                f"certificate fails issuer match »{issuer}« or expires before {validity} days"
+            )
+    if matcher is not None:
+        values["content"] = matcher.matched
+        if not matcher.matched:
+            failures.append(
+                f"content fails content match »{matcher.content}«"
+                + (
+                    f" in the first {matcher.max_bytes} bytes"
+                    if matcher.truncated
+                    else ""
+                )
+            )
+    if latency is not None:
+        values["latency"] = connect_time <= latency
+        if not values["latency"]:
+            failures.append(f"connect time exceeds {latency} ms")
+    self._datadog(target=target, check="https", values=values)
+
+    summary = (
+        f"HTTP {response.status}, connect {connect_time:.2f} ms, TLS handshake"
+        f" {handshake_time:.2f} ms, response {response_time:.2f} ms\n{cert_details}"
+    )
+    if failures:
+        raise ConnectivityCheckException(
+            f"HTTPS {target} {', '.join(failures)}\n{summary}"
+            + (f"\n\n{matcher.text}" if values.get("content") is False else "")
+        )
+    checked = issuer or content or latency is not None
+    return f"HTTPS {target} {'passes all checks' if checked else 'details'}\n{summary}"
+
+
+def _connection_failed(
+    self,
+    target: str,
+    host: str,
+    port: int,
+    error: Exception,
+    connect_time: float | None,
+    checks: tuple,
+    timeout: float,
+    dns_cache: bool,
+):
+    "Submit the sub-checks of a failed connection as failed and raise the ERROR"
+    issuer, content, latency = checks
+    values = {}
+    details = ""
+    if connect_time is not None:
+        values["connect"] = connect_time
+    if isinstance(error, ssl.SSLCertVerificationError):
+        try:
+            der_cert = shared_step(
+                self,
+                ("certificate", host, port),
+                lambda: _fetch_cert(host, port, timeout, dns_cache),
+            )
+        except (OSError, ssl.SSLError):
+            pass
+        else:
+            cert_details = _parse_cert(self, host, port, der_cert, _refresh(self))
+            values["validity"] = cert_details.validity
+            details = f"\n{cert_details}"
+    if issuer:
+        values["cert"] = False
+    if content:
+        values["content"] = False
+    if latency is not None:
+        values["latency"] = connect_time is not None and connect_time <= latency
+    self._datadog(target=target, check="https", values=values)
+    raise ConnectivityCheckException(
+        f"HTTPS connection to {host}:{port} failed: {error}{details}"
+    )
@@ -12,11 +12,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
+import math
+import statistics
+
+from . import tcp
 from .exceptions import ConnectivityCheckException
-import tcp_latency
+from .resolver import gethostbyname
+
+from socket import gaierror
 
 from urllib.parse import urlparse
 
+# statistics that can be used as threshold besides any pNN percentile
+STATISTICS = ("average", "minimum", "maximum", "stddev", "jitter")
+# percentiles that are always reported
+PERCENTILES = (50, 90, 99)
+
 
 def check_latency(
     self,
@@ -26,6 +39,12 @@ def check_latency(
     runs: int = 3,
     wait: float = 1,
     verbose: bool = False,
+    dns_cache: bool = True,
+    concurrency: int = 1,
+    statistic: str = "average",
+    percentile: float = None,
+    max_loss: float = None,
+    kernel_rtt: bool = False,
 ) -> str:
     """
     Check latency based on TCP connections
@@ -33,8 +52,84 @@ def check_latency(
     Check that the TCP connection time to target is at most LATENCY milliseconds.
     TARGET can be HOST:PORT, port defaults to 443.
     target can also be a http(s) URL with a port, we only use the host and port.
+
+    Make RUNS connections and wait WAIT seconds between them. With CONCURRENCY
+    above 1 up to CONCURRENCY connections are made at the same time without waiting.
+
+    LATENCY applies to the STATISTIC of the measurements: average, minimum, maximum,
+    stddev, jitter or a percentile like p90. --percentile 95 is short for --statistic
+    p95. Fail if more than MAX_LOSS (0 to 1) of the connections fail, by default
+    only if all connections fail.
+
+    Connections are timed with a high-resolution clock. With --kernel_rtt use the RTT
+    that the kernel measured during the TCP handshake instead, this excludes the
+    scheduling delays of the check and is only available on Linux.
+
+    The host name is resolved once, use --nodns_cache to bypass the shared DNS cache.
+    """
+
+    target, host, port = _split_target(target)
+    statistic = _statistic(statistic, percentile)
+
+    try:
+        ip = gethostbyname(host, dns_cache)
+    except gaierror:
+        samples = []  # report like a failed connection
+    else:
+        samples = tcp.measure(ip, port, timeout, runs, wait, concurrency, verbose)
+    measures = [sample.value(kernel_rtt) for sample in samples if sample is not None]
+
+    return _check_latency_result(
+        self, target, host, port, latency, measures, runs, statistic, max_loss
+    )
+
+
+def _statistic(statistic: str, percentile: float = None) -> str:
+    "Validate the threshold statistic, PERCENTILE is short for pPERCENTILE"
+    if percentile is not None:
+        statistic = f"p{percentile:g}"
+    if statistic not in STATISTICS:
+        try:
+            value = float(statistic[1:]) if statistic.startswith("p") else -1
+        except ValueError:
+            value = -1
+        if not 0 <= value <= 100:
+            raise ConnectivityCheckException(
+                f"Invalid latency statistic {statistic}, use one of {', '.join(STATISTICS)} or p0 to p100"
+            )
+    return statistic
+
+
+def _percentile(ordered: list[float], percentile: float) -> float:
+    "Return the PERCENTILE of the ORDERED values with linear interpolation"
+    position = (len(ordered) - 1) * percentile / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _latency_statistics(measures: list[float], statistic: str) -> dict[str, float]:
     """
+    Return the statistics of the measurements, jitter is the mean difference between
+    consecutive measurements
+    """
+    ordered = sorted(measures)
+    result = {
+        "average": statistics.fmean(measures),
+        "minimum": ordered[0],
+        "maximum": ordered[-1],
+        "stddev": statistics.pstdev(measures),
+        "jitter": statistics.fmean(
+            [abs(b - a) for a, b in zip(measures, measures[1:])] or [0]
+        ),
+    }
+    for percentile in PERCENTILES:
+        result[f"p{percentile}"] = _percentile(ordered, percentile)
+    if statistic not in result:
+        result[statistic] = _percentile(ordered, float(statistic[1:]))
+    return result
+
 
+def _split_target(target: str) -> tuple[str, str, int]:
     url = urlparse(target)  # try to decode arg as URL
     if len(url.netloc) > 0:
         target = url.netloc
@@ -45,27 +140,48 @@ def check_latency(
     except:
         host = target
         port = 443
+    return target, host, port
 
-    display_dest = f"{host}:{port}"
 
-    measures = tcp_latency.measure_latency(host, port, timeout, runs, wait, verbose)
+def _check_latency_result(
+    self,
+    target: str,
+    host: str,
+    port: int,
+    latency: int,
+    measures: list,
+    runs: int = None,
+    statistic: str = "average",
+    max_loss: float = None,
+) -> str:
+    display_dest = f"{host}:{port}"
 
     if len(measures) > 0:
-        average = int(tcp_latency.mean(measures))
-        minimum = int(min(measures))
-        maximum = int(max(measures))
+        values = _latency_statistics(measures, statistic)
+        value = int(values[statistic])
+        runs = runs or len(measures)
+        loss = (runs - len(measures)) / runs
 
-        check_result = average <= latency
+        check_result = value <= latency
         self._datadog(
             target=target,
             check="latency",
-            values={"average": average, "minimum": minimum, "maximum": maximum},
+            values={
+                key: int(value) if key in ("average", "minimum", "maximum") else value
+                for key, value in values.items()
+            }
+            | {"loss": loss, "samples": measures},
         )
+        label = "" if statistic == "average" else f"{statistic} "
+        if max_loss is not None and loss > max_loss:
+            raise ConnectivityCheckException(
+                f"TCP connection loss to {display_dest} is {loss:.0%} exceeding the limit of {max_loss:.0%}"
+            )
         if check_result:
-            return f"TCP connection latency to {display_dest} is {average} (limit {latency})"
+            return f"TCP connection {label}latency to {display_dest} is {value} (limit {latency})"
         else:
             raise ConnectivityCheckException(
-                f"TCP connection latency to {display_dest} is {average} exceeding the limit of {latency}"
+                f"TCP connection {label}latency to {display_dest} is {value} exceeding the limit of {latency}"
             )
     else:
         raise ConnectivityCheckException(f"TCP connection to {display_dest} failed")
@@ -14,18 +14,105 @@
 
 from __future__ import annotations
 from .exceptions import ConnectivityCheckException
-import tcp_latency
+from .resolver import gethostbyname
 
 import platform
 import re
-from socket import gethostbyname, gaierror
+import threading
+from socket import gaierror
 from urllib.parse import urlparse
 
 
+class RouteTable:
+    """
+    Cached Linux route and link lookups over a single netlink socket
+
+    A background thread listens for IPv4 route and link changes and drops the cache
+    upon every change. Without that monitor all lookups go to the kernel. Lookups
+    take turns on the socket, cache hits and invalidations don't wait for them.
+    """
+
+    def __init__(self) -> None:
+        from pyroute2 import IPRoute
+
+        self._ipr = IPRoute()
+        self._lock = threading.Lock()
+        self._netlink_lock = threading.Lock()
+        self._routes: dict[str, dict] = {}
+        self._links: dict[int, str] = {}
+        self._generation = 0
+        self.monitoring = False
+        self._start_monitor()
+
+    def _start_monitor(self) -> None:
+        self.monitoring = True
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def _monitor(self) -> None:
+        from pyroute2 import IPRoute
+        from pyroute2.netlink.rtnl import RTMGRP_IPV4_ROUTE, RTMGRP_LINK
+
+        try:
+            with IPRoute() as ipr:
+                ipr.bind(groups=RTMGRP_IPV4_ROUTE | RTMGRP_LINK)
+                while True:
+                    ipr.get()  # blocks until the kernel reports changes
+                    self.invalidate()
+        except Exception:
+            self.monitoring = False
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._routes.clear()
+            self._links.clear()
+
+    def _cached(self, cache: dict, key, lookup):
+        with self._lock:
+            if self.monitoring and key in cache:
+                return cache[key]
+            generation = self._generation
+        with self._netlink_lock:
+            value = lookup()
+        with self._lock:
+            # don't store results that were looked up before a change
+            if self.monitoring and generation == self._generation:
+                cache[key] = value
+        return value
+
+    def route(self, ip: str) -> dict:
+        "Return the route attributes to IP"
+        return self._cached(
+            self._routes, ip, lambda: dict(self._ipr.route("get", dst=ip)[0]["attrs"])
+        )
+
+    def link_name(self, index: int) -> str:
+        "Return the name of the network device with INDEX"
+        return self._cached(
+            self._links,
+            index,
+            lambda: self._ipr.get_links(index)[0].get_attr("IFLA_IFNAME"),
+        )
+
+
+__route_table = None
+__route_table_lock = threading.Lock()
+
+
+def route_table() -> RouteTable:
+    "Return the process wide RouteTable"
+    global __route_table
+    with __route_table_lock:
+        if __route_table is None:
+            __route_table = RouteTable()
+        return __route_table
+
+
 class Route:
     "Determine and IPv4 route to a destination"
 
-    def __init__(self, dest: str) -> Route:
+    def __init__(self, dest: str, dns_cache: bool = True) -> Route:
         if re.fullmatch("[\d.]+", dest):
             # got IP
             self.ip = dest
@@ -33,7 +120,7 @@ class Route:
         else:
             # got DNS name
             try:
-                self.ip = gethostbyname(dest)
+                self.ip = gethostbyname(dest, dns_cache)
             except gaierror as e:
                 raise ConnectivityCheckException(
                     f"Could not convert {dest} to IP address: {e}"
@@ -43,18 +130,16 @@ class Route:
         if platform.system() == "Linux":
             # Scapy doesn't support policy routing, see https://github.com/secdev/scapy/issues/836
             # we therefore use Linux-only pyroute2 here
-            from pyroute2 import IPRoute
+            routes = route_table()
 
-            ipr = IPRoute()
-
-            route_attrs = dict(ipr.route("get", dst=self.ip)[0]["attrs"])
+            route_attrs = routes.route(self.ip)
             assert (
                 route_attrs["RTA_DST"] == self.ip
             ), f"Route lookup destination mismatch {self.ip} != {route_attrs['RTA_DST']}"
             self.local_ip = route_attrs["RTA_PREFSRC"]
             self.gateway_ip = route_attrs.get("RTA_GATEWAY", "direct")
             device_id = route_attrs["RTA_OIF"]
-            self.device = ipr.get_links(device_id)[0].get_attr("IFLA_IFNAME")
+            self.device = routes.link_name(device_id)
         else:
             # use scapy on all non-Linux OS
             # lazy-load scapy as it does a lot upon initialisation and can also print warnings if not disabled via logging
@@ -87,33 +172,56 @@ class Route:
     __repr__ = __str__
 
 
-def check_routing(self, target: str, reference: str, same: bool = False):
+def check_routing(
+    self,
+    target: str | list[str],
+    reference: str,
+    same: bool = False,
+    dns_cache: bool = True,
+):
     """
     Compare IPv4 routing between two destinations
 
     Compare that the route to TARGET differs from route to REFERENCE.
     Compares gateway IP and local device/IP used to reach the destination
 
+    TARGET can also be a list of destinations that are all compared against the
+    same REFERENCE route.
+
     Check for equality via --same
+
+    Use --nodns_cache to resolve the host names without the shared DNS cache.
     """
 
     # Not dealing with IPv6 as of now because IPv6 might be optional and only one of the two given destinations might
     # be reachable via IPv6. We therefore should determine first what is available for both and then compare that.
     # Will implement when actually needed.
 
-    target_route = Route(target)
-    reference_route = Route(reference)
-
-    check_result = reference_route.compare(target_route, same)
-    self._datadog(
-        target=target, check="routing", values=check_result, device=target_route.device
-    )
-    if check_result:
-        return f"Routing to {target} via {target_route.gateway_ip}/{target_route.device} {'is same as' if same else 'differs from'} route to {reference}"
-    else:
-        raise ConnectivityCheckException(
-            f"Expecting {'equality' if same else 'difference'}, but routing to {target} {'differs from' if same else 'is same as'} route to {reference}.\n"
-            + str(reference_route)
-            + "\n"
-            + str(target_route)
+    targets = target if isinstance(target, (list, tuple)) else [target]
+    reference_route = Route(reference, dns_cache)
+
+    results = []
+    failures = []
+    for target in targets:
+        target_route = Route(target, dns_cache)
+        check_result = reference_route.compare(target_route, same)
+        self._datadog(
+            target=target,
+            check="routing",
+            values=check_result,
+            device=target_route.device,
         )
+        if check_result:
+            results.append(
+                f"Routing to {target} via {target_route.gateway_ip}/{target_route.device} {'is same as' if same else 'differs from'} route to {reference}"
+            )
+        else:
+            failures.append(
+                f"Expecting {'equality' if same else 'difference'}, but routing to {target} {'differs from' if same else 'is same as'} route to {reference}.\n"
+                + str(reference_route)
+                + "\n"
+                + str(target_route)
+            )
+    if failures:
+        raise ConnectivityCheckException("\n".join(failures))
+    return "\n".join(results)
@@ -15,33 +15,38 @@
 from cloudflarepycli import cloudflareclass
 
 from .exceptions import ConnectivityCheckException
+from .speed_cache import _min_interval, describe_age, speed_result
 
 
 def check_speed_cloudflare(
-    self, latency: int = 50, download: int = 20, upload: int = 5, progress: bool = False
+    self,
+    latency: int = 50,
+    download: int = 20,
+    upload: int = 5,
+    progress: bool = False,
+    min_interval: float = None,
 ):
     """
     Check the network speed via Cloudflare speed.cloudflare.com
 
     LATENCY (ms), DOWNLOAD (MB/s) and UPLOAD (MB/s) specify the minimum quality to check against.
-    """
-
-    try:
-        results = cloudflareclass.cloudflare(printit=progress).runalltests()
-    except Exception as e:
-        raise ConnectivityCheckException(str(e))
 
-    # import json, pathlib ; pathlib.Path("./out.json").write_text(json.dumps(results, indent=2))
+    Set MIN_INTERVAL to check the last result from the state directory again instead of
+    measuring for up to MIN_INTERVAL seconds. Default is the speed_min_interval config
+    setting or 0.
+    """
 
-    results = {key: compound["value"] for key, compound in results.items()}
-    result_download = results["90th_percentile_download_speed"]
-    result_upload = results["90th_percentile_upload_speed"]
-    result_latency = results["latency_ms"]
-    result_server_description = (
-        "speed.cloudflare.com in {test_location_city} ({test_location_region})".format(
-            **results
-        )
+    result = speed_result(
+        self,
+        "speed_cloudflare",
+        "speed.cloudflare.com",
+        _min_interval(self, min_interval),
+        lambda: _measure(progress),
     )
+    result_download = result["download"]
+    result_upload = result["upload"]
+    result_latency = result["latency"]
+    result_server_description = result["server"]
     check_result = (
         result_download >= download
         and result_upload >= upload
@@ -54,12 +59,32 @@ def check_speed_cloudflare(
             "download": result_download,
             "upload": result_upload,
             "latency": result_latency,
+            "age": int(result["age"]),
         },
         host=result_server_description,
     )
     if check_result:
-        return f"Speedtest to {result_server_description} D:{result_download} U:{result_upload} Mb/s at {result_latency} ms"
+        return f"Speedtest to {result_server_description} D:{result_download} U:{result_upload} Mb/s at {result_latency} ms{describe_age(result)}"
     else:
         raise ConnectivityCheckException(
-            f"Speedtest insufficient to {result_server_description} D:{result_download} ({download}) U:{result_upload} ({upload}) Mb/s at {result_latency} ({latency}) ms"
+            f"Speedtest insufficient to {result_server_description} D:{result_download} ({download}) U:{result_upload} ({upload}) Mb/s at {result_latency} ({latency}) ms{describe_age(result)}"
         )
+
+
+def _measure(progress: bool) -> dict:
+    try:
+        results = cloudflareclass.cloudflare(printit=progress).runalltests()
+    except Exception as e:
+        raise ConnectivityCheckException(str(e))
+
+    # import json, pathlib ; pathlib.Path("./out.json").write_text(json.dumps(results, indent=2))
+
+    results = {key: compound["value"] for key, compound in results.items()}
+    return {
+        "download": results["90th_percentile_download_speed"],
+        "upload": results["90th_percentile_upload_speed"],
+        "latency": results["latency_ms"],
+        "server": "speed.cloudflare.com in {test_location_city} ({test_location_region})".format(
+            **results
+        ),
+    }
@@ -12,13 +12,110 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
 import speedtest
 
 from .exceptions import ConnectivityCheckException
+from .profiling import span
+from .resolver import gethostbyname
+from .speed_cache import _load, _save, _min_interval, describe_age, speed_result
+from .state import state_dir
+from .tcp import measure
+
+# seconds to keep the speedtest.net config, server list and best server
+DEFAULT_CACHE_TTL = 86400
+CACHE_FILE = "ookla.json"
+# TCP connections to each candidate server to pick the best one
+PROBES = 3
+PROBE_TIMEOUT = 2
+
+# the cache file is shared by all checks of this process
+_cache_lock = threading.Lock()
+
+
+class _OoklaCache:
+    "Entries of the Ookla cache file in the state directory that are younger than TTL"
+
+    def __init__(self, path: Path | None, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.entries = _load(path) if path else {}
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry and 0 <= time.time() - entry["fetched_at"] < self.ttl:
+            return entry["value"]
+        return None
+
+    def put(self, key: str, value) -> None:
+        if self.path is None:
+            return
+        entry = {"fetched_at": time.time(), "value": value}
+        with _cache_lock:
+            entries = _load(self.path)
+            entries[key] = entry
+            _save(self.path, entries)
+        self.entries[key] = entry
+
+
+class _Speedtest(speedtest.Speedtest):
+    "Speedtest client that takes the config and the server list from the cache"
+
+    def __init__(self, cache: _OoklaCache) -> None:
+        self._cache = cache
+        super().__init__()
+
+    def get_config(self) -> dict:
+        cached = self._cache.get("config")
+        if cached is None:
+            config = super().get_config()
+            self._cache.put("config", {"config": config, "lat_lon": self.lat_lon})
+            return config
+        self.config = cached["config"]
+        self.lat_lon = tuple(cached["lat_lon"])
+        return self.config
+
+    def get_servers(self, servers: list = None, exclude: list = None) -> dict:
+        cached = self._cache.get("servers")
+        if cached is None:
+            cached = [
+                server for group in super().get_servers().values() for server in group
+            ]
+            self._cache.put("servers", cached)
+        self.servers = {}
+        for server in cached:
+            if (servers and int(server["id"]) not in servers) or (
+                exclude and int(server["id"]) in exclude
+            ):
+                continue
+            self.servers.setdefault(server["d"], []).append(server)
+        if (servers or exclude) and not self.servers:
+            raise speedtest.NoMatchedServers()
+        return self.servers
+
+
+def _cache(self, cache_ttl: float = None) -> _OoklaCache:
+    if cache_ttl is None:
+        cache_ttl = self._config.get("ookla_cache_ttl", DEFAULT_CACHE_TTL)
+    return _OoklaCache(state_dir(self) / CACHE_FILE if cache_ttl else None, cache_ttl)
 
 
 def check_speed_ookla(
-    self, target: int = -1, latency: int = 50, download: int = 20, upload: int = 5
+    self,
+    target: int = -1,
+    latency: int = 50,
+    download: int = 20,
+    upload: int = 5,
+    min_interval: float = None,
+    cache_ttl: float = None,
 ):
     """
     Check the network speed via Oookla speedtest.net
@@ -28,31 +125,34 @@ def check_speed_ookla(
     Use -1 to use the closest server
 
     LATENCY (ms), DOWNLOAD (Mb/s) and UPLOAD (Mb/s) specify the minimum quality to check against.
+
+    Set MIN_INTERVAL to check the last result from the state directory again instead of
+    measuring for up to MIN_INTERVAL seconds. Default is the speed_min_interval config
+    setting or 0.
+
+    The speedtest.net config, the server list and the best server are kept in the state
+    directory for CACHE_TTL seconds. Default is the ookla_cache_ttl config setting or
+    one day, 0 disables the cache.
     """
 
-    s = speedtest.Speedtest()
+    cache = _cache(self, cache_ttl)
     if target == 0:
         print(
             "Set the TARGET to a speedtest.net server ID. Here are the closest servers:"
         )
-        return s.get_closest_servers()
-    elif target > 0:
-        try:
-            server_list = list(s.get_servers([target]).values())[0]  # one in - one out
-        except speedtest.NoMatchedServers:
-            raise ConnectivityCheckException(f"Speedtest server {target} is invalid")
-    else:  # target < 0
-        server_list = None  # use default
-
-    s.get_best_server(servers=server_list)
-    s.download()
-    s.upload()
-    result_download = int(s.results.download / 1024 / 1024)
-    result_upload = int(s.results.upload / 1024 / 1024)
-    result_latency = int(s.results.ping)
-    result_server_description = (
-        "{id} ({host} by {sponsor} in {name}, {country})".format(**s.results.server)
+        return _Speedtest(cache).get_closest_servers()
+
+    result = speed_result(
+        self,
+        "speed_ookla",
+        target,
+        _min_interval(self, min_interval),
+        lambda: _measure(cache, target),
     )
+    result_download = result["download"]
+    result_upload = result["upload"]
+    result_latency = result["latency"]
+    result_server_description = result["server"]
     check_result = (
         result_download >= download
         and result_upload >= upload
@@ -65,12 +165,99 @@ def check_speed_ookla(
             "download": result_download,
             "upload": result_upload,
             "latency": result_latency,
+            "age": int(result["age"]),
         },
         host=result_server_description,
     )
     if check_result:
-        return f"Speedtest to {result_server_description} D:{result_download} U:{result_upload} MB/s at {result_latency} ms"
+        return f"Speedtest to {result_server_description} D:{result_download} U:{result_upload} MB/s at {result_latency} ms{describe_age(result)}"
     else:
         raise ConnectivityCheckException(
-            f"Speedtest insufficient to {result_server_description} D:{result_download} ({download}) U:{result_upload} ({upload}) MB/s at {result_latency} ({latency}) ms"
+            f"Speedtest insufficient to {result_server_description} D:{result_download} ({download}) U:{result_upload} ({upload}) MB/s at {result_latency} ({latency}) ms{describe_age(result)}"
+        )
+
+
+def _probe(server: dict) -> float | None:
+    "Return the average TCP connect time to the server in ms, None if unreachable"
+    url = urlparse(server["url"])
+    try:
+        ip = gethostbyname(url.hostname)
+    except socket.gaierror:
+        return None
+    port = url.port or (443 if url.scheme == "https" else 80)
+    samples = [
+        sample.connect
+        for sample in measure(ip, port, PROBE_TIMEOUT, PROBES, wait=0)
+        if sample is not None
+    ]
+    return sum(samples) / len(samples) if samples else None
+
+
+def _select_server(s: speedtest.Speedtest, candidates: list[dict]) -> dict | None:
+    """
+    Make the candidate with the lowest TCP connect time the server of the speed test,
+    the candidates are measured concurrently
+
+    Return the server or None if no candidate is reachable.
+    """
+    if not candidates:
+        return None
+    with span("select server", candidates=len(candidates)), ThreadPoolExecutor(
+        max_workers=len(candidates)
+    ) as executor:
+        latencies = list(executor.map(_probe, candidates))
+    reachable = [
+        (latency, index)
+        for index, latency in enumerate(latencies)
+        if latency is not None
+    ]
+    if not reachable:
+        return None
+    latency, index = min(reachable)
+    best = dict(candidates[index], latency=latency)
+    s.results.ping = latency
+    s.results.server = best
+    s._best.update(best)
+    return best
+
+
+def _measure(cache: _OoklaCache, target: int) -> dict:
+    "Run the speed test against the TARGET server or the best server if negative"
+    s = _Speedtest(cache)
+    if target > 0:
+        try:
+            server_list = list(s.get_servers([target]).values())[0]  # one in - one out
+        except speedtest.NoMatchedServers:
+            raise ConnectivityCheckException(f"Speedtest server {target} is invalid")
+        best = _select_server(s, server_list)
+    else:  # target < 0
+        # the best server of the site is remembered, the client IP identifies the site
+        key = f"best:{s.config['client']['ip']}"
+        remembered = cache.get(key)
+        best = remembered and _select_server(
+            s,
+            [
+                server
+                for group in s.get_servers().values()
+                for server in group
+                if server["id"] == remembered
+            ],
         )
+        best = best or _select_server(s, s.get_closest_servers())
+        if best:
+            cache.put(key, best["id"])
+
+    if not best:
+        raise ConnectivityCheckException("No speedtest server is reachable")
+    with span("download", server=best["id"]):
+        s.download()
+    with span("upload", server=best["id"]):
+        s.upload()
+    return {
+        "download": int(s.results.download / 1024 / 1024),
+        "upload": int(s.results.upload / 1024 / 1024),
+        "latency": int(s.results.ping),
+        "server": "{id} ({host} by {sponsor} in {name}, {country})".format(
+            **s.results.server
+        ),
+    }
@@ -12,40 +12,296 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import partial
+from typing import Callable
+
 import yaml
-from schema import Schema, Optional, Or, SchemaError
+from schema import Schema, Optional, Or, And, SchemaError
+from .deadline import BatchDeadline, DeadlineExceeded, run_with_deadline
 from .exceptions import ConnectivityCheckException
+from .history import recording
+from .profiling import span, tracing
+from .run_metrics import report_batch, report_run
+from .shard import select_shard
+from .plan import (
+    PlannedCheck,
+    compile_patterns,
+    config_digest,
+    entry_key,
+    load_plan,
+    sharing,
+    store_plan,
+)
+
+# the C based loader is much faster for large config files
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# valid for the config section and for single check entries
+_interval = And(
+    Or(int, float), lambda n: n > 0, error="interval must be a positive number"
+)
+_jitter = And(Or(int, float), lambda n: n >= 0, error="jitter must not be negative")
+_deadline = And(
+    Or(int, float), lambda n: n > 0, error="deadline must be a positive number"
+)
 
+# bump PLAN_VERSION when changing the schema as validated configs are cached
 config_schema = Schema(
     {
-        Optional("config"): {Optional("datadog", default=None): Or(str, None)},
+        Optional("config"): {
+            Optional("datadog", default=None): Or(str, None),
+            Optional("datadog_verbose"): bool,
+            Optional("parallel"): And(
+                int, lambda n: n > 0, error="parallel must be a positive number"
+            ),
+            Optional("interval"): _interval,
+            Optional("jitter"): _jitter,
+            Optional("deadline"): _deadline,
+            Optional("batch_deadline"): And(
+                Or(int, float),
+                lambda n: n > 0,
+                error="batch_deadline must be a positive number",
+            ),
+            Optional("metrics_port"): And(
+                int,
+                lambda n: 0 < n < 65536,
+                error="metrics_port must be a TCP port number",
+            ),
+            Optional("metrics_address"): str,
+            Optional("http_pool_size"): And(
+                int, lambda n: n > 0, error="http_pool_size must be a positive number"
+            ),
+            Optional("http_keep_alive"): bool,
+            Optional("state_dir"): str,
+            Optional("history"): bool,
+            Optional("history_retention"): And(
+                int,
+                lambda n: n > 0,
+                error="history_retention must be a positive number",
+            ),
+            Optional("cert_refresh"): And(
+                Or(int, float),
+                lambda n: n >= 0,
+                error="cert_refresh must not be negative",
+            ),
+            Optional("speed_min_interval"): And(
+                Or(int, float),
+                lambda n: n >= 0,
+                error="speed_min_interval must not be negative",
+            ),
+            Optional("ookla_cache_ttl"): And(
+                Or(int, float),
+                lambda n: n >= 0,
+                error="ookla_cache_ttl must not be negative",
+            ),
+            Optional("shard_nodes"): And(
+                [str], len, error="shard_nodes must be a list of node names"
+            ),
+        },
         "checks": [
             {
                 Or(
                     "cert",
                     "content",
+                    "https",
                     "routing",
                     "latency",
                     "speed_ookla",
                     "speed_cloudflare",
                     error="Invalid check type",
-                ): dict
+                ): {
+                    Optional("interval"): _interval,
+                    Optional("jitter"): _jitter,
+                    Optional("deadline"): _deadline,
+                    Optional(object): object,
+                }
             }
         ],
     }
 )
 
 
-def checks(self, config: str, all: bool = False):
+# check entry keys that define how a check is run and are not passed to the check
+ENTRY_OPTIONS = ("interval", "jitter", "deadline", "everywhere")
+
+
+def _load_config(self, config: str) -> list[PlannedCheck]:
+    """
+    Load and validate the CONFIG file, apply its config section and return the checks
+    in config order
+
+    The validated config is cached as plan in the state directory, unchanged config
+    files are neither parsed nor validated again.
+    """
+    try:
+        with open(config, "rb") as yaml_config_file:
+            data = yaml_config_file.read()
+        digest = config_digest(data)
+        yaml_data = load_plan(self, digest)
+        if yaml_data is None:
+            yaml_data = config_schema.validate(yaml.load(data, Loader=SafeLoader))
+            store_plan(self, digest, yaml_data)
+    except SchemaError as se:
+        raise ConnectivityCheckException(
+            f"Configuration file {config} has an error:\n"
+            + str(se)
+            + "\n"
+            + self.checks.__doc__
+        )
+    except Exception as e:
+        raise ConnectivityCheckException(str(e))
+
+    if "config" in yaml_data:
+        self._update_config(**yaml_data["config"])
+    checks_to_run = []
+    for check_dict in yaml_data["checks"]:
+        for check, kwargs in check_dict.items():
+            options = {key: kwargs[key] for key in ENTRY_OPTIONS if key in kwargs}
+            kwargs = {
+                key: value for key, value in kwargs.items() if key not in ENTRY_OPTIONS
+            }
+            checks_to_run.append(PlannedCheck(check, kwargs, options))
+    try:
+        compile_patterns(checks_to_run)
+    except re.error as e:
+        raise ConnectivityCheckException(
+            f"Configuration file {config} has an invalid pattern: {e}"
+        )
+    return checks_to_run
+
+
+def _run_check(
+    self,
+    function_name: str,
+    kwargs: dict,
+    deadline: float = None,
+    batch: BatchDeadline = None,
+):
+    check = function_name[len("check_") :]
+    start = time.perf_counter_ns()
+    usage = {}
+    timeout = False
+    try:
+        with recording(self, check, kwargs), span(function_name, "check", **kwargs):
+            if batch is not None:
+                deadline = batch.remaining(deadline)
+            return run_with_deadline(self, function_name, kwargs, deadline, usage)
+    except DeadlineExceeded:
+        timeout = True
+        raise
+    except TypeError as e:
+        raise ConnectivityCheckException(
+            f"Error in check parameters: {e}\nProblematic parameter block: {kwargs}\nUse {function_name} --help for details"
+        )
+    finally:
+        report_run(self, check, kwargs, start, usage.get("cpu"), timeout)
+
+
+def _once(function: Callable) -> Callable:
+    "Call FUNCTION on first use only and return its result or raise its error again"
+    outcome = []
+
+    def call():
+        if not outcome:
+            try:
+                outcome.append((True, function()))
+            except ConnectivityCheckException as e:
+                outcome.append((False, e))
+        success, value = outcome[0]
+        if success:
+            return value
+        raise value
+
+    return call
+
+
+def _check_outcomes(self, checks_to_run: list, parallel: int, batch: BatchDeadline):
+    """
+    Yield the function name, arguments and a callable that returns the check result
+    or raises its error for each check, checks are run within their deadline and the
+    deadline of the BATCH
+
+    Identical checks are run once and share their outcome. With more than one PARALLEL
+    worker the checks run ahead in a thread pool, closing the generator cancels all
+    checks that did not start yet.
+    """
+    keys = [entry_key(*entry) for entry in checks_to_run]
+    if parallel > 1:
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = {}
+            for key, (function_name, kwargs, deadline) in zip(keys, checks_to_run):
+                if key not in futures:
+                    futures[key] = executor.submit(
+                        _run_check, self, function_name, kwargs, deadline, batch
+                    )
+            try:
+                for key, (function_name, kwargs, _) in zip(keys, checks_to_run):
+                    yield function_name, kwargs, futures[key].result
+            finally:
+                for future in futures.values():
+                    future.cancel()
+    else:
+        outcomes = {}
+        for key, (function_name, kwargs, deadline) in zip(keys, checks_to_run):
+            if key not in outcomes:
+                outcomes[key] = _once(
+                    partial(_run_check, self, function_name, kwargs, deadline, batch)
+                )
+            yield function_name, kwargs, outcomes[key]
+
+
+def checks(
+    self,
+    config: str,
+    all: bool = False,
+    parallel: int = None,
+    trace_file: str = None,
+    profile: str = None,
+    shard_index: int = None,
+    shard_count: int = None,
+    shard_node: str = None,
+):
     """
     Run all checks in config file
 
     Run all checks defined in CONFIG file. Fail on first failed check unless ALL is set.
 
+    Run up to PARALLEL checks at the same time, results are still reported in config
+    order. Overrides the parallel setting from the config file, default is 1.
+
+    Write a timeline of the checks and their phases (resolve, connect, handshake,
+    parse, request, metrics) to TRACE_FILE in the Chrome trace format. Write the
+    cProfile statistics of each check type to the PROFILE directory, e.g. cert.prof,
+    the checks are run one at a time then.
+
+    Run only the share of the checks of node SHARD_INDEX of SHARD_COUNT nodes, or of
+    SHARD_NODE (default is the host name) of the shard_nodes in the config file.
+
     Config file format is YAML like this:
 
     config:
         datadog: prefix
+        datadog_verbose: true
+        parallel: 10
+        interval: 60
+        jitter: 5
+        deadline: 120
+        batch_deadline: 600
+        metrics_port: 9101
+        metrics_address: 127.0.0.1
+        http_pool_size: 10
+        http_keep_alive: true
+        state_dir: ~/.local/state/connectivity-check
+        history: true
+        history_retention: 30
+        cert_refresh: 86400
+        speed_min_interval: 3600
+        ookla_cache_ttl: 86400
+        shard_nodes: [probe-1, probe-2, probe-3]
 
     checks:
         - cert:
@@ -54,6 +310,14 @@ def checks(self, config: str, all: bool = False):
         - content:
             target: url
             content: something
+            phases:
+                ttfb: 500
+                total: 2000
+        - https:
+            target: url
+            issuer: foobar
+            content: something
+            latency: 200
         - routing:
             target: host
             reference: otherhost
@@ -63,58 +327,80 @@ def checks(self, config: str, all: bool = False):
         - speed_ookla:
             target: Ookla-ID
             latency: 200
+            min_interval: 21600
         - speed_cloudflare:
             latency: 200
 
-    Entries can be repeated to different checks
+    Entries can be repeated to different checks, identical entries are run only once
+    and checks of the same host share the certificate fetch
+
+    Each check can set its own interval and jitter (seconds) for the serve command
+
+    With sharding every check runs on one node only, routing and speed checks run on
+    every node. Set everywhere: true or false in a check to override this.
+
+    Checks that don't finish within their deadline (seconds, set per check or as
+    default in the config section) fail. No check runs past the batch_deadline, the
+    remaining checks fail once it is exceeded.
+
+    Each check reports its duration, CPU and wait time (ms) and whether it timed out
+    as CHECK.run.* metrics, the batch its duration and number of checks as batch.*
+    metrics.
     """
 
-    try:
-        with open(config) as yaml_config_file:
-            yaml_data = yaml.safe_load(yaml_config_file)
-        yaml_data = config_schema.validate(yaml_data)
-    except SchemaError as se:
-        raise ConnectivityCheckException(
-            f"Configuration file {config} has an error:\n"
-            + str(se)
-            + "\n"
-            + self.checks.__doc__
+    start = time.perf_counter_ns()
+    checks_to_run = [
+        (
+            planned.function_name,
+            planned.kwargs,
+            planned.options.get("deadline", self._config.get("deadline")),
         )
-    except Exception as e:
-        raise ConnectivityCheckException(str(e))
+        for planned in select_shard(
+            self, _load_config(self, config), shard_index, shard_count, shard_node
+        )
+    ]
+    if parallel is None:
+        parallel = self._config.get("parallel", 1)
+    if profile:
+        # the profiler follows a single thread
+        parallel = 1
+    batch = BatchDeadline(self._config.get("batch_deadline"))
 
-    if "config" in yaml_data:
-        self._update_config(**yaml_data["config"])
-    checks_to_run = yaml_data["checks"]
+    setup = time.perf_counter_ns()
 
     errors = []
     success = []
-    for check_dict in checks_to_run:
-        for check, kwargs in check_dict.items():
-            function_name = "check_" + check
-            status = "FAILED"
-            description = f"Check {function_name}({str(kwargs)})"
-            try:
+    ran = 0
+    try:
+        with tracing(trace_file, profile), sharing(self), closing(
+            _check_outcomes(self, checks_to_run, parallel, batch)
+        ) as outcomes:
+            for function_name, kwargs, outcome in outcomes:
+                status = "FAILED"
+                description = f"Check {function_name}({str(kwargs)})"
+                ran += 1
                 try:
-                    result = getattr(self, function_name)(**kwargs)
-                except TypeError as e:
-                    raise ConnectivityCheckException(
-                        f"Error in check parameters: {e}\nProblematic parameter block: {kwargs}\nUse {function_name} --help for details"
-                    )
-                print(result)
-                success.append((description, result))
-                status = "OK"
-            except ConnectivityCheckException as e:
-                if all:
-                    print(e)
-                    errors.append((description, e))
-                else:
-                    raise e
-            except Exception as e:
-                raise ConnectivityCheckException(str(e))
-            finally:
-                print(description + " " + status)
+                    result = outcome()
+                    print(result)
+                    success.append((description, result))
+                    status = "OK"
+                except ConnectivityCheckException as e:
+                    if all:
+                        print(e)
+                        errors.append((description, e))
+                    else:
+                        raise e
+                except Exception as e:
+                    raise ConnectivityCheckException(str(e))
+                finally:
+                    print(description + " " + status)
+    finally:
+        report_batch(self, config, start, setup, ran, ran - len(success))
 
+    self._datadog_flush()
+    http_summary = self._http_summary()
+    if http_summary:
+        print(http_summary)
     print(f"{len(errors)} failed and {len(success)} successful checks")
     if all and len(errors) > 0:
         raise ConnectivityCheckException("Not all checks succesfull")
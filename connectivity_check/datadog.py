@@ -12,37 +12,184 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import datadog
-from datadog import statsd
+from __future__ import annotations
+
+import atexit
+import threading
+from collections import defaultdict
 from typing import Union
 
-__initialized = False
+from .profiling import span
 
 DD_OPTIONS = {"statsd_host": "127.0.0.1", "statsd_port": 8125}
+# metric prefix for the Prometheus exporter without --datadog PREFIX
+DEFAULT_PREFIX = "connectivity_check"
+# seconds between flushes of the aggregated metrics
+FLUSH_INTERVAL = 10
+# number of aggregated contexts that triggers an early flush
+MAX_PENDING = 1000
+
+__pipeline = None
+__pipeline_lock = threading.Lock()
+
+
+class MetricsPipeline:
+    """
+    Buffered DogStatsD submission with client-side aggregation
+
+    Gauges of the same metric and tags are reduced to the last value per flush and
+    samples of a distribution are collected until the flush. On flush the DogStatsD
+    client packs the metrics into as few datagrams as possible. The pipeline flushes
+    every FLUSH_INTERVAL seconds, when MAX_PENDING contexts are waiting and on exit.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_pending: int = MAX_PENDING,
+    ) -> None:
+        # lazy-load datadog as it is only needed with DogstatsD mode enabled
+        from datadog.dogstatsd import DogStatsd
+
+        self.statsd = DogStatsd(host=host, port=port, disable_buffering=False)
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._gauges: dict[tuple[str, tuple], float] = {}
+        self._distributions: dict[tuple[str, tuple], list] = defaultdict(list)
+        self._stop = threading.Event()
+        if flush_interval:
+            threading.Thread(
+                target=self._flush_periodically, args=(flush_interval,), daemon=True
+            ).start()
+
+    def _flush_periodically(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self.flush()
+
+    def _pending(self) -> int:
+        return len(self._gauges) + len(self._distributions)
+
+    def gauge(self, metric: str, value, tags: tuple) -> None:
+        with self._lock:
+            self._gauges[metric, tags] = value
+            full = self._pending() >= self.max_pending
+        if full:
+            self.flush()
+
+    def distribution(self, metric: str, values: list, tags: tuple) -> None:
+        with self._lock:
+            self._distributions[metric, tags].extend(values)
+            full = self._pending() >= self.max_pending
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        "Send all aggregated metrics"
+        with self._lock:
+            gauges, self._gauges = self._gauges, {}
+            distributions, self._distributions = self._distributions, defaultdict(list)
+        for (metric, tags), value in gauges.items():
+            self.statsd.gauge(metric, value, list(tags))
+        for (metric, tags), values in distributions.items():
+            for value in values:
+                self.statsd.distribution(metric, value, list(tags))
+        self.statsd.flush()
 
+    def close(self) -> None:
+        "Stop the periodic flush and send the remaining metrics"
+        self._stop.set()
+        self.flush()
 
-def submit_datadog(metric: str, value, tags: list):
-    global __initialized
-    if not __initialized:
-        datadog.initialize(**DD_OPTIONS)
-        __initialized = True
-    statsd.gauge(metric, value, tags)
-    print(f"DD: {metric} = {value} / {tags}")
+
+def pipeline() -> MetricsPipeline:
+    "Return the shared metrics pipeline, it is flushed on exit"
+    global __pipeline
+    with __pipeline_lock:
+        if __pipeline is None:
+            __pipeline = MetricsPipeline(
+                DD_OPTIONS["statsd_host"], DD_OPTIONS["statsd_port"]
+            )
+            atexit.register(__pipeline.close)
+        return __pipeline
+
+
+def close_pipeline() -> None:
+    "Flush and close the shared metrics pipeline, the next metric creates a new one"
+    global __pipeline
+    with __pipeline_lock:
+        closing, __pipeline = __pipeline, None
+    if closing is not None:
+        atexit.unregister(closing.close)
+        closing.close()
+
+
+def submit_datadog(metric: str, value, tags: tuple, verbose: bool = True):
+    if type(value) is list:
+        pipeline().distribution(metric, value, tags)
+        if verbose:
+            print(f"DD: {metric} = {len(value)} samples / {list(tags)}")
+    else:
+        pipeline().gauge(metric, value, tags)
+        if verbose:
+            print(f"DD: {metric} = {value} / {list(tags)}")
 
 
 def _datadog(
-    self, target: str, check: str, values: Union[bool, int, str, dict], *args, **kwargs
+    self,
+    target: str,
+    check: str,
+    values: Union[bool, int, str, list, dict],
+    *args,
+    **kwargs,
+):
+    """
+    Submit the check result as metrics if DogstatsD mode or the Prometheus exporter
+    of the serve command is enabled
+
+    Lists of values are sent as distribution, all other values as gauge. Set
+    datadog_verbose: false in the config file to not print the metrics.
+
+    The values are also recorded in the local history if enabled.
+    """
+    with span("metrics", target=target, check=check):
+        self._record_history(target, check, values)
+        submit_metrics(self, target, check, values, kwargs)
+
+
+def submit_metrics(
+    self,
+    target: str,
+    check: str,
+    values: Union[bool, int, str, list, dict],
+    tags: dict = None,
 ):
-    if "datadog" in self._config and self._config.datadog:
-        tags = [f"target:{target}"] + [
-            f"{key}:{value}" for key, value in kwargs.items()
-        ]
-        metric_name = f"{self._config.datadog}.{check}"
+    "Submit the values like _datadog without recording them in the history"
+    datadog = self._config.get("datadog")
+    # set by the serve command with the Prometheus exporter enabled
+    metrics_cache = getattr(self, "_metrics_cache", None)
+    if datadog or metrics_cache is not None:
+        tags = (f"target:{target}",) + tuple(
+            f"{key}:{value}" for key, value in (tags or {}).items()
+        )
+        verbose = self._config.get("datadog_verbose", True)
+        metric_name = f"{datadog or DEFAULT_PREFIX}.{check}"
         if type(values) is dict:
-            for key, value in values.items():
-                submit_datadog(f"{metric_name}.{key}", value, tags)
+            metrics = {f"{metric_name}.{key}": value for key, value in values.items()}
         else:
-            if type(values) is bool:
-                # convert to 1 for True and 0 for False
-                values = [0, 1][values]
-            submit_datadog(metric_name, values, tags)
+            metrics = {metric_name: values}
+        for metric, value in metrics.items():
+            if type(value) is bool:
+                # convert to 1 for True and 0 for False, also inside a dict
+                value = [0, 1][value]
+            if datadog:
+                submit_datadog(metric, value, tags, verbose)
+            if metrics_cache is not None:
+                metrics_cache.update(metric, value, tags)
+
+
+def _datadog_flush(self):
+    "Send the metrics aggregated so far, if any"
+    if __pipeline is not None:
+        __pipeline.flush()
@@ -0,0 +1,177 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Deadlines for check runs
+
+Checks run past their deadline are reported as failed while they keep running in a
+daemon thread. The blocking calls of the speed test libraries can't be interrupted
+and don't time out on their own, these checks run in a separate process that is
+killed at the deadline.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from typing import Callable
+
+from .exceptions import ConnectivityCheckException
+from .profiling import profiled
+
+# checks that run in a killable worker process when they have a deadline
+ISOLATED_CHECKS = ("speed_ookla", "speed_cloudflare")
+
+
+class DeadlineExceeded(ConnectivityCheckException):
+    pass
+
+
+class BatchDeadline:
+    "Track the deadline of a batch of checks, no check may run past the batch deadline"
+
+    def __init__(self, deadline: float = None) -> None:
+        self.deadline = deadline
+        self.start = time.monotonic()
+
+    def remaining(self, deadline: float = None) -> float | None:
+        "Return the deadline of a check that starts now or raise DeadlineExceeded"
+        if self.deadline is None:
+            return deadline
+        elapsed = time.monotonic() - self.start
+        if elapsed >= self.deadline:
+            raise DeadlineExceeded(
+                f"Batch deadline of {self.deadline:.1f}s exceeded after {elapsed:.1f}s"
+            )
+        remaining = self.deadline - elapsed
+        return remaining if deadline is None else min(deadline, remaining)
+
+
+def _exceeded(function_name: str, deadline: float, start: float) -> DeadlineExceeded:
+    return DeadlineExceeded(
+        f"{function_name} exceeded its deadline of {deadline:.1f}s after {time.monotonic() - start:.1f}s"
+    )
+
+
+def _run_in_thread(function: Callable, function_name: str, deadline: float):
+    "Return the result of FUNCTION or raise DeadlineExceeded if it takes too long"
+    context = contextvars.copy_context()
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = context.run(function)
+        except BaseException as e:
+            outcome["error"] = e
+
+    start = time.monotonic()
+    thread = threading.Thread(target=run, name=function_name, daemon=True)
+    thread.start()
+    thread.join(deadline)
+    if thread.is_alive():
+        raise _exceeded(function_name, deadline, start)
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def _isolated_worker(connection, config: dict, function_name: str, kwargs: dict):
+    "Run the check in the worker process and send back its outcome and metrics"
+    from . import ConnectivityChecks
+
+    checks = ConnectivityChecks()
+    checks._update_config(**config)
+    submitted = []
+    checks._datadog = lambda *args, **kwargs: submitted.append((args, kwargs))
+    try:
+        outcome = ("result", getattr(checks, function_name)(**kwargs))
+    except Exception as e:
+        outcome = ("error", e)
+    try:
+        connection.send((*outcome, submitted))
+    except Exception:  # the exception can't be pickled
+        error = ConnectivityCheckException(str(outcome[1]))
+        connection.send(("error", error, submitted))
+    connection.close()
+
+
+def _run_isolated(self, function_name: str, kwargs: dict, deadline: float):
+    """
+    Run the check in a worker process that is killed at the DEADLINE
+
+    The metrics of the check are submitted by this process once the worker is done.
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_isolated_worker,
+        args=(sender, self._config.to_dict(), function_name, kwargs),
+        name=function_name,
+        daemon=True,
+    )
+    start = time.monotonic()
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(deadline):
+            raise _exceeded(function_name, deadline, start)
+        kind, value, submitted = receiver.recv()
+    except EOFError:
+        process.join()
+        raise ConnectivityCheckException(
+            f"{function_name} worker died with exit code {process.exitcode}"
+        )
+    finally:
+        process.join(max(0, start + deadline - time.monotonic()))
+        process.kill()
+        process.join()
+        receiver.close()
+
+    for args, kwargs in submitted:
+        self._datadog(*args, **kwargs)
+    if kind == "error":
+        raise value
+    return value
+
+
+def run_with_deadline(
+    self,
+    function_name: str,
+    kwargs: dict,
+    deadline: float = None,
+    usage: dict = None,
+):
+    """
+    Run the check method FUNCTION_NAME, fail if it doesn't finish within DEADLINE seconds
+
+    The CPU time of the check in ms is stored as cpu in USAGE once it finishes.
+    """
+    check = function_name[len("check_") :]
+
+    def run():
+        cpu = time.thread_time_ns()
+        try:
+            return profiled(check, lambda: getattr(self, function_name)(**kwargs))
+        finally:
+            if usage is not None:
+                usage["cpu"] = (time.thread_time_ns() - cpu) / 1e6
+
+    if deadline is None:
+        return run()
+    if check in ISOLATED_CHECKS:
+        return _run_isolated(self, function_name, kwargs, deadline)
+    return _run_in_thread(run, function_name, deadline)
@@ -12,9 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from requests.exceptions import SSLError, MissingSchema
-from ssl import SSLCertVerificationError
-
 
 class ConnectivityCheckException(Exception):
     pass
+
+
+def __getattr__(name: str):
+    # lazy-load the exceptions of third-party modules to keep the CLI start-up fast
+    if name in ("SSLError", "MissingSchema"):
+        import requests.exceptions
+
+        return getattr(requests.exceptions, name)
+    if name == "SSLCertVerificationError":
+        from ssl import SSLCertVerificationError
+
+        return SSLCertVerificationError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,110 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prometheus exporter for the serve command
+
+The check results are kept in memory as they are reported via _datadog and served
+in the Prometheus text format. A scrape only renders the cached results and never
+runs a check itself.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ADDRESS = "127.0.0.1"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _metric_name(name: str) -> str:
+    "Convert a prefix.check.key metric name to a Prometheus metric name"
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return "_" + name if name[0].isdigit() else name
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(tags: tuple[str, ...]) -> str:
+    "Convert key:value tags to Prometheus labels"
+    labels = []
+    for tag in tags:
+        key, _, value = tag.partition(":")
+        labels.append(f'{_metric_name(key)}="{_escape(value)}"')
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class MetricsCache:
+    "The latest value of every metric and tags combination"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # metric name -> labels -> value
+        self._metrics: dict[str, dict[str, float]] = {}
+        self._rendered: bytes = None
+
+    def update(self, metric: str, value, tags: tuple[str, ...]) -> None:
+        "Store the VALUE of METRIC, only numbers are kept"
+        if isinstance(value, bool):
+            value = int(value)
+        if not isinstance(value, (int, float)):
+            return
+        with self._lock:
+            self._metrics.setdefault(_metric_name(metric), {})[_labels(tags)] = value
+            self._rendered = None
+
+    def render(self) -> bytes:
+        "Return all metrics in the Prometheus text format"
+        with self._lock:
+            if self._rendered is None:
+                lines = []
+                for name, series in sorted(self._metrics.items()):
+                    lines.append(f"# TYPE {name} gauge")
+                    lines += [
+                        f"{name}{labels} {value}"
+                        for labels, value in sorted(series.items())
+                    ]
+                self._rendered = "".join(line + "\n" for line in lines).encode()
+            return self._rendered
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.cache.render()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(
+    cache: MetricsCache, port: int, address: str = DEFAULT_ADDRESS
+) -> ThreadingHTTPServer:
+    "Serve the CACHE on http://ADDRESS:PORT/metrics in a background thread"
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.cache = cache
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,280 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from .exceptions import ConnectivityCheckException
+from .state import state_dir
+
+# days of history to keep
+DEFAULT_RETENTION = 30
+DEFAULT_WINDOWS = "5m,1h,1d"
+# success ratio objective for the error budget
+DEFAULT_SLO = 0.99
+PERCENTILES = (50, 90, 99)
+# one table per UTC day
+SEGMENT_FORMAT = "samples_%Y%m%d"
+# metric for the outcome of a check, 1 for success and 0 for failure
+OUTCOME = "ok"
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+__store_lock = threading.Lock()
+# target of the check that is currently run by the batch mode or the scheduler
+_current_target = ContextVar("history_target", default=None)
+
+
+class HistoryStore:
+    """
+    Append-only SQLite store of check outcomes and values
+
+    The samples are partitioned into one table per day, tables older than RETENTION
+    days are dropped. Queries only read the tables of the requested time range and
+    aggregate the samples, including the percentiles, within SQLite.
+    """
+
+    def __init__(self, path: Path | str, retention: int = DEFAULT_RETENTION) -> None:
+        self.retention = retention
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        self._segments = set(self._segment_names())
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _segment_names(self) -> list[str]:
+        return [
+            name
+            for (name,) in self._db.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'samples_%'"
+            )
+        ]
+
+    def _segment(self, when: float) -> str:
+        "Return the table for the samples at WHEN, creating it and expiring old ones"
+        segment = time.strftime(SEGMENT_FORMAT, time.gmtime(when))
+        if segment not in self._segments:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {segment}"
+                " (time REAL, check_type TEXT, target TEXT, metric TEXT, value REAL)"
+            )
+            self._segments.add(segment)
+            expired = time.strftime(
+                SEGMENT_FORMAT, time.gmtime(when - self.retention * 86400)
+            )
+            for old in sorted(self._segments):
+                if old < expired:
+                    self._db.execute(f"DROP TABLE {old}")
+                    self._segments.discard(old)
+        return segment
+
+    def append(
+        self, check: str, target: str, values: dict[str, float | list], when=None
+    ) -> None:
+        "Store the VALUES of a check run, lists are stored as individual samples"
+        when = time.time() if when is None else when
+        rows = [
+            (when, check, target, metric, sample)
+            for metric, value in values.items()
+            for sample in (value if isinstance(value, list) else [value])
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO {self._segment(when)} VALUES (?, ?, ?, ?, ?)", rows
+            )
+
+    def summary(
+        self,
+        since: float,
+        check: str = None,
+        target: str = None,
+        percentiles: tuple[int, ...] = PERCENTILES,
+    ) -> list[tuple]:
+        """
+        Return (check, target, metric, count, average, *percentiles) for the samples
+        since SINCE, optionally only for CHECK and TARGET
+        """
+        first = time.strftime(SEGMENT_FORMAT, time.gmtime(since))
+        with self._lock:
+            segments = sorted(s for s in self._segments if s >= first)
+        if not segments:
+            return []
+        conditions = "time >= :since"
+        if check:
+            conditions += " AND check_type = :check"
+        if target:
+            conditions += " AND target = :target"
+        samples = " UNION ALL ".join(
+            f"SELECT check_type, target, metric, value FROM {segment} WHERE {conditions}"
+            for segment in segments
+        )
+        # nearest-rank percentiles, the rank is ceil(n * p / 100)
+        percentile_columns = "".join(
+            f", MAX(CASE WHEN rank = (n * {int(p)} + 99) / 100 THEN value END)"
+            for p in percentiles
+        )
+        query = f"""
+            WITH ranked AS (
+                SELECT check_type, target, metric, value,
+                    ROW_NUMBER() OVER metric_window AS rank,
+                    COUNT(*) OVER (PARTITION BY check_type, target, metric) AS n
+                FROM ({samples})
+                WINDOW metric_window AS (
+                    PARTITION BY check_type, target, metric ORDER BY value
+                )
+            )
+            SELECT check_type, target, metric, COUNT(*), AVG(value){percentile_columns}
+            FROM ranked
+            GROUP BY check_type, target, metric
+            ORDER BY check_type, target, metric
+        """
+        with self._lock:
+            return self._db.execute(
+                query, {"since": since, "check": check, "target": target}
+            ).fetchall()
+
+
+def _history_store(self) -> HistoryStore:
+    "Return the history store of this instance"
+    with __store_lock:
+        if getattr(self, "_history_db", None) is None:
+            self._history_db = HistoryStore(
+                state_dir(self) / "history.sqlite",
+                self._config.get("history_retention", DEFAULT_RETENTION),
+            )
+        return self._history_db
+
+
+def _numeric_values(values) -> dict[str, float | list]:
+    "Convert the values given to _datadog to numeric metrics"
+    if not isinstance(values, dict):
+        values = {"value": values}
+    return {
+        key: int(value) if isinstance(value, bool) else value
+        for key, value in values.items()
+        if isinstance(value, (int, float, list))
+    }
+
+
+def _record_history(self, target: str, check: str, values) -> None:
+    "Store the values of a check in the history if enabled"
+    if self._config.get("history"):
+        values = _numeric_values(values)
+        if values:
+            target = _current_target.get() or target
+            _history_store(self).append(check, str(target), values)
+
+
+@contextmanager
+def recording(self, check: str, kwargs: dict):
+    """
+    Store the outcome of the check run in this context in the history if enabled and
+    group the values of the check under the target from its arguments
+    """
+    if not self._config.get("history"):
+        yield
+        return
+    target = str(kwargs.get("target", ""))
+    token = _current_target.set(target)
+    ok = 0
+    try:
+        yield
+        ok = 1
+    finally:
+        _current_target.reset(token)
+        _history_store(self).append(check, target, {OUTCOME: ok})
+
+
+def _duration(duration) -> float:
+    "Convert a duration like 90, 5m, 1h or 7d to seconds"
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd]?)", str(duration).strip())
+    if not match:
+        raise ConnectivityCheckException(
+            f"Invalid duration {duration}, use seconds or a number with s, m, h or d"
+        )
+    return float(match.group(1)) * DURATION_UNITS[match.group(2) or "s"]
+
+
+def _format(value: float | None) -> str:
+    return "-" if value is None else f"{value:.4g}"
+
+
+def history(
+    self,
+    windows: str = DEFAULT_WINDOWS,
+    check: str = None,
+    target: str = None,
+    slo: float = DEFAULT_SLO,
+    config: str = None,
+) -> str:
+    """
+    Show the check history
+
+    Record the check history with --record_history or history: true in the config
+    section, it is kept for history_retention days (default 30) in the state
+    directory.
+
+    For each rolling window in WINDOWS (comma separated durations like 5m, 1h or 7d)
+    show per check and target the number of runs, the error ratio, the error budget
+    burn rate for the SLO success ratio and the average and p50/p90/p99 of all
+    values. Filter with CHECK and TARGET.
+
+    Use the state_dir from the config section of the CONFIG file.
+    """
+    if config:
+        from .checks import _load_config
+
+        _load_config(self, config)
+    if isinstance(windows, str):
+        windows = windows.split(",")
+    elif not isinstance(windows, (list, tuple)):
+        windows = [windows]
+    if not 0 < slo < 1:
+        raise ConnectivityCheckException("slo must be between 0 and 1")
+
+    store = _history_store(self)
+    now = time.time()
+    lines = []
+    for window in windows:
+        rows = store.summary(now - _duration(window), check, target)
+        lines.append(f"Last {window}:" if rows else f"Last {window}: no history")
+        group = None
+        for check_type, check_target, metric, count, average, *percentiles in rows:
+            if (check_type, check_target) != group:
+                group = (check_type, check_target)
+                lines.append(f"  {check_type} {check_target}")
+            if metric == OUTCOME:
+                errors = 1 - average
+                lines.append(
+                    f"    {count} runs, {errors:.2%} errors, burn rate {errors / (1 - slo):.2f}"
+                )
+            else:
+                lines.append(
+                    f"    {metric}: average {_format(average)} "
+                    + " ".join(
+                        f"p{p} {_format(value)}"
+                        for p, value in zip(PERCENTILES, percentiles)
+                    )
+                    + f" ({count} samples)"
+                )
+    return "\n".join(lines)
@@ -0,0 +1,161 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compiled check plans
+
+A plan is the validated content of a config file. Plans are cached as JSON in the
+state directory keyed by the hash of the config file, so unchanged config files skip
+YAML parsing and schema validation. The cache is optional, config files are loaded
+without it if the state directory is not writable.
+
+The plans are kept in the state directory that is set when the config file is
+loaded, a state_dir in the config section of the file itself is not known yet.
+
+Identical check entries of a batch are run once, and sub-steps like certificate
+fetches are shared by the checks of a batch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from .state import state_dir
+
+# bump when config_schema changes the validated data, invalidates all cached plans
+PLAN_VERSION = 8
+# number of cached plans to keep
+PLAN_CACHE_SIZE = 16
+# check arguments that are regexes
+PATTERN_ARGUMENTS = ("content", "issuer")
+
+__shared_lock = threading.Lock()
+
+
+class PlannedCheck(NamedTuple):
+    check: str
+    kwargs: dict
+    options: dict
+
+    @property
+    def function_name(self) -> str:
+        return "check_" + self.check
+
+    @property
+    def description(self) -> str:
+        return f"Check {self.function_name}({str(self.kwargs)})"
+
+
+@lru_cache(maxsize=None)
+def compile_pattern(pattern: str) -> re.Pattern:
+    "Compile a case-insensitive check pattern once per process"
+    return re.compile(pattern, re.IGNORECASE)
+
+
+def compile_patterns(checks_to_run: list[PlannedCheck]) -> None:
+    "Compile the regexes of all checks, raise re.error for invalid ones"
+    for planned in checks_to_run:
+        for key in PATTERN_ARGUMENTS:
+            if planned.kwargs.get(key):
+                compile_pattern(str(planned.kwargs[key]))
+
+
+def entry_key(*entry) -> str:
+    "Return the same key for identical check entries"
+    return json.dumps(entry, sort_keys=True, default=str)
+
+
+@contextmanager
+def sharing(self):
+    "Share the results of sub-steps between the checks run in this context"
+    self._shared_steps = {}
+    try:
+        yield
+    finally:
+        self._shared_steps = None
+
+
+def shared_step(self, key: tuple, function: Callable):
+    """
+    Return the result of FUNCTION or raise its error, run only once per KEY within
+    sharing(), concurrent callers wait for the first one
+    """
+    steps = getattr(self, "_shared_steps", None)
+    if steps is None:
+        return function()
+    with __shared_lock:
+        future = steps.get(key)
+        owner = future is None
+        if owner:
+            future = steps[key] = Future()
+    if owner:
+        try:
+            future.set_result(function())
+        except BaseException as e:
+            future.set_exception(e)
+    return future.result()
+
+
+def config_digest(data: bytes) -> str:
+    return hashlib.sha256(f"{PLAN_VERSION}\n".encode() + data).hexdigest()
+
+
+def _plan_dir(self) -> Path:
+    path = state_dir(self) / "plans"
+    path.mkdir(exist_ok=True)
+    return path
+
+
+def load_plan(self, digest: str) -> dict | None:
+    "Return the cached validated config data for DIGEST or None"
+    try:
+        path = _plan_dir(self) / f"{digest}.json"
+        with open(path, "rb") as plan_file:
+            data = json.load(plan_file)
+        os.utime(path)  # keep recently used plans in the cache
+    except (OSError, ValueError):
+        return None  # missing or broken cache entries are rebuilt
+    return data
+
+
+def store_plan(self, digest: str, data: dict) -> None:
+    "Cache the validated config data and drop the least recently used plans"
+    try:
+        encoded = json.dumps(data)
+    except (TypeError, ValueError):
+        return
+    if json.loads(encoded) != data:
+        return  # e.g. dates or numeric keys don't survive JSON
+    try:
+        plan_dir = _plan_dir(self)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=plan_dir, suffix=".tmp", delete=False
+        ) as plan_file:
+            plan_file.write(encoded)
+        os.replace(plan_file.name, plan_dir / f"{digest}.json")
+        plans = sorted(plan_dir.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in plans[:-PLAN_CACHE_SIZE]:
+            path.unlink(missing_ok=True)
+    except OSError:
+        pass  # the cache is optional
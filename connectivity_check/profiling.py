@@ -0,0 +1,137 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tracing and profiling of check runs
+
+Spans of the checks and their phases are collected while tracing is enabled and
+written as Chrome trace event file, see chrome://tracing or https://ui.perfetto.dev.
+With tracing disabled a span is a shared no-op context manager. The checks can also
+be profiled with cProfile, the statistics are aggregated per check type.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable
+
+# the tracer of the running batch, None when tracing is disabled
+_tracer = None
+_no_span = nullcontext()
+
+
+class Tracer:
+    "Collect spans as Chrome trace events and cProfile statistics per check type"
+
+    def __init__(self, profile_dir: str = None) -> None:
+        self.events: list[dict] = []
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.stats = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, category: str, args: dict):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start / 1e3,
+                "dur": (end - start) / 1e3,
+                "pid": self._pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+            with self._lock:
+                self.events.append(event)
+
+    def profile(self, check: str, function: Callable):
+        "Return the result of FUNCTION and add its profile to the statistics of CHECK"
+        import cProfile
+        import pstats
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active, e.g. of a check still running past its deadline
+            return function()
+        try:
+            return function()
+        finally:
+            profile.disable()
+            with self._lock:
+                if check in self.stats:
+                    self.stats[check].add(profile)
+                else:
+                    self.stats[check] = pstats.Stats(profile)
+
+    def write(self, trace_file: str = None) -> None:
+        "Write the trace events to TRACE_FILE and the statistics to the profile directory"
+        if trace_file:
+            with open(trace_file, "w") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+        if self.profile_dir:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            for check, stats in self.stats.items():
+                stats.dump_stats(self.profile_dir / f"{check}.prof")
+
+
+def elapsed(start: int, end: int = None) -> float:
+    "Milliseconds between the time.perf_counter_ns values START and END or now"
+    return ((time.perf_counter_ns() if end is None else end) - start) / 1e6
+
+
+def span(name: str, category: str = "phase", **args):
+    "Return a context manager that records a span of NAME if tracing is enabled"
+    tracer = _tracer
+    if tracer is None:
+        return _no_span
+    return tracer.span(name, category, args)
+
+
+def profiled(check: str, function: Callable):
+    "Return the result of FUNCTION, profiled as CHECK if profiling is enabled"
+    tracer = _tracer
+    if tracer is None or tracer.profile_dir is None:
+        return function()
+    return tracer.profile(check, function)
+
+
+@contextmanager
+def tracing(trace_file: str = None, profile_dir: str = None):
+    """
+    Record spans in this context and write them to TRACE_FILE at the end, profile
+    the checks if PROFILE_DIR is set
+    """
+    global _tracer
+    if not trace_file and not profile_dir:
+        yield None
+        return
+    tracer = _tracer = Tracer(profile_dir)
+    try:
+        yield tracer
+    finally:
+        _tracer = None
+        tracer.write(trace_file)
@@ -0,0 +1,158 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .profiling import span
+
+# TTL for answers that don't come from DNS, e.g. from /etc/hosts
+DEFAULT_TTL = 60
+# TTL for failed lookups
+NEGATIVE_TTL = 30
+
+# use the cache for lookups without explicit cache argument, see caching()
+_use_cache = ContextVar("use_dns_cache", default=True)
+
+
+class Resolver:
+    """
+    Name resolution with a cache that keeps answers for their DNS record TTL
+
+    The addresses come from the system resolver, so /etc/hosts and nsswitch apply
+    and IPv6 addresses are kept in the preferred order. DNS is only asked for the
+    TTL. Concurrent lookups of the same name share a single query and failed
+    lookups are cached as well.
+    """
+
+    def __init__(self) -> None:
+        # host -> (expiry time, addresses or socket.gaierror)
+        self._cache: dict[str, tuple[float, list[str] | socket.gaierror]] = {}
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _lookup(host: str) -> tuple[list[str], float]:
+        "Return the addresses of HOST and the TTL of the answer"
+        addresses = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(address[4][0] for address in addresses))
+        return addresses, _ttl(host, addresses[0])
+
+    def resolve(self, host: str, cache: bool = None) -> list[str]:
+        """
+        Return the IPv4 and IPv6 addresses of HOST or raise socket.gaierror
+
+        Bypass the cache if CACHE is false, default is the setting from caching()
+        """
+        try:
+            return [str(ipaddress.ip_address(host))]
+        except ValueError:
+            pass
+        if cache is None:
+            cache = _use_cache.get()
+        if not cache:
+            return self._lookup(host)[0]
+
+        with self._lock:
+            expires, result = self._cache.get(host, (0, None))
+            future = owner = None
+            if expires <= time.monotonic():
+                future = self._pending.get(host)
+                if future is None:
+                    future = owner = self._pending[host] = Future()
+
+        if owner is not None:
+            try:
+                try:
+                    result, ttl = self._lookup(host)
+                except socket.gaierror as e:
+                    result, ttl = e, NEGATIVE_TTL
+                with self._lock:
+                    self._cache[host] = (time.monotonic() + ttl, result)
+            except BaseException as e:
+                # other errors are not cached, concurrent lookups fail with them
+                owner.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    del self._pending[host]
+            owner.set_result(result)
+
+        if future is not None:
+            result = future.result()
+        if isinstance(result, socket.gaierror):
+            raise socket.gaierror(*result.args)
+        return result
+
+
+def _ttl(host: str, address: str) -> float:
+    "Return the TTL of the DNS record of HOST with ADDRESS, DEFAULT_TTL if DNS has none"
+    # lazy-load dnspython as it takes a moment to import
+    import dns.exception
+    import dns.resolver
+
+    try:
+        answer = dns.resolver.resolve(
+            host, "AAAA" if ":" in address else "A", search=True
+        )
+    except dns.exception.DNSException:
+        return DEFAULT_TTL
+    # e.g. /etc/hosts overrides the DNS record
+    if address not in {record.address for record in answer}:
+        return DEFAULT_TTL
+    return answer.rrset.ttl
+
+
+resolver = Resolver()
+
+
+def gethostbyname(host: str, cache: bool = None) -> str:
+    "Drop-in replacement for socket.gethostbyname that uses the shared resolver cache"
+    with span("resolve", host=host):
+        addresses = resolver.resolve(host, cache)
+    for address in addresses:
+        if ":" not in address:
+            return address
+    raise socket.gaierror(f"{host} has no IPv4 address")
+
+
+def getaddress(host: str, cache: bool = None) -> str:
+    """
+    Return the preferred IPv4 or IPv6 address of HOST via the shared resolver cache
+
+    Unlike gethostbyname this accepts IPv6 literals and IPv6-only hosts.
+    """
+    with span("resolve", host=host):
+        return resolver.resolve(host, cache)[0]
+
+
+@contextmanager
+def caching(enabled: bool = True):
+    "Enable or disable the resolver cache for lookups in this context"
+    token = _use_cache.set(enabled)
+    try:
+        yield
+    finally:
+        _use_cache.reset(token)
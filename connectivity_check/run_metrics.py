@@ -0,0 +1,69 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Metrics about the check runs themselves
+
+Every check run reports PREFIX.CHECK.run.duration, its wall time in ms, split into
+run.cpu, the CPU time of the thread that ran the check, and run.wait, the time
+blocked on the network and other I/O. run.timeout is 1 for checks that exceeded
+their deadline. The CPU time is not known for checks that run past their deadline
+or in a worker process.
+
+The metrics are not recorded in the history. A batch run reports
+PREFIX.batch.duration in ms, batch.setup, the time to load the config file, and the
+number of checks and failed checks.
+"""
+
+from __future__ import annotations
+
+from .datadog import submit_metrics
+from .profiling import elapsed
+
+
+def report_run(
+    self,
+    check: str,
+    kwargs: dict,
+    start: int,
+    cpu: float = None,
+    timeout: bool = False,
+) -> None:
+    "Submit the metrics of a check run that started at START (time.perf_counter_ns)"
+    duration = elapsed(start)
+    values = {"run.duration": duration, "run.timeout": int(timeout)}
+    if cpu is not None:
+        values["run.cpu"] = cpu
+        values["run.wait"] = max(0.0, duration - cpu)
+    submit_metrics(self, str(kwargs.get("target", "")), check, values)
+
+
+def report_batch(
+    self, config: str, start: int, setup: int, checks: int, failed: int
+) -> None:
+    """
+    Submit the metrics of the batch run of CONFIG that started at START and finished
+    loading the config at SETUP (time.perf_counter_ns)
+    """
+    submit_metrics(
+        self,
+        str(config),
+        "batch",
+        {
+            "duration": elapsed(start),
+            "setup": elapsed(start, setup),
+            "checks": checks,
+            "failed": failed,
+        },
+    )
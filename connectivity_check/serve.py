@@ -0,0 +1,182 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from datetime import datetime
+
+from .checks import _load_config, _run_check
+from .datadog import DEFAULT_PREFIX
+from .exporter import DEFAULT_ADDRESS, MetricsCache, start_metrics_server
+from .plan import PlannedCheck
+from .shard import select_shard
+
+DEFAULT_INTERVAL = 60
+
+
+class Scheduler:
+    "Heap based scheduler that runs every check on its own interval with random jitter"
+
+    def __init__(
+        self,
+        connectivity_checks,
+        checks_to_run: list[PlannedCheck],
+        parallel: int = 1,
+        interval: float = DEFAULT_INTERVAL,
+        jitter: float = 0,
+        deadline: float = None,
+    ) -> None:
+        self.connectivity_checks = connectivity_checks
+        self.checks_to_run = checks_to_run
+        self.parallel = parallel
+        self.intervals = [
+            options.get("interval", interval) for _, _, options in checks_to_run
+        ]
+        self.jitters = [
+            options.get("jitter", jitter) for _, _, options in checks_to_run
+        ]
+        self.deadlines = [
+            options.get("deadline", deadline) for _, _, options in checks_to_run
+        ]
+        self.running: dict[int, Future] = {}
+
+    def _run(self, index: int):
+        planned = self.checks_to_run[index]
+        status = "FAILED"
+        try:
+            print(
+                _run_check(
+                    self.connectivity_checks,
+                    planned.function_name,
+                    planned.kwargs,
+                    self.deadlines[index],
+                )
+            )
+            status = "OK"
+        except Exception as e:
+            print(e)
+        finally:
+            self._export_outcome(planned, status == "OK")
+            print(
+                f"{datetime.now().isoformat(timespec='seconds')} {planned.description} {status}"
+            )
+
+    def _export_outcome(self, planned: PlannedCheck, success: bool):
+        "Export PREFIX.CHECK.success for the Prometheus exporter if enabled"
+        metrics_cache = getattr(self.connectivity_checks, "_metrics_cache", None)
+        if metrics_cache is not None:
+            prefix = self.connectivity_checks._config.get("datadog") or DEFAULT_PREFIX
+            metrics_cache.update(
+                f"{prefix}.{planned.check}.success",
+                success,
+                (f"target:{planned.kwargs.get('target', '')}",),
+            )
+
+    def _submit(self, executor: ThreadPoolExecutor, index: int):
+        if index in self.running and not self.running[index].done():
+            planned = self.checks_to_run[index]
+            print(
+                f"Skipping {planned.function_name}({str(planned.kwargs)}), still running"
+            )
+        else:
+            self.running[index] = executor.submit(self._run, index)
+
+    def run(self, stop: threading.Event = None):
+        "Run the checks until STOP is set"
+        stop = stop or threading.Event()
+        now = time.monotonic()
+        # heap of (due time, index, scheduled time without jitter)
+        schedule = [
+            (now + random.uniform(0, self.jitters[index]), index, now)
+            for index in range(len(self.checks_to_run))
+        ]
+        heapq.heapify(schedule)
+        with ThreadPoolExecutor(max_workers=self.parallel) as executor:
+            while schedule and not stop.is_set():
+                due, index, base = schedule[0]
+                delay = due - time.monotonic()
+                if delay > 0:
+                    stop.wait(delay)
+                    continue
+                heapq.heappop(schedule)
+                self._submit(executor, index)
+                # don't try to catch up with missed runs after a stall
+                base = max(base + self.intervals[index], time.monotonic())
+                heapq.heappush(
+                    schedule,
+                    (base + random.uniform(0, self.jitters[index]), index, base),
+                )
+
+
+def serve(
+    self,
+    config: str,
+    parallel: int = None,
+    metrics_port: int = None,
+    shard_index: int = None,
+    shard_count: int = None,
+    shard_node: str = None,
+):
+    """
+    Run all checks in config file periodically
+
+    Load the CONFIG file once and run each check every interval seconds plus a random
+    jitter of up to jitter seconds. Both can be set per check or as default in the config
+    section, the default interval is 60 seconds. Checks that don't finish within their
+    deadline fail, the deadline can also be set per check or in the config section.
+
+    Run up to PARALLEL checks at the same time. Overrides the parallel setting from the
+    config file, default is 1.
+
+    Serve the latest results in the Prometheus format on http://127.0.0.1:METRICS_PORT/metrics,
+    overrides the metrics_port setting from the config file. Set metrics_address in the
+    config file to listen on another address.
+
+    Run only the share of node SHARD_INDEX of SHARD_COUNT nodes or of SHARD_NODE
+    (default is the host name) of the shard_nodes in the config file, see checks.
+
+    Failed checks are reported and don't stop the schedule, stop with Ctrl-C.
+    """
+    checks_to_run = select_shard(
+        self, _load_config(self, config), shard_index, shard_count, shard_node
+    )
+    if parallel is None:
+        parallel = self._config.get("parallel", 1)
+    if metrics_port is None:
+        metrics_port = self._config.get("metrics_port")
+
+    server = None
+    if metrics_port:
+        self._metrics_cache = MetricsCache()
+        server = start_metrics_server(
+            self._metrics_cache,
+            metrics_port,
+            self._config.get("metrics_address", DEFAULT_ADDRESS),
+        )
+    try:
+        Scheduler(
+            self,
+            checks_to_run,
+            parallel=parallel,
+            interval=self._config.get("interval", DEFAULT_INTERVAL),
+            jitter=self._config.get("jitter", 0),
+            deadline=self._config.get("deadline"),
+        ).run()
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
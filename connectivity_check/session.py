@@ -0,0 +1,177 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import time
+import weakref
+from collections import Counter
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError
+
+from .profiling import elapsed, span
+from .resolver import getaddress
+
+DEFAULT_POOL_SIZE = 10
+# phases of an HTTP request in milliseconds, connections that are reused skip the
+# dns, connect and tls phases
+PHASES = ("dns", "connect", "tls", "ttfb", "transfer", "total")
+
+__lock = threading.Lock()
+# sockets that already carried a request
+__used_sockets = weakref.WeakSet()
+
+
+class _ResolvingConnectionMixin:
+    """
+    Resolve the host name of new connections via the shared resolver cache and time
+    the name resolution, the TCP connect and the TLS handshake
+    """
+
+    def _new_conn(self) -> socket.socket:
+        dns_host = self._dns_host
+        start = time.perf_counter_ns()
+        try:
+            self._dns_host = getaddress(dns_host)
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter_ns()
+        try:
+            with span("connect", host=self.host, port=self.port):
+                return super()._new_conn()
+        finally:
+            self._dns_host = dns_host
+            self.phases = {
+                "dns": elapsed(start, resolved),
+                "connect": elapsed(resolved),
+            }
+
+    def connect(self) -> None:
+        start = time.perf_counter_ns()
+        super().connect()
+        if isinstance(self, HTTPSConnection):
+            # the TLS handshake follows the TCP connect
+            self.phases["tls"] = (
+                elapsed(start) - self.phases["dns"] - self.phases["connect"]
+            )
+
+
+class _HTTPConnection(_ResolvingConnectionMixin, HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_ResolvingConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class _ResolvingHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool,
+            "https": _HTTPSConnectionPool,
+        }
+
+
+def _http_session(self, verify=True) -> requests.Session:
+    """
+    Return the HTTP session shared by all content checks of this instance that
+    verify certificates with VERIFY
+
+    Each CA bundle gets its own session, as requests keys its connection pools by
+    origin only. Each session has one pool per origin, http_pool_size sets the number
+    of pools and connections per pool, http_keep_alive: false disables keep-alive.
+    Cookies are not kept, every check starts like a fresh client.
+    """
+    with __lock:
+        if getattr(self, "_sessions", None) is None:
+            self._sessions = {}
+            self._http_stats = Counter()
+        if verify not in self._sessions:
+            pool_size = self._config.get("http_pool_size", DEFAULT_POOL_SIZE)
+            adapter = _ResolvingHTTPAdapter(
+                pool_connections=pool_size, pool_maxsize=pool_size
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            if not self._config.get("http_keep_alive", True):
+                session.headers["Connection"] = "close"
+            self._sessions[verify] = session
+        return self._sessions[verify]
+
+
+def finish_phases(phases: dict, headers: int) -> None:
+    "Add the transfer time of the body since HEADERS (time.perf_counter_ns) and the total"
+    phases["transfer"] = elapsed(headers)
+    phases["total"] = sum(phases[phase] for phase in PHASES[:-1])
+
+
+def _http_get(
+    self, url: str, stream: bool = False, **kwargs
+) -> tuple[requests.Response, bool]:
+    """
+    GET the URL via the shared HTTP session and read the response body unless STREAM
+    is set, streamed responses must be closed by the caller
+
+    Return the response and whether the request used an already open connection.
+    The timing of the request phases is in response.phases, like response.elapsed in
+    requests. The transfer and total phases of streamed responses are left to the
+    caller.
+    """
+    start = time.perf_counter_ns()
+    session = _http_session(self, kwargs.get("verify", True))
+    with span("request", url=url):
+        response = session.get(url, stream=True, **kwargs)
+    connection = response.raw.connection
+    sock = getattr(connection, "sock", None)
+    # only the first request on a connection includes its set-up
+    phases = dict.fromkeys(PHASES, 0.0)
+    if connection is not None:
+        phases.update(vars(connection).pop("phases", {}))
+    phases["ttfb"] = elapsed(start) - phases["dns"] - phases["connect"] - phases["tls"]
+    response.phases = phases
+    if not stream:
+        headers = time.perf_counter_ns()
+        response.content  # read the body and return the connection to the pool
+        finish_phases(phases, headers)
+    with __lock:
+        reused = sock is not None and sock in __used_sockets
+        if sock is not None:
+            __used_sockets.add(sock)
+        self._http_stats["requests"] += 1
+        self._http_stats["reused"] += reused
+    return response, reused
+
+
+def _http_summary(self) -> str:
+    "Describe the connection reuse of the shared HTTP session"
+    stats = getattr(self, "_http_stats", None)
+    if stats and stats["requests"]:
+        return f"{stats['requests']} HTTP requests, {stats['reused']} on reused connections"
+    return None
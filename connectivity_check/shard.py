@@ -0,0 +1,101 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Sharding of a check config across probe nodes
+
+Every node runs the same config file and picks its share of the checks by
+rendezvous hashing: a check runs on the node with the highest hash of node name and
+check ID. Adding or removing a node only moves the checks of that node. Checks that
+depend on the location of the node run on every node.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import socket
+
+from .exceptions import ConnectivityCheckException
+from .plan import PlannedCheck, entry_key
+
+# checks that run on every node unless the entry sets everywhere: false
+EVERYWHERE_CHECKS = ("routing", "speed_ookla", "speed_cloudflare")
+
+
+def _weight(node: str, check_id: str) -> int:
+    digest = hashlib.blake2b(f"{node}\0{check_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def assign(check_id: str, nodes: list[str]) -> str:
+    "Return the node of NODES that runs the check with CHECK_ID"
+    return max(nodes, key=lambda node: _weight(node, check_id))
+
+
+def _runs_everywhere(planned: PlannedCheck) -> bool:
+    return planned.options.get("everywhere", planned.check in EVERYWHERE_CHECKS)
+
+
+def _shard_nodes(
+    self, shard_index: int = None, shard_count: int = None, shard_node: str = None
+) -> tuple[list[str], str] | None:
+    "Return the nodes and the name of this node or None without sharding"
+    if shard_index is not None or shard_count is not None:
+        if shard_index is None or shard_count is None:
+            raise ConnectivityCheckException(
+                "Set both shard_index and shard_count to run a shard"
+            )
+        if not 0 <= shard_index < shard_count:
+            raise ConnectivityCheckException(
+                f"shard_index must be between 0 and {shard_count - 1}"
+            )
+        return [str(index) for index in range(shard_count)], str(shard_index)
+    nodes = self._config.get("shard_nodes")
+    if not nodes:
+        return None
+    node = shard_node or socket.gethostname()
+    if node not in nodes:
+        raise ConnectivityCheckException(
+            f"Node {node} is not in shard_nodes {', '.join(nodes)}, use --shard_node"
+        )
+    return nodes, node
+
+
+def select_shard(
+    self,
+    checks_to_run: list[PlannedCheck],
+    shard_index: int = None,
+    shard_count: int = None,
+    shard_node: str = None,
+) -> list[PlannedCheck]:
+    """
+    Return the checks of this node, all checks without sharding
+
+    The shard is set by SHARD_INDEX of SHARD_COUNT nodes or by the name of this node,
+    SHARD_NODE or the host name, in shard_nodes of the config section.
+    """
+    shard = _shard_nodes(self, shard_index, shard_count, shard_node)
+    if shard is None:
+        return checks_to_run
+    nodes, node = shard
+    selected = [
+        planned
+        for planned in checks_to_run
+        if _runs_everywhere(planned)
+        or assign(entry_key(planned.check, planned.kwargs), nodes) == node
+    ]
+    print(
+        f"Shard {node} of {len(nodes)} nodes runs {len(selected)} of {len(checks_to_run)} checks"
+    )
+    return selected
@@ -0,0 +1,91 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Last results of the speed tests, kept in a JSON file in the state directory
+
+Bandwidth tests take tens of seconds and transfer hundreds of megabytes. Within
+min_interval seconds the speed checks evaluate the last result again instead of
+measuring.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import Callable
+
+from .state import state_dir
+
+SPEED_RESULTS = "speed.json"
+
+__lock = threading.Lock()
+
+
+def _min_interval(self, min_interval: float = None) -> float:
+    return (
+        self._config.get("speed_min_interval", 0)
+        if min_interval is None
+        else min_interval
+    )
+
+
+def _load(path) -> dict:
+    try:
+        with open(path) as results_file:
+            return json.load(results_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(path, data: dict) -> None:
+    "Replace the JSON file at PATH atomically, other processes may read it"
+    temporary = path.with_suffix(f".{os.getpid()}.tmp")
+    temporary.write_text(json.dumps(data, indent=2))
+    os.replace(temporary, path)
+
+
+def speed_result(
+    self, check: str, target, min_interval: float, measure: Callable[[], dict]
+) -> dict:
+    """
+    Return the last result of the speed test if it is younger than MIN_INTERVAL seconds,
+    otherwise MEASURE and keep the result
+
+    The result contains the age in seconds, 0 for a new measurement.
+    """
+    key = f"{check}:{target}"
+    path = state_dir(self) / SPEED_RESULTS if min_interval else None
+    if path:
+        with __lock:
+            result = _load(path).get(key)
+        if result is not None:
+            age = time.time() - result["measured_at"]
+            if 0 <= age < min_interval:
+                return dict(result, age=age)
+
+    result = dict(measure(), measured_at=time.time())
+    if path:
+        with __lock:
+            results = _load(path)
+            results[key] = result
+            _save(path, results)
+    return dict(result, age=0)
+
+
+def describe_age(result: dict) -> str:
+    "Mark cached results with their age"
+    return f" (cached, measured {result['age']:.0f}s ago)" if result["age"] else ""
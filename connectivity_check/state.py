@@ -0,0 +1,32 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from pathlib import Path
+
+
+def state_dir(self) -> Path:
+    """
+    Return the directory for persistent state like the certificate inventory
+
+    Set with state_dir in the config section, default is connectivity-check in
+    $XDG_STATE_HOME or ~/.local/state
+    """
+    path = self._config.get("state_dir")
+    if not path:
+        base = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+        path = Path(base) / "connectivity-check"
+    path = Path(path).expanduser()
+    path.mkdir(parents=True, exist_ok=True)
+    return path
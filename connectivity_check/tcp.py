@@ -0,0 +1,109 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+TCP connection timing
+
+Connections are timed with time.perf_counter_ns around a connect with timeout, which
+CPython implements as non-blocking connect and poll. On Linux the smoothed RTT and its
+variance that the kernel measured during the handshake are read via TCP_INFO.
+"""
+
+from __future__ import annotations
+
+import socket
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+# offset of tcpi_rtt and tcpi_rttvar (microseconds) in the Linux struct tcp_info
+TCP_INFO_RTT_OFFSET = 68
+TCP_INFO_SIZE = 104
+
+
+class ConnectSample(NamedTuple):
+    connect: float  # connection time in milliseconds
+    rtt: float | None  # kernel smoothed RTT in milliseconds, Linux only
+    rttvar: float | None  # kernel RTT variance in milliseconds, Linux only
+
+    def value(self, kernel_rtt: bool = False) -> float:
+        "The kernel RTT if requested and available, otherwise the connection time"
+        return self.rtt if kernel_rtt and self.rtt is not None else self.connect
+
+
+def kernel_rtt(sock: socket.socket) -> tuple[float, float] | tuple[None, None]:
+    "Return the smoothed RTT and RTT variance in milliseconds the kernel measured"
+    if not hasattr(socket, "TCP_INFO"):
+        return None, None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+    except OSError:
+        return None, None
+    if len(info) < TCP_INFO_RTT_OFFSET + 8:
+        return None, None
+    rtt, rttvar = struct.unpack_from("=II", info, TCP_INFO_RTT_OFFSET)
+    return rtt / 1000, rttvar / 1000
+
+
+def connect_sample(ip: str, port: int, timeout: float) -> ConnectSample | None:
+    "Connect to IP:PORT and return the timing or None if the connection failed"
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        start = time.perf_counter_ns()
+        error = sock.connect_ex((ip, port))
+        elapsed = time.perf_counter_ns() - start
+        if error:
+            return None
+        return ConnectSample(elapsed / 1e6, *kernel_rtt(sock))
+
+
+def measure(
+    ip: str,
+    port: int,
+    timeout: float = 5,
+    runs: int = 3,
+    wait: float = 1,
+    concurrency: int = 1,
+    verbose: bool = False,
+) -> list[ConnectSample | None]:
+    """
+    Make RUNS connections to IP:PORT and return their timing, None for failed ones
+
+    Wait WAIT seconds between the connections or make up to CONCURRENCY connections
+    at the same time without waiting.
+    """
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(
+                executor.map(lambda _: connect_sample(ip, port, timeout), range(runs))
+            )
+    else:
+        samples = []
+        for run in range(runs):
+            if run > 0:
+                time.sleep(wait)
+            samples.append(connect_sample(ip, port, timeout))
+    if verbose:
+        for seq, sample in enumerate(samples):
+            print(f"Connection to {ip}:{port} seq={seq} {describe(sample)}")
+    return samples
+
+
+def describe(sample: ConnectSample | None) -> str:
+    if sample is None:
+        return "failed"
+    if sample.rtt is None:
+        return f"time={sample.connect:.2f} ms"
+    return f"time={sample.connect:.2f} ms rtt={sample.rtt:.2f}/{sample.rttvar:.2f} ms"
@@ -0,0 +1,343 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import asyncio
+import socket
+from pathlib import Path
+
+import httpx
+import pytest
+import yaml
+from cryptography import x509
+from freezegun import freeze_time
+from re_assert import Matches
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check import aio
+from connectivity_check.exceptions import ConnectivityCheckException
+
+with open(Path(__file__).parent / "cert.der", "rb") as f:
+    test_certificate_der = f.read()
+test_certificate_start_date = x509.load_der_x509_certificate(
+    test_certificate_der
+).not_valid_before
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    return tmp_path / "config.yaml"
+
+
+@pytest.fixture
+def http_mock(mocker):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text="Lorem ipsum dolor sit amet")
+
+    transport = httpx.MockTransport(handler)
+    async_client = httpx.AsyncClient
+    return mocker.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda **kwargs: async_client(transport=transport, **kwargs),
+    )
+
+
+@pytest.fixture
+def listening_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(10)
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        return server.getsockname()[1]
+
+
+def test_aio_check_cert(mocker):
+    getaddress = mocker.patch(
+        "connectivity_check.aio.getaddress", return_value="93.184.216.34"
+    )
+    writer = mocker.Mock()
+    writer.get_extra_info().getpeercert.return_value = test_certificate_der
+    open_connection = mocker.patch(
+        "asyncio.open_connection",
+        side_effect=mocker.AsyncMock(return_value=(mocker.Mock(), writer)),
+    )
+    result = asyncio.run(
+        aio.check_cert(ConnectivityChecks(), "https://www.example.com:808")
+    )
+    Matches("(?s)Fetched.*808.*issued.*example").assert_matches(result)
+    getaddress.assert_called_once_with("www.example.com", True)
+    assert open_connection.call_args.args == ("93.184.216.34", 808)
+    assert open_connection.call_args.kwargs["server_hostname"] == "www.example.com"
+    writer.close.assert_called_once()
+
+
+def test_aio_check_content(http_mock):
+    c = ConnectivityChecks()
+    result = asyncio.run(aio.check_content(c, "https://example.com", "Lorem.*amet"))
+    assert result == "Content from https://example.com matches »Lorem.*amet«"
+
+
+def test_aio_check_content_phases(mocker):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        # the connection events that httpcore reports to the trace extension
+        trace = request.extensions["trace"]
+        for step in ("connect_tcp", "start_tls"):
+            await trace(f"connection.{step}.started", {})
+            await trace(f"connection.{step}.complete", {})
+        return httpx.Response(200, text="Lorem ipsum dolor sit amet")
+
+    async_client = httpx.AsyncClient
+    mocker.patch(
+        "httpx.AsyncClient",
+        side_effect=lambda **kwargs: async_client(
+            transport=httpx.MockTransport(handler), **kwargs
+        ),
+    )
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    with pytest.raises(ConnectivityCheckException, match="exceeds.* total .* \\(0\\)"):
+        asyncio.run(
+            aio.check_content(
+                ConnectivityChecks(),
+                "https://example.com",
+                "Lorem",
+                phases={"total": 0},
+            )
+        )
+    timing = datadog.call_args.kwargs["values"]
+    assert timing["connect"] > 0 and timing["tls"] > 0 and timing["dns"] == 0
+    assert timing["total"] == pytest.approx(sum(list(timing.values())[:-1]))
+
+
+def test_aio_check_content_unknown_phase():
+    with pytest.raises(ConnectivityCheckException, match="Unknown phases foo"):
+        asyncio.run(
+            aio.check_content(
+                ConnectivityChecks(), "https://example.com", "Lorem", phases={"foo": 1}
+            )
+        )
+
+
+def test_aio_check_content_dump(http_mock):
+    async def check_twice(c):
+        first = await aio.check_content(c, "https://example.com/path", ca="ca.pem")
+        second = await aio.check_content(c, "https://example.com/path", ca="ca.pem")
+        await aio.close_http_clients(c)
+        return first, second
+
+    first, second = asyncio.run(check_twice(ConnectivityChecks()))
+    pattern = Matches("(?s)< GET /path.*> HTTP/1.1 200.*Lorem ipsum dolor sit amet")
+    pattern.assert_matches(first)
+    assert first == second
+    http_mock.assert_called_once_with(verify="ca.pem", follow_redirects=True)
+
+
+def test_aio_check_content_not_matching(http_mock):
+    with pytest.raises(ConnectivityCheckException, match="fails content match"):
+        asyncio.run(
+            aio.check_content(ConnectivityChecks(), "https://example.com", "foo")
+        )
+
+
+@pytest.mark.parametrize("verbose", [True, False])
+def test_aio_check_latency(listening_port, capsys, verbose):
+    result = asyncio.run(
+        aio.check_latency(
+            ConnectivityChecks(),
+            f"127.0.0.1:{listening_port}",
+            latency=1000,
+            runs=2,
+            wait=0,
+            verbose=verbose,
+        )
+    )
+    assert result.startswith(f"TCP connection latency to 127.0.0.1:{listening_port}")
+    assert capsys.readouterr().out.count("time=") == (2 if verbose else 0)
+
+
+def test_aio_check_latency_concurrent(listening_port):
+    result = asyncio.run(
+        aio.check_latency(
+            ConnectivityChecks(),
+            f"127.0.0.1:{listening_port}",
+            latency=1000,
+            runs=10,
+            concurrency=4,
+            percentile=90,
+        )
+    )
+    assert result.startswith(
+        f"TCP connection p90 latency to 127.0.0.1:{listening_port}"
+    )
+
+
+def test_aio_check_latency_failed(closed_port):
+    with pytest.raises(ConnectivityCheckException, match="failed"):
+        asyncio.run(
+            aio.check_latency(
+                ConnectivityChecks(), f"127.0.0.1:{closed_port}", latency=1, wait=0
+            )
+        )
+
+
+def test_aio_check_latency_unresolvable(mocker):
+    mocker.patch(
+        "connectivity_check.aio.gethostbyname",
+        side_effect=socket.gaierror("no such host"),
+    )
+    with pytest.raises(ConnectivityCheckException, match="example.com:443 failed"):
+        asyncio.run(aio.check_latency(ConnectivityChecks(), "example.com", latency=1))
+
+
+@pytest.mark.parametrize(
+    "check", ["https", "routing", "speed_ookla", "speed_cloudflare"]
+)
+def test_aio_threaded_checks(mocker, check):
+    mock = mocker.patch.object(ConnectivityChecks, f"check_{check}", return_value="OK")
+    c = ConnectivityChecks()
+    result = asyncio.run(getattr(aio, f"check_{check}")(c, "foo", bar="baz"))
+    assert result == "OK"
+    mock.assert_called_once_with("foo", bar="baz")
+
+
+@pytest.fixture
+def async_checks(mocker):
+    async def cert(self, **kwargs):
+        await asyncio.sleep(kwargs.get("delay", 0))
+        if kwargs.get("fail"):
+            raise ConnectivityCheckException("cert failed")
+        return f"cert {kwargs}"
+
+    async def content(self, target):
+        raise ValueError("broken")
+
+    return mocker.patch.dict(aio.ASYNC_CHECKS, cert=cert, content=content)
+
+
+def test_aio_run_checks(config_file, async_checks):
+    config_content = {
+        "config": {"parallel": 2},
+        "checks": [
+            {"cert": {"delay": 0.2}},
+            {"cert": {"delay": 0.1, "fail": True}},
+            {"cert": {}},
+            {"content": {"target": "foo"}},
+            {"content": {"invalid": "foo"}},
+        ],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    results = asyncio.run(aio.run_checks(ConnectivityChecks(), config_file, all=True))
+    assert [description for description, _ in results] == [
+        "Check check_cert({'delay': 0.2})",
+        "Check check_cert({'delay': 0.1, 'fail': True})",
+        "Check check_cert({})",
+        "Check check_content({'target': 'foo'})",
+        "Check check_content({'invalid': 'foo'})",
+    ]
+    assert results[0][1] == "cert {'delay': 0.2}"
+    assert str(results[1][1]) == "cert failed"
+    assert results[2][1] == "cert {}"
+    assert str(results[3][1]) == "broken"
+    assert "Error in check parameters" in str(results[4][1])
+
+
+def test_aio_run_checks_fail_fast(config_file, async_checks):
+    config_content = {
+        "checks": [{"cert": {"fail": True}}] + [{"cert": {"delay": 10}}] * 10
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+
+    async def run():
+        with pytest.raises(ConnectivityCheckException, match="cert failed"):
+            await aio.run_checks(ConnectivityChecks(), config_file, parallel=5)
+        # all remaining checks are cancelled
+        assert len(asyncio.all_tasks()) == 1
+
+    asyncio.run(run())
+
+
+@freeze_time(test_certificate_start_date)
+def test_aio_check_cert_inventory(mocker, tmp_path):
+    mocker.patch("connectivity_check.aio.getaddress", return_value="93.184.216.34")
+    writer = mocker.Mock()
+    writer.get_extra_info().getpeercert.return_value = test_certificate_der
+    open_connection = mocker.patch(
+        "asyncio.open_connection",
+        side_effect=mocker.AsyncMock(return_value=(mocker.Mock(), writer)),
+    )
+    c = ConnectivityChecks()
+    c._update_config(state_dir=str(tmp_path), cert_refresh=3600)
+    first = asyncio.run(aio.check_cert(c, "www.example.com", validity=0))
+    second = asyncio.run(aio.check_cert(c, "www.example.com", validity=0))
+    assert first == second
+    open_connection.assert_called_once()
+
+
+def test_aio_run_checks_deadline(config_file, async_checks, mocker):
+    run_isolated = mocker.patch(
+        "connectivity_check.aio._run_isolated", return_value="speed OK"
+    )
+    config_content = {
+        "config": {"deadline": 0.1, "batch_deadline": 10},
+        "checks": [
+            {"cert": {"delay": 1}},
+            {"cert": {"delay": 0.2, "deadline": 1}},
+            {"speed_ookla": {"target": "foo"}},
+        ],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    results = asyncio.run(aio.run_checks(c, config_file, all=True))
+    assert str(results[0][1]) == "check_cert exceeded its deadline of 0.1s after 0.1s"
+    assert results[1][1] == "cert {'delay': 0.2}"
+    assert results[2][1] == "speed OK"
+    run_isolated.assert_called_once_with(
+        c, "check_speed_ookla", {"target": "foo"}, mocker.ANY
+    )
+    assert 0 < run_isolated.call_args.args[3] <= 0.1
+
+
+def test_aio_run_checks_metrics(config_file, async_checks, mocker):
+    report_run = mocker.patch("connectivity_check.aio.report_run")
+    report_batch = mocker.patch("connectivity_check.aio.report_batch")
+    config_content = {
+        "config": {"parallel": 1},
+        "checks": [
+            {"cert": {"delay": 0.2, "deadline": 0.05}},
+            {"cert": {}},
+            {"cert": {"fail": True}},
+        ],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    asyncio.run(aio.run_checks(c, config_file, all=True))
+    timeouts = [call.kwargs["timeout"] for call in report_run.call_args_list]
+    assert timeouts == [True, False, False]
+    report_batch.assert_called_once_with(c, config_file, mocker.ANY, mocker.ANY, 3, 2)
+
+
+def test_aio_run_checks_batch_deadline(config_file, async_checks):
+    config_content = {
+        "config": {"batch_deadline": 0.1, "parallel": 1},
+        "checks": [{"cert": {"delay": 0.2}}, {"cert": {}}],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    results = asyncio.run(aio.run_checks(ConnectivityChecks(), config_file, all=True))
+    assert str(results[0][1]) == "check_cert exceeded its deadline of 0.1s after 0.1s"
+    assert str(results[1][1]).startswith("Batch deadline of 0.1s exceeded")
@@ -0,0 +1,49 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+import pytest
+
+import connectivity_check.datadog
+from benchmarks.__main__ import Benchmarks
+from connectivity_check.datadog import DD_OPTIONS
+
+
+def test_benchmarks(tmp_path, capsys, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    state_home = os.environ.get("XDG_STATE_HOME")
+    dd_options = dict(DD_OPTIONS)
+    result_file = tmp_path / "results" / "baseline.json"
+    path = Benchmarks().run(count=1, sizes=3, output=str(tmp_path / "results"))
+    # the benchmark settings don't leak into the process
+    assert os.environ.get("XDG_STATE_HOME") == state_home
+    assert DD_OPTIONS == dd_options
+    assert getattr(connectivity_check.datadog, "__pipeline") is None
+    results = json.loads(open(path).read())
+    assert {"check_content", "check_cert", "check_latency"} <= set(results["results"])
+    datadog = results["results"]["datadog[3]"]
+    # 4 flushes (with warm-up) of 3 gauges and 3 distributions, packed in datagrams
+    assert datadog["metrics"] >= 4 * 3 * 2
+    assert datadog["datagrams"] < datadog["metrics"]
+    assert results["results"]["checks_batch[3]"]["ops_per_second"] > 0
+
+    # a baseline that was twice as fast
+    for result in results["results"].values():
+        result["ops_per_second"] *= 2
+    result_file.write_text(json.dumps(results))
+    with pytest.raises(SystemExit, match="regressed"):
+        Benchmarks().compare(str(result_file), path)
+    assert "REGRESSION" in capsys.readouterr().out
@@ -12,8 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import ssl
 from pathlib import Path
-from datetime import timedelta
+from datetime import datetime, timedelta
 from cryptography import x509
 
 import pytest
@@ -21,7 +22,9 @@ from re_assert import Matches
 from freezegun import freeze_time
 
 from connectivity_check import ConnectivityChecks
+from connectivity_check.cert_store import CertStore
 from connectivity_check.check_cert import CertDetails
+from connectivity_check.state import state_dir
 from connectivity_check.exceptions import ConnectivityCheckException
 
 # Notes:
@@ -44,6 +47,9 @@ def check_cert_mock(mocker):
     """
     mock_socket = mocker.Mock()
     mock_socket.getpeercert.return_value = test_certificate_der
+    mocker.patch(
+        "connectivity_check.check_cert.getaddress", return_value="93.184.216.34"
+    )
     mocker.patch("socket.create_connection")
     mocker.patch("ssl.SSLContext.wrap_socket", return_value=mock_socket)
     mocker.patch("socket.socket")
@@ -95,3 +101,99 @@ def test_check_cert_already_expired():
         ConnectivityChecks().check_cert(
             target="www.example.com", issuer="example", validity=50
         )
+
+
+@pytest.fixture
+def inventory(tmp_path):
+    c = ConnectivityChecks()
+    c._update_config(state_dir=str(tmp_path))
+    return c
+
+
+@freeze_time(test_certificate_start_date)
+def test_check_cert_inventory_reused(inventory):
+    first = inventory.check_cert(target="www.example.com", issuer="example", refresh=60)
+    ssl.SSLContext.wrap_socket.reset_mock()
+    second = inventory.check_cert(
+        target="www.example.com", issuer="example", refresh=60
+    )
+    assert first == second
+    ssl.SSLContext.wrap_socket.assert_not_called()
+    fields = inventory._cert_inventory.get("www.example.com", 443)
+    assert fields["fingerprint"] == cert_details.fingerprint
+    assert fields["alt_names"] == cert_details.altNames
+
+
+def test_check_cert_inventory_refresh_elapsed(inventory):
+    with freeze_time(test_certificate_start_date) as frozen_time:
+        inventory._update_config(cert_refresh=60)
+        inventory.check_cert(target="www.example.com", issuer="example")
+        frozen_time.tick(60)
+        inventory.check_cert(target="www.example.com", issuer="example")
+    assert ssl.SSLContext.wrap_socket.call_count == 2
+
+
+@freeze_time(test_certificate_start_date)
+def test_check_cert_inventory_expires_soon(inventory):
+    inventory.check_cert(target="www.example.com", validity=5, refresh=60)
+    # the certificate expires in 10 days
+    inventory.check_cert(target="www.example.com", validity=10, refresh=60)
+    assert ssl.SSLContext.wrap_socket.call_count == 2
+
+
+@freeze_time(test_certificate_start_date)
+def test_check_cert_inventory_disabled(inventory, tmp_path):
+    inventory.check_cert(target="www.example.com")
+    inventory.check_cert(target="www.example.com")
+    assert ssl.SSLContext.wrap_socket.call_count == 2
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_cert_store_expiring(tmp_path):
+    store = CertStore(tmp_path / "certs.sqlite")
+    for host, days in (("late", 30), ("soon", 3), ("sooner", 1)):
+        store.put(
+            host,
+            443,
+            fingerprint="00",
+            issuer="CN=issuer",
+            subject=f"CN={host}",
+            alt_names=[host],
+            not_valid_before=datetime(2023, 1, 1),
+            not_valid_after=datetime(2023, 1, 1) + timedelta(days=days),
+            fetched_at=0,
+        )
+    assert store.expiring(datetime(2023, 1, 10)) == [
+        ("sooner", 443, datetime(2023, 1, 2)),
+        ("soon", 443, datetime(2023, 1, 4)),
+    ]
+    assert store.get("other", 443) is None
+    store.close()
+
+
+def test_state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path))
+    assert state_dir(ConnectivityChecks()) == tmp_path / "connectivity-check"
+    monkeypatch.delenv("XDG_STATE_HOME")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert state_dir(ConnectivityChecks()) == (
+        tmp_path / ".local" / "state" / "connectivity-check"
+    )
+    assert (tmp_path / ".local" / "state" / "connectivity-check").is_dir()
+
+
+@freeze_time(test_certificate_start_date)
+def test_check_cert_shared_in_batch(tmp_path, capsys):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        "checks:\n"
+        "  - cert: {target: www.example.com, issuer: example}\n"
+        "  - cert: {target: 'https://www.example.com/', issuer: MyCompany}\n"
+        "  - cert: {target: www.example.org}\n"
+    )
+    ConnectivityChecks().checks(config_file)
+    assert ssl.SSLContext.wrap_socket.call_count == 2
+    assert "0 failed and 3 successful checks" in capsys.readouterr().out
+    # the certificate is fetched again by the next batch
+    ConnectivityChecks().check_cert("www.example.com")
+    assert ssl.SSLContext.wrap_socket.call_count == 3
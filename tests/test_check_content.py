@@ -16,6 +16,7 @@ import pytest
 from re_assert import Matches
 
 from connectivity_check import ConnectivityChecks
+from connectivity_check.check_content import ContentMatcher
 from connectivity_check.exceptions import ConnectivityCheckException
 
 
@@ -40,8 +41,96 @@ def test_check_content_not_matching():
         ConnectivityChecks().check_content("https://example.com", "foo")
 
 
+def test_check_content_phase_thresholds():
+    with pytest.raises(
+        ConnectivityCheckException,
+        match=r"(?s)matches »Lorem« but exceeds the phase thresholds ttfb \d+\.\d ms \(0\)"
+        r"\ndns 0\.0 ms, connect 0\.0 ms, tls 0\.0 ms, ttfb .*, total",
+    ):
+        ConnectivityChecks().check_content(
+            "https://example.com", "Lorem", phases={"ttfb": 0, "total": 10_000}
+        )
+
+
+def test_check_content_unknown_phase():
+    with pytest.raises(
+        ConnectivityCheckException,
+        match="Unknown phases dsn, use dns, connect, tls, ttfb, transfer, total",
+    ):
+        ConnectivityChecks().check_content(
+            "https://example.com", "Lorem", phases={"dsn": 10}
+        )
+
+
 def test_check_content_dump_content():
     result = ConnectivityChecks().check_content("https://example.com")
     # dump shows < request ... and > response
     pattern = Matches("(?s)< GET.*> HTTP/.*200.*Lorem ipsum dolor sit amet")
     pattern.assert_matches(result)
+
+
+def test_check_content_max_bytes(mock):
+    mock.get("https://example.com/long", text="Lorem ipsum dolor sit amet")
+    with pytest.raises(
+        ConnectivityCheckException, match="(?s)first 11 bytes.*Lorem ipsum$"
+    ):
+        ConnectivityChecks().check_content(
+            "https://example.com/long", "amet", max_bytes=11
+        )
+
+
+def test_content_matcher_spans_chunks():
+    matcher = ContentMatcher("ipsum dolor")
+    assert not matcher.feed(b"Lorem ip")
+    assert not matcher.feed(b"sum d")  # only searched again once the text doubled
+    assert matcher.feed(b"olor sit amet")
+    assert matcher.matched and matcher.size == 26
+
+
+def test_content_matcher_finish():
+    matcher = ContentMatcher("»amet«", encoding="utf-8")
+    body = "Lorem ipsum dolor sit »amet«".encode()
+    for chunk in (body[:-1], body[-1:]):  # split within a multi-byte character
+        matcher.feed(chunk)
+    assert not matcher.matched
+    matcher.finish()
+    assert matcher.matched and matcher.text == body.decode()
+    matcher.finish()
+
+
+@pytest.mark.parametrize(
+    "content, chunks",
+    [
+        (r"status: ok\b", [b"status: ok", b"ay, degraded"]),
+        ("ok$", [b"ok", b"ay"]),
+        ("ok$", [b"ok\n", b"ay"]),
+        ("healthy(?!: false)", [b"healthy", b": false"]),
+        ("healthy(?!: false)", [b"healthy: f", b"alse"]),
+    ],
+)
+def test_content_matcher_chunk_boundary(content, chunks):
+    matcher = ContentMatcher(content)
+    for chunk in chunks:
+        assert not matcher.feed(chunk)
+    matcher.finish()
+    assert not matcher.matched
+
+
+def test_content_matcher_later_match():
+    # the first match touches the end of the text, a later one is complete
+    matcher = ContentMatcher(r"a.*b|c")
+    assert matcher.feed(b"a c  b")
+    matcher = ContentMatcher(r"ok\b")
+    assert matcher.feed(b"status: ok, ")
+    matcher = ContentMatcher("healthy(?!: false)")
+    assert not matcher.feed(b"healthy: true, ")
+    matcher.finish()
+    assert matcher.matched
+
+
+def test_content_matcher_max_bytes():
+    matcher = ContentMatcher("sit", max_bytes=12)
+    assert not matcher.feed(b"Lorem ")
+    assert matcher.feed(b"ipsum dolor sit amet")
+    assert matcher.truncated and not matcher.matched
+    assert matcher.text == "Lorem ipsum "
@@ -0,0 +1,208 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.servers import _self_signed_certificate
+from connectivity_check import ConnectivityChecks, datadog
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.plan import sharing
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"Lorem ipsum dolor sit amet {self.path}".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ca(tmp_path):
+    return _self_signed_certificate(tmp_path)
+
+
+@pytest.fixture
+def https_server(ca):
+    "HTTPS server with a self-signed certificate for localhost, yields the base URL"
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*ca)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"https://localhost:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_check_https_details(https_server, ca):
+    result = ConnectivityChecks().check_https(https_server, ca=str(ca[0]))
+    assert result.startswith(f"HTTPS {https_server} details\nHTTP 200, connect ")
+    assert "Certificate CN=localhost\n  issued by CN=localhost" in result
+
+
+def test_check_https_all_good(https_server, ca, mocker):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    target = f"{https_server}/page?q=1"
+    result = ConnectivityChecks().check_https(
+        target,
+        content=r"amet /page\?q=1",
+        issuer="localhost",
+        latency=1000,
+        ca=str(ca[0]),
+    )
+    assert result.startswith(f"HTTPS {target} passes all checks\nHTTP 200")
+    values = datadog.call_args.kwargs["values"]
+    assert datadog.call_args.kwargs["check"] == "https"
+    assert {key: values[key] for key in ("cert", "content", "latency", "status")} == {
+        "cert": True,
+        "content": True,
+        "latency": True,
+        "status": 200,
+    }
+    assert values["validity"] == 89
+    assert values["connect"] > 0 and values["handshake"] > 0 and values["response"] > 0
+
+
+def test_check_https_failures(https_server, ca, mocker):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    with pytest.raises(ConnectivityCheckException) as e:
+        ConnectivityChecks().check_https(
+            https_server,
+            content="foo",
+            issuer="bar",
+            validity=100,
+            latency=0,
+            ca=str(ca[0]),
+            max_bytes=10,
+        )
+    message = str(e.value)
+    assert message.startswith(
+        f"HTTPS {https_server} certificate fails issuer match »bar« or expires before 100 days, "
+        "content fails content match »foo« in the first 10 bytes, "
+        "connect time exceeds 0 ms\nHTTP 200"
+    )
+    assert message.endswith("\n\nLorem ipsu")
+    values = datadog.call_args.kwargs["values"]
+    assert (values["cert"], values["content"], values["latency"]) == (
+        False,
+        False,
+        False,
+    )
+
+
+def test_check_https_validity(https_server, ca):
+    with pytest.raises(ConnectivityCheckException, match="expires before 100 days"):
+        ConnectivityChecks().check_https(
+            https_server, issuer="localhost", validity=100, ca=str(ca[0])
+        )
+
+
+def test_check_https_untrusted(https_server, mocker):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    with pytest.raises(
+        ConnectivityCheckException,
+        match="(?s)HTTPS connection to localhost:.* failed:.*certificate verify failed"
+        ".*\nCertificate CN=localhost\n  issued by CN=localhost",
+    ):
+        ConnectivityChecks().check_https(
+            https_server, issuer="localhost", content="Lorem", latency=1000
+        )
+    values = datadog.call_args.kwargs["values"]
+    assert values["cert"] is False and values["content"] is False
+    assert values["latency"] is True and values["validity"] > 0
+    assert set(values) == {"connect", "validity", "cert", "content", "latency"}
+
+
+def test_check_https_untrusted_statsd(https_server, mocker):
+    "The sub-check results reach DogStatsD as valid gauges"
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as statsd:
+        statsd.bind(("127.0.0.1", 0))
+        statsd.settimeout(2)
+        mocker.patch.dict(datadog.DD_OPTIONS, statsd_port=statsd.getsockname()[1])
+        datadog.close_pipeline()
+        c = ConnectivityChecks(datadog="prefix")
+        c._update_config(datadog_verbose=False)
+        with pytest.raises(ConnectivityCheckException):
+            c.check_https(https_server, issuer="localhost", latency=1000)
+        datadog.close_pipeline()
+        lines = statsd.recv(65535).decode().splitlines()
+    gauges = {line.split("|")[0] for line in lines}
+    assert {"prefix.https.cert:0", "prefix.https.latency:1"} <= gauges
+    assert not [line for line in lines if "True" in line or "False" in line]
+
+
+def test_check_https_untrusted_shares_fetch(https_server, mocker):
+    c = ConnectivityChecks()
+    with sharing(c):
+        with pytest.raises(ConnectivityCheckException):
+            c.check_https(https_server, issuer="localhost")
+        fetch = mocker.patch("connectivity_check.check_cert._fetch_cert")
+        result = c.check_cert(https_server, issuer="localhost")
+    # the cert check of the same batch reuses the certificate
+    fetch.assert_not_called()
+    assert result.startswith("Certificate from localhost matches issuer")
+
+
+def test_check_https_untrusted_fetch_fails(https_server, mocker):
+    mocker.patch(
+        "connectivity_check.check_https._fetch_cert",
+        side_effect=ConnectionResetError("reset"),
+    )
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    with pytest.raises(ConnectivityCheckException, match="certificate verify failed"):
+        ConnectivityChecks().check_https(https_server, issuer="localhost")
+    assert datadog.call_args.kwargs["values"] == {
+        "connect": mocker.ANY,
+        "cert": False,
+    }
+
+
+def test_check_https_ca_directory(https_server, tmp_path):
+    # the directory contains no certificates with hash names
+    with pytest.raises(ConnectivityCheckException, match="certificate verify failed"):
+        ConnectivityChecks().check_https(https_server, ca=str(tmp_path))
+
+
+def test_check_https_connection_refused(mocker):
+    mocker.patch("connectivity_check.check_https.getaddress", return_value="127.0.0.1")
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    with pytest.raises(ConnectivityCheckException, match="example.com:1 failed"):
+        ConnectivityChecks().check_https("https://example.com:1/", latency=100)
+    assert datadog.call_args.kwargs["values"] == {"latency": False}
+
+
+@pytest.mark.parametrize("target", ["http://example.com/", "example.com"])
+def test_check_https_invalid_target(target):
+    with pytest.raises(ConnectivityCheckException, match="is not an HTTPS URL"):
+        ConnectivityChecks().check_https(target)
+
+
+def test_check_https_content_mismatch(https_server, ca):
+    with pytest.raises(ConnectivityCheckException) as e:
+        ConnectivityChecks().check_https(https_server, content="foo", ca=str(ca[0]))
+    assert str(e.value).startswith(
+        f"HTTPS {https_server} content fails content match »foo«\nHTTP 200"
+    )
+    assert str(e.value).endswith("\n\nLorem ipsum dolor sit amet /")
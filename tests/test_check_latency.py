@@ -13,36 +13,153 @@
 # limitations under the License.
 
 import pytest
+from socket import gaierror
+from unittest.mock import call
 
 from connectivity_check.__main__ import ConnectivityCheckException, ConnectivityChecks
+from connectivity_check.check_latency import _latency_statistics
+from connectivity_check.tcp import ConnectSample
+
+
+@pytest.fixture(autouse=True)
+def gethostbyname_mock(mocker):
+    return mocker.patch(
+        "connectivity_check.check_latency.gethostbyname", return_value="1.2.3.4"
+    )
+
+
+def samples(*connect_times):
+    return [
+        None if connect is None else ConnectSample(connect, connect / 2, 1.0)
+        for connect in connect_times
+    ]
+
+
+@pytest.fixture
+def sample_mock(mocker):
+    return mocker.patch(
+        "connectivity_check.tcp.connect_sample", side_effect=samples(20.1, 30.1, 40.1)
+    )
 
 
 @pytest.fixture
-def tcp_latency_mock(mocker):
-    return mocker.patch("tcp_latency.measure_latency", return_value=[20.1, 30.1, 40.1])
+def sleep_mock(mocker):
+    return mocker.patch("time.sleep")
 
 
-def test_check_latency(tcp_latency_mock):
+def test_check_latency(sample_mock, sleep_mock, capsys):
     checks = ConnectivityChecks()
     result = checks.check_latency(
         target="https://example.com:123", latency=50, verbose=True
     )
-    tcp_latency_mock.assert_called_once_with("example.com", 123, 5, 3, 1, True)
+    sample_mock.assert_called_with("1.2.3.4", 123, 5)
+    assert sample_mock.call_count == 3
+    # wait only between the connections
+    assert sleep_mock.call_args_list.count(call(1)) == 2
     assert result == "TCP connection latency to example.com:123 is 30 (limit 50)"
+    assert "seq=2 time=40.10 ms rtt=20.05/1.00 ms" in capsys.readouterr().out
+
+
+def test_check_latency_kernel_rtt(sample_mock, sleep_mock):
+    checks = ConnectivityChecks()
+    result = checks.check_latency(target="example.com", latency=50, kernel_rtt=True)
+    assert result == "TCP connection latency to example.com:443 is 15 (limit 50)"
 
 
-def test_check_latency_too_high(tcp_latency_mock):
+def test_check_latency_too_high(sample_mock, sleep_mock):
     checks = ConnectivityChecks()
     with pytest.raises(ConnectivityCheckException, match="exceeding the limit of 1"):
         checks.check_latency(target="example.com:123", latency=1, verbose=True)
 
 
-def test_check_latency_error(tcp_latency_mock):
-    tcp_latency_mock.return_value = (
-        []
-    )  # tcp_latency.measure_latency returns an empty list on any kind of error
+def test_check_latency_error(sample_mock, sleep_mock):
+    sample_mock.side_effect = samples(None, None, None)
     checks = ConnectivityChecks()
     with pytest.raises(
         ConnectivityCheckException, match="TCP connection to example.com:443 failed"
     ):
         checks.check_latency(target="example.com", latency=1)
+
+
+def test_check_latency_dns_error(sample_mock, gethostbyname_mock):
+    gethostbyname_mock.side_effect = gaierror("no such host")
+    checks = ConnectivityChecks()
+    with pytest.raises(
+        ConnectivityCheckException, match="TCP connection to example.com:443 failed"
+    ):
+        checks.check_latency(target="example.com", latency=1, dns_cache=False)
+    gethostbyname_mock.assert_called_once_with("example.com", False)
+    sample_mock.assert_not_called()
+
+
+@pytest.fixture
+def concurrent_mock(mocker):
+    return mocker.patch(
+        "connectivity_check.tcp.connect_sample",
+        side_effect=samples(10.0, None, 30.0, 20.0, 100.0),
+    )
+
+
+def test_check_latency_concurrent(concurrent_mock, sleep_mock, capsys):
+    checks = ConnectivityChecks()
+    result = checks.check_latency(
+        target="example.com", latency=100, runs=5, concurrency=5, verbose=True
+    )
+    assert result == "TCP connection latency to example.com:443 is 40 (limit 100)"
+    assert concurrent_mock.call_count == 5
+    assert call(1) not in sleep_mock.call_args_list
+    assert "seq=1 failed" in capsys.readouterr().out
+
+
+def test_check_latency_percentile(concurrent_mock):
+    checks = ConnectivityChecks()
+    with pytest.raises(
+        ConnectivityCheckException,
+        match="p95 latency to example.com:443 is 89 exceeding the limit of 50",
+    ):
+        checks.check_latency(
+            target="example.com", latency=50, runs=5, concurrency=2, percentile=95
+        )
+
+
+def test_check_latency_statistic(sample_mock, sleep_mock):
+    checks = ConnectivityChecks()
+    result = checks.check_latency(target="example.com", latency=9, statistic="stddev")
+    assert result == "TCP connection stddev latency to example.com:443 is 8 (limit 9)"
+
+
+@pytest.mark.parametrize("statistic", ["median", "p", "p101", "pfoo"])
+def test_check_latency_invalid_statistic(sample_mock, statistic):
+    with pytest.raises(ConnectivityCheckException, match="Invalid latency statistic"):
+        ConnectivityChecks().check_latency(
+            target="example.com", latency=1, statistic=statistic
+        )
+
+
+def test_check_latency_max_loss(concurrent_mock):
+    with pytest.raises(
+        ConnectivityCheckException,
+        match="loss to example.com:443 is 20% exceeding the limit of 10%",
+    ):
+        ConnectivityChecks().check_latency(
+            target="example.com", latency=1000, runs=5, concurrency=5, max_loss=0.1
+        )
+
+
+def test_check_latency_metrics(sample_mock, sleep_mock, mocker):
+    sample_mock.side_effect = samples(20.1, 30.1, None, 40.1)
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    ConnectivityChecks().check_latency(target="example.com", latency=50, runs=4)
+    values = datadog.call_args.kwargs["values"]
+    assert values["average"] == 30 and values["maximum"] == 40
+    assert values["p50"] == pytest.approx(30.1)
+    assert values["p90"] == pytest.approx(38.1)
+    assert values["jitter"] == pytest.approx(10)
+    assert values["loss"] == 0.25
+    assert values["samples"] == [20.1, 30.1, 40.1]
+
+
+def test_latency_statistics_single_measure():
+    values = _latency_statistics([12.5], "p99.9")
+    assert values["p99.9"] == values["p50"] == 12.5
+    assert values["jitter"] == values["stddev"] == 0
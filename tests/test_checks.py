@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 import pytest
 
 import yaml
@@ -69,7 +71,7 @@ def test_checks_normal(config_file, mocker):
             {
                 "latency": {"key": "value"},
                 "content": {"key": "value", "foo": "bar"},
-                "cert": {"key": "value"},
+                "cert": {"key": "other value"},
             },
         ]
     }
@@ -100,7 +102,7 @@ def test_checks_all_with_error(config_file, mocker):
             {
                 "latency": {"key": "value"},
                 "content": {"key": "value", "foo": "bar"},
-                "cert": {"key": "value"},
+                "cert": {"key": "other value"},
             },
         ]
     }
@@ -139,3 +141,140 @@ def test_checks_other_error(config_file, mocker):
     c = ConnectivityChecks()
     with pytest.raises(ConnectivityCheckException, match="foo error"):
         c.checks(config_file)
+
+
+def test_checks_parallel_keeps_order(config_file, mocker, capsys):
+    config_content = {
+        "config": {"parallel": 3},
+        "checks": [{"content": {"delay": delay}} for delay in (0.3, 0.2, 0.1)],
+    }
+
+    def check_content(delay):
+        time.sleep(delay)
+        return f"done after {delay}"
+
+    mocker.patch.object(ConnectivityChecks, "check_content", side_effect=check_content)
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    c.checks(config_file)
+    output = capsys.readouterr().out
+    assert (
+        output.index("done after 0.3")
+        < output.index("done after 0.2")
+        < output.index("done after 0.1")
+    )
+    assert "0 failed and 3 successful checks" in output
+
+
+def test_checks_parallel_all_with_error(config_file, mocker):
+    config_content = {
+        "checks": [
+            {check: {"key": index}}
+            for index in range(5)
+            for check in ("cert", "latency")
+        ]
+    }
+    mocks = Box(
+        mocker.patch.multiple(
+            ConnectivityChecks,
+            check_cert=mocker.DEFAULT,
+            check_latency=mocker.DEFAULT,
+        )
+    )
+    mocks.check_latency.side_effect = ConnectivityCheckException
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    with pytest.raises(ConnectivityCheckException, match="Not all checks succesfull"):
+        c.checks(config_file, all=True, parallel=4)
+    assert mocks.check_cert.call_count == 5
+    assert mocks.check_latency.call_count == 5
+
+
+def test_checks_parallel_fail_fast(config_file, mocker):
+    config_content = {
+        "checks": [{"cert": {"key": "value"}}]
+        + [{"content": {"target": f"https://{i}.example.com"}} for i in range(10)]
+    }
+    mocks = Box(
+        mocker.patch.multiple(
+            ConnectivityChecks,
+            check_cert=mocker.DEFAULT,
+            check_content=mocker.DEFAULT,
+        )
+    )
+    mocks.check_cert.side_effect = ConnectivityCheckException("cert failed")
+    mocks.check_content.side_effect = lambda **kwargs: time.sleep(0.2)
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    with pytest.raises(ConnectivityCheckException, match="cert failed"):
+        c.checks(config_file, parallel=2)
+    # checks that did not start yet are cancelled
+    assert mocks.check_content.call_count < 10
+
+
+def test_checks_invalid_parallel(config_file):
+    config_content = {"config": {"parallel": 0}, "checks": []}
+    config_file.write_text(yaml.safe_dump(config_content))
+    c = ConnectivityChecks()
+    with pytest.raises(ConnectivityCheckException, match="positive number"):
+        c.checks(config_file)
+
+
+@pytest.mark.parametrize(
+    "option, message",
+    [
+        ({"interval": 0}, "interval must be a positive number"),
+        ({"interval": "often"}, "interval must be a positive number"),
+        ({"jitter": -1}, "jitter must not be negative"),
+        ({"deadline": 0}, "deadline must be a positive number"),
+        ({"deadline": "soon"}, "deadline must be a positive number"),
+    ],
+)
+def test_checks_invalid_entry_options(config_file, option, message):
+    config_content = {"checks": [{"cert": {"key": "value", **option}}]}
+    config_file.write_text(yaml.safe_dump(config_content))
+    with pytest.raises(ConnectivityCheckException, match=message):
+        ConnectivityChecks().checks(config_file)
+
+
+def test_checks_ignores_entry_options(config_file, mocker):
+    config_content = {
+        "config": {"interval": 10, "jitter": 1},
+        "checks": [{"cert": {"key": "value", "interval": 5, "jitter": 0.5}}],
+    }
+    check_cert = mocker.patch.object(ConnectivityChecks, "check_cert")
+    config_file.write_text(yaml.safe_dump(config_content))
+    ConnectivityChecks().checks(config_file)
+    check_cert.assert_called_once_with(key="value")
+
+
+@pytest.mark.parametrize("parallel", [1, 3])
+def test_checks_identical_entries(config_file, mocker, capsys, parallel):
+    config_content = {
+        "checks": [
+            {"cert": {"target": "a"}},
+            {"latency": {"target": "b"}},
+            {"cert": {"target": "a"}},
+            {"latency": {"target": "b", "deadline": 5}},
+            {"latency": {"target": "b"}},
+        ]
+    }
+    mocks = Box(
+        mocker.patch.multiple(
+            ConnectivityChecks,
+            check_cert=mocker.DEFAULT,
+            check_latency=mocker.DEFAULT,
+        )
+    )
+    mocks.check_cert.return_value = "cert OK"
+    mocks.check_latency.side_effect = ConnectivityCheckException("latency failed")
+    config_file.write_text(yaml.safe_dump(config_content))
+    with pytest.raises(ConnectivityCheckException, match="Not all checks succesfull"):
+        ConnectivityChecks().checks(config_file, all=True, parallel=parallel)
+    assert mocks.check_cert.call_count == 1
+    # the entry with a deadline is a different check
+    assert mocks.check_latency.call_count == 2
+    output = capsys.readouterr().out
+    assert output.count("cert OK") == 2
+    assert output.count("latency failed") == 3
+    assert "3 failed and 2 successful checks" in output
@@ -27,6 +27,16 @@ def test_cli_no_args(
     assert "COMMAND" in captured.out
 
 
+def test_cli_help(capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("sys.argv", ["connectivity-check", "-h"])
+    with pytest.raises(SystemExit) as e:
+        cli()
+    assert e.value.code == 0
+    captured = capsys.readouterr()
+    assert "connectivity-check - Run various network" in captured.err
+    assert "connectivity-check -h" not in captured.err
+
+
 def test_cli_with_valid_args(
     capsys: pytest.CaptureFixture[str],
     monkeypatch: pytest.MonkeyPatch,
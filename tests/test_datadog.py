@@ -12,52 +12,139 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from unittest.mock import Mock, call
+import socket
+from unittest.mock import call
 
 import pytest
 
+import connectivity_check.datadog
 from connectivity_check import ConnectivityChecks
+from connectivity_check.datadog import MetricsPipeline, pipeline
+
+TAGS = ("target:target", "foo:bar", "blubber:lutsch")
 
 
 @pytest.fixture
-def mock_gauge(mocker):
-    return mocker.patch("datadog.statsd.gauge")
+def mock_pipeline(mocker):
+    return mocker.patch("connectivity_check.datadog.pipeline").return_value
 
 
-# Note: datadog.initialize is called only once, globally, and therefore we don't have a test for it
 @pytest.fixture
-def mock_initialize(mocker):
-    return mocker.patch("datadog.initialize")
+def statsd_server():
+    "Local UDP socket that receives the DogStatsD datagrams"
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(2)
+        yield sock
+
 
+def receive(sock: socket.socket) -> list[str]:
+    return sock.recv(65535).decode().splitlines()
 
-def test_datadog_int(mock_gauge, mock_initialize):
+
+def test_datadog_int(mock_pipeline, capsys):
     c = ConnectivityChecks(datadog="prefix")
     c._datadog("target", "check", 42, foo="bar", blubber="lutsch")
-    mock_gauge.assert_called_once_with(
-        "prefix.check", 42, ["target:target", "foo:bar", "blubber:lutsch"]
-    )
+    mock_pipeline.gauge.assert_called_once_with("prefix.check", 42, TAGS)
+    assert capsys.readouterr().out == f"DD: prefix.check = 42 / {list(TAGS)}\n"
 
 
-def test_datadog_bool(mock_gauge, mock_initialize):
+def test_datadog_bool(mock_pipeline):
     c = ConnectivityChecks(datadog="prefix")
     c._datadog("target", "check", True, foo="bar", blubber="lutsch")
-    mock_gauge.assert_called_once_with(
-        "prefix.check", 1, ["target:target", "foo:bar", "blubber:lutsch"]
-    )
+    mock_pipeline.gauge.assert_called_once_with("prefix.check", 1, TAGS)
 
 
-def test_datadog_dict(mock_gauge, mock_initialize):
+def test_datadog_dict(mock_pipeline):
     c = ConnectivityChecks(datadog="prefix")
     c._datadog("target", "check", {"one": 1, "two": 2}, foo="bar", blubber="lutsch")
-    mock_gauge.assert_has_calls(
+    mock_pipeline.gauge.assert_has_calls(
+        [call("prefix.check.one", 1, TAGS), call("prefix.check.two", 2, TAGS)]
+    )
+
+
+def test_datadog_dict_bool(mock_pipeline):
+    c = ConnectivityChecks(datadog="prefix")
+    c._datadog("target", "check", {"ok": True, "failed": False})
+    mock_pipeline.gauge.assert_has_calls(
         [
-            call("prefix.check.one", 1, ["target:target", "foo:bar", "blubber:lutsch"]),
-            call("prefix.check.two", 2, ["target:target", "foo:bar", "blubber:lutsch"]),
+            call("prefix.check.ok", 1, ("target:target",)),
+            call("prefix.check.failed", 0, ("target:target",)),
         ]
     )
 
 
-def test_datadog_disabled(mock_gauge, mock_initialize):
+def test_datadog_list(mock_pipeline, capsys):
+    c = ConnectivityChecks(datadog="prefix")
+    c._datadog("target", "check", {"samples": [1.5, 2.5]})
+    mock_pipeline.distribution.assert_called_once_with(
+        "prefix.check.samples", [1.5, 2.5], ("target:target",)
+    )
+    assert "DD: prefix.check.samples = 2 samples" in capsys.readouterr().out
+
+
+def test_datadog_not_verbose(mock_pipeline, capsys):
+    c = ConnectivityChecks(datadog="prefix")
+    c._update_config(datadog_verbose=False)
+    c._datadog("target", "check", {"one": 1, "samples": [1.5]})
+    mock_pipeline.gauge.assert_called_once()
+    mock_pipeline.distribution.assert_called_once()
+    assert capsys.readouterr().out == ""
+
+
+def test_datadog_disabled(mock_pipeline):
     c = ConnectivityChecks()
     c._datadog("foo", "foo", "foo")
-    mock_gauge.assert_not_called()
+    mock_pipeline.gauge.assert_not_called()
+
+
+def test_pipeline_aggregates_and_packs(statsd_server):
+    p = MetricsPipeline(*statsd_server.getsockname(), flush_interval=0)
+    p.gauge("metric.a", 1, ("target:a",))
+    p.gauge("metric.a", 2, ("target:a",))
+    p.gauge("metric.a", 3, ("target:b",))
+    p.distribution("metric.samples", [1.5], ("target:a",))
+    p.distribution("metric.samples", [2.5], ("target:a",))
+    p.flush()
+    # all metrics in a single datagram, only the last gauge value per context
+    assert sorted(receive(statsd_server)) == [
+        "metric.a:2|g|#target:a",
+        "metric.a:3|g|#target:b",
+        "metric.samples:1.5|d|#target:a",
+        "metric.samples:2.5|d|#target:a",
+    ]
+    p.close()
+
+
+def test_pipeline_flushes_when_full(statsd_server):
+    p = MetricsPipeline(*statsd_server.getsockname(), flush_interval=0, max_pending=2)
+    p.gauge("metric.a", 1, ())
+    p.distribution("metric.b", [1], ())
+    assert sorted(receive(statsd_server)) == ["metric.a:1|g", "metric.b:1|d"]
+    p.gauge("metric.a", 1, ())
+    p.gauge("metric.b", 2, ())
+    assert sorted(receive(statsd_server)) == ["metric.a:1|g", "metric.b:2|g"]
+
+
+def test_pipeline_flushes_periodically(statsd_server):
+    p = MetricsPipeline(*statsd_server.getsockname(), flush_interval=0.01)
+    p.gauge("metric.a", 1, ())
+    assert receive(statsd_server) == ["metric.a:1|g"]
+    p.close()
+
+
+def test_shared_pipeline(mocker):
+    register = mocker.patch("atexit.register")
+    mocker.patch.object(connectivity_check.datadog, "__pipeline", None)
+    mocker.patch.object(connectivity_check.datadog, "MetricsPipeline")
+    shared = pipeline()
+    assert pipeline() is shared
+    register.assert_called_once_with(shared.close)
+
+    ConnectivityChecks()._datadog_flush()
+    shared.flush.assert_called_once()
+
+
+def test_datadog_flush_without_pipeline(mocker):
+    mocker.patch.object(connectivity_check.datadog, "__pipeline", None)
+    ConnectivityChecks()._datadog_flush()
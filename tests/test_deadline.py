@@ -0,0 +1,243 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import time
+from multiprocessing.connection import Connection
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.deadline import (
+    BatchDeadline,
+    DeadlineExceeded,
+    _isolated_worker,
+    _run_in_thread,
+    _run_isolated,
+    run_with_deadline,
+)
+from connectivity_check.exceptions import ConnectivityCheckException
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    return tmp_path / "config.yaml"
+
+
+@pytest.fixture
+def listening_port():
+    "Port of a server that accepts connections but never answers"
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(10)
+        yield server.getsockname()[1]
+
+
+def test_batch_deadline():
+    assert BatchDeadline().remaining() is None
+    assert BatchDeadline().remaining(5) == 5
+    batch = BatchDeadline(10)
+    assert 9 < batch.remaining() <= 10
+    assert batch.remaining(5) == 5
+    batch = BatchDeadline(0.1)
+    time.sleep(0.11)
+    with pytest.raises(DeadlineExceeded, match="Batch deadline of 0.1s exceeded"):
+        batch.remaining(5)
+
+
+def test_run_in_thread():
+    assert _run_in_thread(lambda: "OK", "check_foo", 1) == "OK"
+    with pytest.raises(ZeroDivisionError):
+        _run_in_thread(lambda: 1 / 0, "check_foo", 1)
+    release = threading.Event()
+    try:
+        with pytest.raises(
+            DeadlineExceeded,
+            match=r"check_foo exceeded its deadline of 0.1s after 0.1s",
+        ):
+            _run_in_thread(release.wait, "check_foo", 0.1)
+    finally:
+        release.set()
+
+
+def test_run_with_deadline(mocker):
+    check_cert = mocker.patch.object(
+        ConnectivityChecks, "check_cert", return_value="OK"
+    )
+    run_isolated = mocker.patch(
+        "connectivity_check.deadline._run_isolated", return_value="isolated"
+    )
+    c = ConnectivityChecks()
+    assert run_with_deadline(c, "check_cert", {"target": "foo"}) == "OK"
+    assert run_with_deadline(c, "check_cert", {"target": "foo"}, 5) == "OK"
+    assert check_cert.call_count == 2
+    check_cert.assert_called_with(target="foo")
+    run_isolated.assert_not_called()
+    assert run_with_deadline(c, "check_speed_ookla", {}, 5) == "isolated"
+    run_isolated.assert_called_once_with(c, "check_speed_ookla", {}, 5)
+    usage = {}
+    assert run_with_deadline(c, "check_cert", {"target": "foo"}, 5, usage) == "OK"
+    assert usage["cpu"] >= 0
+
+
+class FakeConnection:
+    def __init__(self, fail: int = 0) -> None:
+        self.sent = []
+        self.fail = fail
+
+    def send(self, message):
+        if self.fail:
+            self.fail -= 1
+            raise TypeError("can't pickle")
+        self.sent.append(message)
+
+    def close(self):
+        pass
+
+
+def test_isolated_worker(mocker):
+    def check_speed_ookla(self, **kwargs):
+        self._datadog(target="foo", check="speed_ookla", values={"download": 1})
+        return f"OK {self._config.datadog} {kwargs}"
+
+    mocker.patch.object(ConnectivityChecks, "check_speed_ookla", check_speed_ookla)
+    connection = FakeConnection()
+    _isolated_worker(connection, {"datadog": "prefix"}, "check_speed_ookla", {"a": 1})
+    assert connection.sent == [
+        (
+            "result",
+            "OK prefix {'a': 1}",
+            [
+                (
+                    (),
+                    {
+                        "target": "foo",
+                        "check": "speed_ookla",
+                        "values": {"download": 1},
+                    },
+                )
+            ],
+        )
+    ]
+
+
+def test_isolated_worker_error(mocker):
+    mocker.patch.object(
+        ConnectivityChecks, "check_speed_ookla", side_effect=ValueError("broken")
+    )
+    connection = FakeConnection(fail=1)
+    _isolated_worker(connection, {}, "check_speed_ookla", {})
+    ((kind, error, submitted),) = connection.sent
+    assert (kind, type(error), str(error), submitted) == (
+        "error",
+        ConnectivityCheckException,
+        "broken",
+        [],
+    )
+
+
+def test_run_isolated(listening_port, mocker):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    c = ConnectivityChecks(datadog="prefix")
+    result = _run_isolated(
+        c,
+        "check_latency",
+        {"target": f"127.0.0.1:{listening_port}", "latency": 1000, "runs": 1},
+        30,
+    )
+    assert f"127.0.0.1:{listening_port}" in result
+    datadog.assert_called_once()
+    assert datadog.call_args.kwargs["check"] == "latency"
+
+
+def test_run_isolated_error():
+    with pytest.raises(TypeError, match="unexpected keyword argument 'foo'"):
+        _run_isolated(ConnectivityChecks(), "check_latency", {"foo": 1}, 30)
+
+
+def test_run_isolated_deadline(listening_port):
+    # the TLS handshake never completes and the check ignores its deadline
+    start = time.monotonic()
+    with pytest.raises(
+        DeadlineExceeded, match=r"check_cert exceeded its deadline of 1.0s after 1\.\ds"
+    ):
+        _run_isolated(
+            ConnectivityChecks(),
+            "check_cert",
+            {"target": f"127.0.0.1:{listening_port}", "timeout": 60},
+            1,
+        )
+    assert time.monotonic() - start < 5
+
+
+def test_run_isolated_worker_died(mocker):
+    mocker.patch.object(Connection, "recv", side_effect=EOFError)
+    with pytest.raises(
+        ConnectivityCheckException, match="check_routing worker died with exit code"
+    ):
+        _run_isolated(ConnectivityChecks(), "check_routing", {}, 30)
+
+
+def test_checks_deadline(config_file, mocker, capsys):
+    config_content = {
+        "config": {"deadline": 0.1},
+        "checks": [
+            {"cert": {"target": "slow"}},
+            {"cert": {"target": "fast", "deadline": 2}},
+            {"cert": {"target": "slower", "deadline": 0.2}},
+        ],
+    }
+    delays = {"slow": 1, "fast": 0, "slower": 1}
+    check_cert = mocker.patch.object(
+        ConnectivityChecks,
+        "check_cert",
+        side_effect=lambda target: time.sleep(delays[target]) or target,
+    )
+    config_file.write_text(yaml.safe_dump(config_content))
+    with pytest.raises(ConnectivityCheckException, match="Not all checks succesfull"):
+        ConnectivityChecks().checks(config_file, all=True)
+    assert check_cert.call_count == 3
+    output = capsys.readouterr().out
+    assert "check_cert exceeded its deadline of 0.1s after 0.1s" in output
+    assert "Check check_cert({'target': 'fast'}) OK" in output
+    assert "check_cert exceeded its deadline of 0.2s after 0.2s" in output
+    assert "2 failed and 1 successful checks" in output
+
+
+@pytest.mark.parametrize("parallel", [1, 2])
+def test_checks_batch_deadline(config_file, mocker, capsys, parallel):
+    config_content = {
+        "config": {"batch_deadline": 0.3},
+        "checks": [{"cert": {"target": target}} for target in "abcd"],
+    }
+    check_cert = mocker.patch.object(
+        ConnectivityChecks, "check_cert", side_effect=lambda target: time.sleep(0.2)
+    )
+    config_file.write_text(yaml.safe_dump(config_content))
+    start = time.monotonic()
+    with pytest.raises(ConnectivityCheckException, match="Not all checks succesfull"):
+        ConnectivityChecks().checks(config_file, all=True, parallel=parallel)
+    assert time.monotonic() - start < 0.6
+    output = capsys.readouterr().out
+    if parallel == 1:
+        # the second check gets the remaining time, the others don't start
+        assert check_cert.call_count == 2
+        assert "check_cert exceeded its deadline of 0.1s after 0.1s" in output
+        assert "Batch deadline of 0.3s exceeded after 0.3s" in output
+        assert "3 failed and 1 successful checks" in output
+    else:
+        assert check_cert.call_count == 4
+        assert "2 failed and 2 successful checks" in output
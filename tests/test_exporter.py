@@ -0,0 +1,136 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.exporter import MetricsCache, start_metrics_server
+from connectivity_check.plan import PlannedCheck
+from connectivity_check.serve import Scheduler
+
+
+def scrape(port: int, path: str = "/metrics") -> str:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as r:
+        assert r.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        return r.read().decode()
+
+
+def test_metrics_cache():
+    cache = MetricsCache()
+    assert cache.render() == b""
+    cache.update("prefix.latency.p99", 12.5, ("target:example.com:443",))
+    cache.update("prefix.latency.p99", 13, ("target:other",))
+    cache.update("prefix.routing", True, ("target:a", 'device:"en0"\\n'))
+    cache.update("prefix.latency.samples", [1, 2], ("target:other",))
+    cache.update("1.cert", "text", ())
+    cache.update("1.cert", 0, ())
+    assert cache.render().decode().splitlines() == [
+        "# TYPE _1_cert gauge",
+        "_1_cert 0",
+        "# TYPE prefix_latency_p99 gauge",
+        'prefix_latency_p99{target="example.com:443"} 12.5',
+        'prefix_latency_p99{target="other"} 13',
+        "# TYPE prefix_routing gauge",
+        'prefix_routing{target="a",device="\\"en0\\"\\\\n"} 1',
+    ]
+    assert cache.render() is cache.render()
+
+
+def test_metrics_server():
+    cache = MetricsCache()
+    cache.update("prefix.cert", 1, ("target:a",))
+    server = start_metrics_server(cache, 0)
+    port = server.server_address[1]
+    try:
+        assert scrape(port) == '# TYPE prefix_cert gauge\nprefix_cert{target="a"} 1\n'
+        with pytest.raises(urllib.error.HTTPError, match="404"):
+            scrape(port, "/other")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_datadog_feeds_metrics_cache(mocker):
+    pipeline = mocker.patch("connectivity_check.datadog.pipeline").return_value
+    c = ConnectivityChecks()
+    c._metrics_cache = MetricsCache()
+    c._datadog("a", "cert", True)
+    c._datadog("b", "latency", {"average": 5}, device="en0")
+    pipeline.gauge.assert_not_called()
+    assert c._metrics_cache.render().decode().splitlines() == [
+        "# TYPE connectivity_check_cert gauge",
+        'connectivity_check_cert{target="a"} 1',
+        "# TYPE connectivity_check_latency_average gauge",
+        'connectivity_check_latency_average{target="b",device="en0"} 5',
+    ]
+
+    c._update_config(datadog="prefix")
+    c._datadog("a", "cert", False)
+    pipeline.gauge.assert_called_once_with("prefix.cert", 0, ("target:a",))
+    assert b'prefix_cert{target="a"} 0' in c._metrics_cache.render()
+
+
+def test_scheduler_exports_outcome(mocker):
+    mocker.patch.object(
+        ConnectivityChecks,
+        "check_cert",
+        side_effect=["OK", ConnectivityCheckException("failed")],
+    )
+    c = ConnectivityChecks()
+    c._metrics_cache = MetricsCache()
+    scheduler = Scheduler(c, [PlannedCheck("cert", {"target": "a"}, {})])
+    scheduler._run(0)
+    assert b'connectivity_check_cert_success{target="a"} 1' in c._metrics_cache.render()
+    scheduler._run(0)
+    assert b'connectivity_check_cert_success{target="a"} 0' in c._metrics_cache.render()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.parametrize("from_config", [True, False])
+def test_serve_metrics(tmp_path, mocker, from_config):
+    port = free_port()
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"metrics_port": port} if from_config else {},
+                "checks": [{"cert": {"target": "a"}}],
+            }
+        )
+    )
+    scrapes = []
+
+    def run():
+        # a scrape while the scheduler runs only renders the cache
+        c._metrics_cache.update("prefix.cert", 1, ("target:a",))
+        scrapes.append(scrape(port))
+
+    mocker.patch("connectivity_check.serve.Scheduler").return_value.run = run
+    c = ConnectivityChecks()
+    c.serve(config_file, metrics_port=None if from_config else port)
+    assert scrapes == ['# TYPE prefix_cert gauge\nprefix_cert{target="a"} 1\n']
+    with pytest.raises(urllib.error.URLError):
+        scrape(port)  # stopped with the scheduler
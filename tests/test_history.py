@@ -0,0 +1,133 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.history import HistoryStore
+
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite", retention=2)
+    yield store
+    store.close()
+
+
+def test_store_summary(store):
+    now = time.time()
+    for value in range(1, 101):
+        store.append("latency", "a:443", {"samples": [value]}, when=now - value)
+    store.append("latency", "a:443", {"ok": 1, "average": 10}, when=now)
+    store.append("latency", "a:443", {"ok": 0}, when=now)
+    store.append("cert", "b", {"value": 1}, when=now)
+
+    rows = store.summary(now - 1000)
+    assert rows == [
+        ("cert", "b", "value", 1, 1.0, 1.0, 1.0, 1.0),
+        ("latency", "a:443", "average", 1, 10.0, 10.0, 10.0, 10.0),
+        ("latency", "a:443", "ok", 2, 0.5, 0.0, 1.0, 1.0),
+        ("latency", "a:443", "samples", 100, 50.5, 50.0, 90.0, 99.0),
+    ]
+    # only the last 10 samples
+    assert store.summary(now - 10, check="latency", target="a:443")[-1][3:5] == (
+        10,
+        5.5,
+    )
+    assert store.summary(now - 1000, target="c") == []
+
+
+def test_store_segments(store, tmp_path):
+    now = time.time()
+    store.append("cert", "a", {"ok": 1}, when=now - 5 * DAY)
+    store.append("cert", "a", {"ok": 1}, when=now - 4 * DAY)
+    assert len(store._segment_names()) == 2
+    store.append("cert", "a", {"ok": 0}, when=now)
+    # the old segments expired
+    assert len(store._segment_names()) == 1
+    assert store.summary(now - 10 * DAY)[0][3] == 1
+    # no segment in the time range
+    assert store.summary(now + DAY) == []
+    # segments are found again after a restart
+    assert HistoryStore(tmp_path / "history.sqlite")._segments == store._segments
+
+
+@pytest.fixture
+def history():
+    return ConnectivityChecks(record_history=True)
+
+
+def test_record_history(history, mocker):
+    mocker.patch("connectivity_check.datadog.pipeline")
+    history._datadog("target", "latency", {"average": 1, "samples": [1.5, 2.5]})
+    history._datadog("target", "cert", True)
+    history._datadog("target", "content", "not a number")
+    ConnectivityChecks()._datadog("target", "cert", False)  # history disabled
+    rows = history._history_db.summary(0)
+    assert [row[:4] for row in rows] == [
+        ("cert", "target", "value", 1),
+        ("latency", "target", "average", 1),
+        ("latency", "target", "samples", 2),
+    ]
+
+
+def test_checks_history(tmp_path, mocker):
+    def check_latency(self, target, fail=False):
+        self._datadog(target="normalized", check="latency", values={"average": 5})
+        if fail:
+            raise ConnectivityCheckException("failed")
+        return "OK"
+
+    mocker.patch.object(ConnectivityChecks, "check_latency", check_latency)
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"history": True},
+                "checks": [
+                    {"latency": {"target": "https://example.com"}},
+                    {"latency": {"target": "https://example.com", "fail": True}},
+                ],
+            }
+        )
+    )
+    c = ConnectivityChecks()
+    with pytest.raises(ConnectivityCheckException):
+        c.checks(config_file, all=True)
+
+    output = c.history(windows="1h")
+    assert output.splitlines() == [
+        "Last 1h:",
+        "  latency https://example.com",
+        "    average: average 5 p50 5 p90 5 p99 5 (2 samples)",
+        "    2 runs, 50.00% errors, burn rate 50.00",
+    ]
+    assert "burn rate 5.00" in c.history(windows=3600, slo=0.9)
+    assert c.history(windows=(60, "1d"), check="cert").splitlines() == [
+        "Last 60: no history",
+        "Last 1d: no history",
+    ]
+    assert "2 runs" in ConnectivityChecks().history(config=str(config_file))
+
+
+@pytest.mark.parametrize("windows,slo", [("1y", 0.99), ("1h", 1)])
+def test_history_invalid_arguments(windows, slo):
+    with pytest.raises(ConnectivityCheckException):
+        ConnectivityChecks().history(windows=windows, slo=slo)
@@ -0,0 +1,179 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+import yaml
+
+import connectivity_check.plan
+from connectivity_check import ConnectivityChecks
+from connectivity_check.checks import _load_config
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.plan import (
+    PlannedCheck,
+    compile_pattern,
+    entry_key,
+    shared_step,
+    sharing,
+)
+
+CONFIG = {
+    "config": {"parallel": 2},
+    "checks": [{"content": {"target": "https://example.com", "content": "Lorem"}}],
+}
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(yaml.safe_dump(CONFIG))
+    return config_file
+
+
+@pytest.fixture
+def validate(mocker):
+    return mocker.spy(connectivity_check.checks.config_schema, "validate")
+
+
+def plans(state_home):
+    return sorted((state_home / "connectivity-check" / "plans").glob("*.json"))
+
+
+def test_plan_cached(config_file, validate, state_home):
+    first = _load_config(ConnectivityChecks(), config_file)
+    c = ConnectivityChecks()
+    second = _load_config(c, config_file)
+    assert (
+        first
+        == second
+        == [
+            PlannedCheck(
+                "content", {"target": "https://example.com", "content": "Lorem"}, {}
+            )
+        ]
+    )
+    assert c._config.parallel == 2
+    validate.assert_called_once()
+    assert len(plans(state_home)) == 1
+
+
+def test_plan_changed_config(config_file, validate, state_home):
+    _load_config(ConnectivityChecks(), config_file)
+    config_file.write_text(yaml.safe_dump({"checks": [{"cert": {}}]}))
+    assert _load_config(ConnectivityChecks(), config_file) == [("cert", {}, {})]
+    assert validate.call_count == 2
+    assert len(plans(state_home)) == 2
+
+
+def test_plan_broken_cache(config_file, validate, state_home):
+    _load_config(ConnectivityChecks(), config_file)
+    plans(state_home)[0].write_bytes(b"garbage")
+    assert len(_load_config(ConnectivityChecks(), config_file)) == 1
+    assert validate.call_count == 2
+
+
+def test_plan_unwritable_state_dir(config_file, validate, monkeypatch):
+    monkeypatch.setenv("XDG_STATE_HOME", "/proc/forbidden")
+    for _ in range(2):
+        assert len(_load_config(ConnectivityChecks(), config_file)) == 1
+    assert validate.call_count == 2
+
+
+@pytest.mark.parametrize("value", ["since: 2024-01-01", "1: 2"])
+def test_plan_not_json(config_file, validate, state_home, value):
+    # a YAML date and a numeric key don't survive JSON
+    config_file.write_text(f"checks:\n  - cert:\n      {value}\n")
+    for _ in range(2):
+        assert len(_load_config(ConnectivityChecks(), config_file)) == 1
+    assert validate.call_count == 2
+    assert plans(state_home) == []
+
+
+def test_plan_cache_size(config_file, mocker, state_home):
+    mocker.patch.object(connectivity_check.plan, "PLAN_CACHE_SIZE", 2)
+    for parallel in range(1, 5):
+        config_file.write_text(
+            yaml.safe_dump(CONFIG | {"config": {"parallel": parallel}})
+        )
+        _load_config(ConnectivityChecks(), config_file)
+    assert len(plans(state_home)) == 2
+
+
+def test_plan_invalid_pattern(config_file):
+    config_file.write_text(
+        yaml.safe_dump({"checks": [{"cert": {"target": "foo", "issuer": "("}}]})
+    )
+    with pytest.raises(ConnectivityCheckException, match="invalid pattern"):
+        _load_config(ConnectivityChecks(), config_file)
+
+
+def test_planned_check():
+    planned = PlannedCheck("cert", {"target": "foo"}, {"interval": 5})
+    assert planned.function_name == "check_cert"
+    assert planned.description == "Check check_cert({'target': 'foo'})"
+    assert compile_pattern("Foo") is compile_pattern("Foo")
+    assert compile_pattern("Foo").search("FOO")
+
+
+def test_entry_key():
+    assert entry_key("check_cert", {"a": 1, "b": [2]}, None) == entry_key(
+        "check_cert", {"b": [2], "a": 1}, None
+    )
+    assert entry_key("check_cert", {"a": 1}, None) != entry_key(
+        "check_cert", {"a": 1}, 5
+    )
+
+
+def test_shared_step():
+    c = ConnectivityChecks()
+    calls = []
+
+    def step():
+        calls.append(1)
+        time.sleep(0.05)
+        return len(calls)
+
+    # without sharing every call runs the step
+    assert [shared_step(c, "step", step) for _ in range(2)] == [1, 2]
+    calls.clear()
+    with sharing(c):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(shared_step(c, "a", step)))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == [1, 1, 1]
+        assert shared_step(c, "b", step) == 2
+    assert shared_step(c, "a", step) == 3
+
+
+def test_shared_step_error():
+    c = ConnectivityChecks()
+    calls = []
+
+    def step():
+        calls.append(1)
+        raise ValueError("broken")
+
+    with sharing(c):
+        for _ in range(2):
+            with pytest.raises(ValueError, match="broken"):
+                shared_step(c, "step", step)
+    assert len(calls) == 1
@@ -0,0 +1,89 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import pstats
+
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check import profiling
+from connectivity_check.profiling import profiled, span, tracing
+
+
+def test_span_without_tracing():
+    assert span("resolve") is span("connect", host="example.com")
+    assert profiled("content", lambda: "OK") == "OK"
+    with tracing() as tracer:
+        assert tracer is None
+        assert profiling._tracer is None
+
+
+def test_checks_trace_and_profile(requests_mock, tmp_path):
+    requests_mock.get("https://example.com", text="Lorem ipsum dolor sit amet")
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"parallel": 4},
+                "checks": [
+                    {"content": {"target": "https://example.com", "content": content}}
+                    for content in ("Lorem", "amet")
+                ],
+            }
+        )
+    )
+    trace_file = tmp_path / "trace.json"
+    ConnectivityChecks().checks(
+        config_file, trace_file=str(trace_file), profile=str(tmp_path / "profile")
+    )
+    assert profiling._tracer is None
+
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    checks = [event for event in events if event["cat"] == "check"]
+    assert [event["name"] for event in checks] == ["check_content"] * 2
+    assert checks[0]["args"] == {"target": "https://example.com", "content": "Lorem"}
+    assert all(event["ph"] == "X" and event["dur"] > 0 for event in events)
+    phases = [event["name"] for event in events if event["cat"] == "phase"]
+    assert phases == ["request", "metrics", "metrics"] * 2
+    # both checks ran in the same thread with profiling
+    assert len({event["tid"] for event in events}) == 1
+
+    stats = pstats.Stats(str(tmp_path / "profile" / "content.prof"))
+    assert any(
+        name == "check_content" and calls == 2
+        for (_, _, name), (calls, *_) in stats.stats.items()
+    )
+
+
+def test_profile_with_active_profiler(mocker, tmp_path):
+    profile = mocker.patch("cProfile.Profile").return_value
+    profile.enable.side_effect = ValueError("Another profiling tool is already active")
+    with tracing(profile_dir=tmp_path) as tracer:
+        assert profiled("cert", lambda: "OK") == "OK"
+    profile.disable.assert_not_called()
+    assert tracer.stats == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_trace_only(tmp_path):
+    trace_file = tmp_path / "trace.json"
+    with tracing(trace_file) as tracer:
+        with span("resolve", host="example.com"):
+            pass
+        assert profiled("cert", lambda: "OK") == "OK"
+    assert tracer.stats == {}
+    assert not (tmp_path / "cert.prof").exists()
+    (event,) = json.loads(trace_file.read_text())["traceEvents"]
+    assert event["name"] == "resolve" and event["args"] == {"host": "example.com"}
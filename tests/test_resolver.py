@@ -0,0 +1,184 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import socket
+import threading
+import time
+
+import dns.resolver
+import pytest
+
+from connectivity_check.resolver import (
+    DEFAULT_TTL,
+    Resolver,
+    _ttl,
+    caching,
+    getaddress,
+    gethostbyname,
+)
+
+
+class Answer(list):
+    "Mimic dns.resolver.Answer"
+
+    def __init__(self, addresses: list[str], ttl: int) -> None:
+        super().__init__(type("A", (), {"address": address}) for address in addresses)
+        self.rrset = type("RRset", (), {"ttl": ttl})
+
+
+def addrinfo(*addresses: str) -> list[tuple]:
+    "Mimic the result of socket.getaddrinfo"
+    return [
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, "", (address, 0, 0, 0))
+        if ":" in address
+        else (socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, 0))
+        for address in addresses
+    ]
+
+
+@pytest.fixture
+def dns_mock(mocker):
+    return mocker.patch(
+        "dns.resolver.resolve", return_value=Answer(["1.2.3.4", "1.2.3.5"], 300)
+    )
+
+
+@pytest.fixture
+def getaddrinfo_mock(mocker):
+    return mocker.patch(
+        "socket.getaddrinfo", return_value=addrinfo("1.2.3.4", "1.2.3.5", "1.2.3.4")
+    )
+
+
+@pytest.mark.parametrize("ip", ["1.2.3.4", "2001:db8::1"])
+def test_resolve_ip(dns_mock, getaddrinfo_mock, ip):
+    assert Resolver().resolve(ip) == [ip]
+    dns_mock.assert_not_called()
+    getaddrinfo_mock.assert_not_called()
+
+
+def test_resolve_caches_for_ttl(dns_mock, getaddrinfo_mock):
+    resolver = Resolver()
+    assert resolver.resolve("example.com") == ["1.2.3.4", "1.2.3.5"]
+    assert resolver.resolve("example.com") == ["1.2.3.4", "1.2.3.5"]
+    getaddrinfo_mock.assert_called_once_with(
+        "example.com", None, type=socket.SOCK_STREAM
+    )
+    dns_mock.assert_called_once_with("example.com", "A", search=True)
+    resolver.clear()
+    resolver.resolve("example.com")
+    assert getaddrinfo_mock.call_count == 2
+
+
+def test_resolve_expired(dns_mock, getaddrinfo_mock):
+    dns_mock.return_value = Answer(["1.2.3.4"], 0)
+    resolver = Resolver()
+    resolver.resolve("example.com")
+    resolver.resolve("example.com")
+    assert getaddrinfo_mock.call_count == 2
+
+
+def test_resolve_bypass_cache(dns_mock, getaddrinfo_mock):
+    resolver = Resolver()
+    resolver.resolve("example.com")
+    resolver.resolve("example.com", cache=False)
+    with caching(False):
+        resolver.resolve("example.com")
+    with caching(True):
+        resolver.resolve("example.com")
+    assert getaddrinfo_mock.call_count == 3
+
+
+def test_resolve_ipv6(dns_mock, getaddrinfo_mock):
+    getaddrinfo_mock.return_value = addrinfo("2001:db8::1", "1.2.3.4")
+    assert Resolver().resolve("example.com") == ["2001:db8::1", "1.2.3.4"]
+    dns_mock.assert_called_once_with("example.com", "AAAA", search=True)
+
+
+def test_ttl(dns_mock):
+    assert _ttl("example.com", "1.2.3.5") == 300
+
+
+def test_ttl_hosts_file(dns_mock):
+    # the system resolver answers with an address that DNS doesn't know
+    assert _ttl("example.com", "5.6.7.8") == DEFAULT_TTL
+    dns_mock.side_effect = dns.resolver.NXDOMAIN
+    assert _ttl("localname", "5.6.7.8") == DEFAULT_TTL
+
+
+def test_resolve_negative_cache(dns_mock, getaddrinfo_mock):
+    getaddrinfo_mock.side_effect = socket.gaierror(-2, "Name or service not known")
+    resolver = Resolver()
+    for _ in range(2):
+        with pytest.raises(socket.gaierror, match="not known"):
+            resolver.resolve("nonexisting")
+    assert getaddrinfo_mock.call_count == 1
+    dns_mock.assert_not_called()
+
+
+def test_resolve_concurrent_lookups(dns_mock, getaddrinfo_mock):
+    def slow_getaddrinfo(*args, **kwargs):
+        time.sleep(0.2)
+        return addrinfo("1.2.3.4")
+
+    getaddrinfo_mock.side_effect = slow_getaddrinfo
+    resolver = Resolver()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(resolver.resolve("example.com")))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [["1.2.3.4"]] * 5
+    getaddrinfo_mock.assert_called_once()
+
+
+def test_resolve_unexpected_error(dns_mock, getaddrinfo_mock):
+    getaddrinfo_mock.side_effect = UnicodeError("label too long")
+    resolver = Resolver()
+    host = "a" * 70 + ".example.com"
+    for _ in range(2):
+        with pytest.raises(UnicodeError):
+            resolver.resolve(host)
+    assert getaddrinfo_mock.call_count == 2
+    assert not resolver._pending
+    getaddrinfo_mock.side_effect = None
+    assert resolver.resolve(host) == ["1.2.3.4", "1.2.3.5"]
+
+
+def test_gethostbyname(mocker):
+    resolve = mocker.patch(
+        "connectivity_check.resolver.resolver.resolve",
+        return_value=["2001:db8::1", "1.2.3.4"],
+    )
+    assert gethostbyname("example.com", False) == "1.2.3.4"
+    resolve.assert_called_once_with("example.com", False)
+
+
+def test_gethostbyname_ipv6_only():
+    with pytest.raises(socket.gaierror, match="::1 has no IPv4 address"):
+        gethostbyname("::1")
+
+
+def test_getaddress(mocker):
+    resolve = mocker.patch(
+        "connectivity_check.resolver.resolver.resolve",
+        return_value=["2001:db8::1", "1.2.3.4"],
+    )
+    assert getaddress("example.com", False) == "2001:db8::1"
+    resolve.assert_called_once_with("example.com", False)
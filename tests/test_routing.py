@@ -12,12 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
+
 import pytest
 from socket import gaierror
 from connectivity_check import ConnectivityChecks
-from connectivity_check.check_routing import Route
+from connectivity_check.check_routing import Route, RouteTable, route_table
 from connectivity_check.exceptions import ConnectivityCheckException
 
+# keep the original before the fixture replaces it
+start_monitor = RouteTable._start_monitor
+
 # some test consts
 
 LOCAL_IP = "1.2.1.1"
@@ -35,6 +40,14 @@ def mock_gethostbyname(mocker):
     )
 
 
+@pytest.fixture(autouse=True)
+def fresh_route_table(mocker):
+    mocker.patch("connectivity_check.check_routing.__route_table", None)
+    mocker.patch.object(
+        RouteTable, "_start_monitor", lambda self: setattr(self, "monitoring", True)
+    )
+
+
 @pytest.fixture
 def mock_routing(mocker):
     linux = mocker.patch("pyroute2.IPRoute")
@@ -100,3 +113,93 @@ def test_check_different_routing(mock_gethostbyname, mock_routing, platform_syst
     connectivity_checks = ConnectivityChecks()
     with pytest.raises(ConnectivityCheckException, match="Expecting difference"):
         connectivity_checks.check_routing(DESTINATION, "target.com", same=False)
+
+
+def test_check_routing_multiple_targets(
+    mock_gethostbyname, mock_routing, platform_system
+):
+    connectivity_checks = ConnectivityChecks()
+    result = connectivity_checks.check_routing(
+        [DESTINATION, "other.com"], "target.com", same=True
+    )
+    assert result == (
+        "Routing to example.com via 1.2.0.1/eth0 is same as route to target.com\n"
+        "Routing to other.com via 1.2.0.1/eth0 is same as route to target.com"
+    )
+    if platform_system == "Linux":
+        # one kernel lookup for all destinations that share the same IP
+        mock_routing["linux"]().route.assert_called_once_with("get", dst=DESTINATION_IP)
+
+
+def test_check_routing_multiple_targets_failing(
+    mock_gethostbyname, mock_routing, platform_system
+):
+    connectivity_checks = ConnectivityChecks()
+    with pytest.raises(
+        ConnectivityCheckException, match="(?s)example.com.*is same as.*other.com"
+    ):
+        connectivity_checks.check_routing(
+            [DESTINATION, "other.com"], "target.com", same=False
+        )
+
+
+def test_route_table_singleton(mock_routing):
+    assert route_table() is route_table()
+
+
+def test_route_table_invalidate(mock_routing):
+    routes = RouteTable()
+    ipr = mock_routing["linux"]()
+    assert routes.route(DESTINATION_IP)["RTA_OIF"] == DEVICE_ID
+    assert routes.link_name(DEVICE_ID) == DEVICE
+    assert routes.route(DESTINATION_IP)["RTA_OIF"] == DEVICE_ID
+    assert ipr.route.call_count == 1
+    routes.invalidate()
+    routes.route(DESTINATION_IP)
+    assert ipr.route.call_count == 2
+
+
+def test_route_table_no_cache_without_monitor(mock_routing):
+    routes = RouteTable()
+    routes.monitoring = False
+    routes.route(DESTINATION_IP)
+    routes.route(DESTINATION_IP)
+    assert mock_routing["linux"]().route.call_count == 2
+
+
+def test_route_table_change_during_lookup(mock_routing):
+    routes = RouteTable()
+    ipr = mock_routing["linux"]()
+    route = ipr.route.return_value
+
+    def changing_route(*args, **kwargs):
+        routes.invalidate()  # a change arrives during the lookup
+        return route
+
+    ipr.route.side_effect = changing_route
+    routes.route(DESTINATION_IP)
+    routes.route(DESTINATION_IP)
+    assert ipr.route.call_count == 2
+
+
+def test_route_table_start_monitor(mocker, mock_routing):
+    started = threading.Event()
+    mocker.patch.object(RouteTable, "_monitor", side_effect=started.set)
+    routes = RouteTable()
+    start_monitor(routes)
+    assert routes.monitoring
+    assert started.wait(5)
+
+
+def test_route_table_monitor(mock_routing):
+    routes = RouteTable()
+    monitor_ipr = mock_routing["linux"]().__enter__()
+    monitor_ipr.get.side_effect = [[{"event": "RTM_NEWROUTE"}], OSError("closed")]
+    routes.route(DESTINATION_IP)
+    routes._monitor()
+    monitor_ipr.bind.assert_called_once()
+    # the cache is dropped and disabled after the monitor stopped
+    assert not routes.monitoring
+    routes.route(DESTINATION_IP)
+    routes.route(DESTINATION_IP)
+    assert mock_routing["linux"]().route.call_count == 3
@@ -0,0 +1,121 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.exceptions import ConnectivityCheckException
+
+
+@pytest.fixture
+def mock_pipeline(mocker):
+    return mocker.patch("connectivity_check.datadog.pipeline").return_value
+
+
+def gauges(mock_pipeline) -> dict:
+    return {
+        (metric, tags): value
+        for (metric, value, tags), _ in mock_pipeline.gauge.call_args_list
+    }
+
+
+def test_checks_run_metrics(mock_pipeline, mocker, tmp_path):
+    def check_latency(self, target, delay=0):
+        time.sleep(delay)
+        return "OK"
+
+    mocker.patch.object(ConnectivityChecks, "check_latency", check_latency)
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"datadog": "prefix", "datadog_verbose": False},
+                "checks": [
+                    {"latency": {"target": "fast"}},
+                    {"latency": {"target": "slow", "delay": 0.5, "deadline": 0.1}},
+                ],
+            }
+        )
+    )
+    with pytest.raises(ConnectivityCheckException, match="Not all checks"):
+        ConnectivityChecks().checks(config_file, all=True)
+
+    metrics = gauges(mock_pipeline)
+    fast = ("target:fast",)
+    assert metrics["prefix.latency.run.timeout", fast] == 0
+    assert 0 <= metrics["prefix.latency.run.cpu", fast] < 100
+    assert metrics["prefix.latency.run.duration", fast] == pytest.approx(
+        metrics["prefix.latency.run.cpu", fast]
+        + metrics["prefix.latency.run.wait", fast]
+    )
+    slow = ("target:slow",)
+    assert metrics["prefix.latency.run.timeout", slow] == 1
+    assert 100 <= metrics["prefix.latency.run.duration", slow] < 500
+    # the CPU time of a check past its deadline is not known
+    assert ("prefix.latency.run.cpu", slow) not in metrics
+
+    batch = (f"target:{config_file}",)
+    assert metrics["prefix.batch.checks", batch] == 2
+    assert metrics["prefix.batch.failed", batch] == 1
+    assert (
+        0
+        < metrics["prefix.batch.setup", batch]
+        < metrics["prefix.batch.duration", batch]
+    )
+
+
+def test_checks_run_metrics_fail_fast(mock_pipeline, mocker, tmp_path):
+    mocker.patch.object(
+        ConnectivityChecks,
+        "check_latency",
+        side_effect=ConnectivityCheckException("failed"),
+    )
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"datadog": "prefix", "datadog_verbose": False},
+                "checks": [{"latency": {"target": "a"}}, {"latency": {"target": "b"}}],
+            }
+        )
+    )
+    with pytest.raises(ConnectivityCheckException, match="failed"):
+        ConnectivityChecks().checks(config_file)
+
+    metrics = gauges(mock_pipeline)
+    assert metrics["prefix.latency.run.timeout", ("target:a",)] == 0
+    assert ("prefix.latency.run.duration", ("target:b",)) not in metrics
+    batch = (f"target:{config_file}",)
+    assert metrics["prefix.batch.checks", batch] == 1
+    assert metrics["prefix.batch.failed", batch] == 1
+
+
+def test_run_metrics_not_in_history(mocker, tmp_path):
+    mocker.patch.object(ConnectivityChecks, "check_latency", return_value="OK")
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"history": True, "state_dir": str(tmp_path)},
+                "checks": [{"latency": {"target": "a"}}],
+            }
+        )
+    )
+    c = ConnectivityChecks()
+    c.checks(config_file)
+    assert "run." not in c.history(windows="1h")
+    assert "batch" not in c.history(windows="1h")
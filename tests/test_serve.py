@@ -0,0 +1,140 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import threading
+import time
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.plan import PlannedCheck
+from connectivity_check.serve import Scheduler
+from connectivity_check.exceptions import ConnectivityCheckException
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    return tmp_path / "config.yaml"
+
+
+def run_scheduler(scheduler: Scheduler, duration: float):
+    stop = threading.Event()
+    threading.Timer(duration, stop.set).start()
+    scheduler.run(stop)
+
+
+def test_scheduler_intervals(mocker, capsys):
+    mocks = mocker.patch.multiple(
+        ConnectivityChecks,
+        check_cert=mocker.DEFAULT,
+        check_content=mocker.DEFAULT,
+    )
+    mocks["check_cert"].return_value = "cert OK"
+    mocks["check_content"].side_effect = ConnectivityCheckException("content failed")
+    scheduler = Scheduler(
+        ConnectivityChecks(),
+        [
+            PlannedCheck("cert", {"target": "foo"}, {"interval": 0.1}),
+            PlannedCheck("content", {"target": "bar"}, {"jitter": 0.01}),
+        ],
+        parallel=2,
+        interval=1,
+    )
+    run_scheduler(scheduler, 0.55)
+    assert 5 <= mocks["check_cert"].call_count <= 7
+    assert mocks["check_content"].call_count == 1
+    mocks["check_cert"].assert_called_with(target="foo")
+    output = capsys.readouterr().out
+    assert "cert OK" in output
+    assert "content failed" in output
+    assert "Check check_content({'target': 'bar'}) FAILED" in output
+
+
+def test_scheduler_skips_running_checks(mocker, capsys):
+    check_latency = mocker.patch.object(
+        ConnectivityChecks, "check_latency", side_effect=lambda: time.sleep(0.35)
+    )
+    scheduler = Scheduler(
+        ConnectivityChecks(),
+        [PlannedCheck("latency", {}, {})],
+        parallel=2,
+        interval=0.1,
+    )
+    run_scheduler(scheduler, 0.3)
+    assert check_latency.call_count == 1
+    assert "Skipping check_latency({}), still running" in capsys.readouterr().out
+
+
+def test_serve(config_file, mocker):
+    config_content = {
+        "config": {"interval": 30, "jitter": 5, "parallel": 3, "deadline": 20},
+        "checks": [{"cert": {"target": "foo", "interval": 10}}],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    scheduler = mocker.patch("connectivity_check.serve.Scheduler")
+    c = ConnectivityChecks()
+    c.serve(config_file)
+    scheduler.assert_called_once_with(
+        c,
+        [("cert", {"target": "foo"}, {"interval": 10})],
+        parallel=3,
+        interval=30,
+        jitter=5,
+        deadline=20,
+    )
+    scheduler().run.assert_called_once_with()
+
+
+def test_serve_defaults(config_file, mocker):
+    config_file.write_text(yaml.safe_dump({"checks": [{"cert": {}}]}))
+    scheduler = mocker.patch("connectivity_check.serve.Scheduler")
+    c = ConnectivityChecks()
+    c.serve(config_file, parallel=2)
+    scheduler.assert_called_once_with(
+        c, [("cert", {}, {})], parallel=2, interval=60, jitter=0, deadline=None
+    )
+
+
+def test_serve_shard(config_file, mocker):
+    config_content = {
+        "checks": [{"cert": {"target": str(index)}} for index in range(10)],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    scheduler = mocker.patch("connectivity_check.serve.Scheduler")
+    c = ConnectivityChecks()
+    for index in range(2):
+        c.serve(config_file, shard_index=index, shard_count=2)
+    shards = [call.args[1] for call in scheduler.call_args_list]
+    assert shards[0] and shards[1]
+    targets = sorted(planned.kwargs["target"] for planned in shards[0] + shards[1])
+    assert targets == sorted(str(index) for index in range(10))
+
+
+def test_scheduler_deadline(mocker, capsys):
+    mocker.patch.object(
+        ConnectivityChecks, "check_cert", side_effect=lambda: time.sleep(1)
+    )
+    scheduler = Scheduler(
+        ConnectivityChecks(),
+        [PlannedCheck("cert", {}, {"deadline": 0.1})],
+        interval=10,
+        deadline=5,
+    )
+    assert scheduler.deadlines == [0.1]
+    run_scheduler(scheduler, 0.3)
+    output = capsys.readouterr().out
+    assert "check_cert exceeded its deadline of 0.1s after 0.1s" in output
+    assert "Check check_cert({}) FAILED" in output
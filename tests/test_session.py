@@ -0,0 +1,231 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import socket
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+import yaml
+
+from benchmarks.servers import _self_signed_certificate
+from connectivity_check import ConnectivityChecks
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.profiling import tracing
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = b"Lorem ipsum dolor sit amet"
+        if self.path == "/big":
+            body += b"x" * 1_000_000
+        if self.path == "/cookie":
+            body = f"Cookie: {self.headers.get('Cookie')}".encode()
+        self.send_response(200)
+        self.send_header("Set-Cookie", "session=1; Path=/")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # client stopped reading
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def https_server(tmp_path):
+    "HTTPS variant of http_server, yields the base URL and the CA file"
+    ca = _self_signed_certificate(tmp_path)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*ca)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"https://localhost:{server.server_address[1]}", str(ca[0])
+    server.shutdown()
+    server.server_close()
+
+
+def test_http_get_reuses_connection(http_server):
+    c = ConnectivityChecks()
+    assert c._http_summary() is None
+    results = [c.check_content(http_server + "/page", "Lorem") for _ in range(3)]
+    assert results[0] == f"Content from {http_server}/page matches »Lorem«"
+    assert results[1] == results[0] + " (reused connection)"
+    assert results[2] == results[0] + " (reused connection)"
+    assert c._http_summary() == "3 HTTP requests, 2 on reused connections"
+
+
+def test_http_get_without_keep_alive(http_server):
+    c = ConnectivityChecks()
+    c._update_config(http_keep_alive=False, http_pool_size=2)
+    response, reused = c._http_get(http_server)
+    assert response.text == "Lorem ipsum dolor sit amet"
+    assert response.request.headers["Connection"] == "close"
+    assert not reused
+    assert not c._http_get(http_server)[1]
+    assert c._sessions[True].get_adapter(http_server)._pool_maxsize == 2
+
+
+def test_checks_http_summary(http_server, tmp_path, capsys):
+    config_file = tmp_path / "config.yaml"
+    config_content = {
+        "config": {"http_pool_size": 4},
+        "checks": [
+            {"content": {"target": http_server, "content": content}}
+            for content in ("Lorem", "ipsum")
+        ],
+    }
+    config_file.write_text(yaml.safe_dump(config_content))
+    ConnectivityChecks().checks(config_file)
+    output = capsys.readouterr().out
+    assert "2 HTTP requests, 1 on reused connections" in output
+
+
+def test_http_get_resolution_error(mocker):
+    mocker.patch(
+        "connectivity_check.session.getaddress",
+        side_effect=socket.gaierror("no such host"),
+    )
+    with pytest.raises(requests.ConnectionError, match="no such host"):
+        ConnectivityChecks().check_content("https://nonexisting.example.com/")
+
+
+def test_http_get_uses_resolver(http_server, mocker):
+    getaddress = mocker.patch(
+        "connectivity_check.session.getaddress", return_value="127.0.0.1"
+    )
+    url = http_server.replace("127.0.0.1", "example.com")
+    result = ConnectivityChecks().check_content(url, "Lorem")
+    assert result == f"Content from {url} matches »Lorem«"
+    getaddress.assert_called_once_with("example.com")
+
+
+def test_http_get_ipv6():
+    class IPv6Server(ThreadingHTTPServer):
+        address_family = socket.AF_INET6
+
+    server = IPv6Server(("::1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://[::1]:{server.server_address[1]}/"
+    try:
+        for dns_cache in (True, False):
+            result = ConnectivityChecks().check_content(
+                url, "Lorem", dns_cache=dns_cache
+            )
+            assert result == f"Content from {url} matches »Lorem«"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_get_request_span(http_server, tmp_path):
+    trace_file = tmp_path / "trace.json"
+    with tracing(trace_file):
+        ConnectivityChecks().check_content(http_server, "Lorem")
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    spans = {event["name"]: event for event in events}
+    request, connect = spans["request"], spans["connect"]
+    # the request span covers the connection set-up and the response
+    assert request["ts"] <= connect["ts"]
+    assert connect["ts"] + connect["dur"] <= request["ts"] + request["dur"]
+
+
+def test_check_content_stops_reading(http_server):
+    c = ConnectivityChecks()
+    c.check_content(http_server + "/big", "Lorem")
+    # the unread rest of the body forces a new connection
+    assert c.check_content(http_server + "/big", "Lorem").endswith("»Lorem«")
+    assert c._http_summary() == "2 HTTP requests, 0 on reused connections"
+
+
+def test_check_content_max_bytes(http_server):
+    with pytest.raises(
+        ConnectivityCheckException,
+        match="fails content match »amet x« in the first 5000 bytes",
+    ):
+        ConnectivityChecks().check_content(
+            http_server + "/big", "amet x", max_bytes=5000
+        )
+
+
+def test_http_get_phases(http_server):
+    c = ConnectivityChecks()
+    first = c._http_get(http_server)[0].phases
+    assert list(first) == ["dns", "connect", "tls", "ttfb", "transfer", "total"]
+    assert first["connect"] > 0 and first["ttfb"] > 0 and first["tls"] == 0
+    assert first["total"] == pytest.approx(sum(list(first.values())[:-1]))
+    # a reused connection skips the set-up
+    second = c._http_get(http_server)[0].phases
+    assert second["dns"] == second["connect"] == second["tls"] == 0
+    assert second["total"] == pytest.approx(second["ttfb"] + second["transfer"])
+
+
+def test_http_get_tls_phase(https_server):
+    url, ca = https_server
+    response = ConnectivityChecks()._http_get(url, verify=ca)[0]
+    assert response.text == "Lorem ipsum dolor sit amet"
+    assert response.phases["connect"] > 0 and response.phases["tls"] > 0
+
+
+def test_check_content_phases(http_server, mocker):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    c = ConnectivityChecks()
+    result = c.check_content(http_server, "Lorem", phases={"total": 10_000})
+    assert result == f"Content from {http_server} matches »Lorem«"
+    assert datadog.call_args_list[0].kwargs["values"] is True
+    timing = datadog.call_args_list[1].kwargs
+    assert timing["check"] == "content" and timing["target"] == http_server
+    assert set(timing["values"]) == {
+        "dns",
+        "connect",
+        "tls",
+        "ttfb",
+        "transfer",
+        "total",
+    }
+
+
+def test_http_get_without_cookies(http_server):
+    c = ConnectivityChecks()
+    c._http_get(http_server)
+    assert c._http_get(http_server + "/cookie")[0].text == "Cookie: None"
+
+
+def test_http_get_session_per_ca(https_server):
+    url, ca = https_server
+    c = ConnectivityChecks()
+    assert not c._http_get(url, verify=ca)[1]
+    assert c._http_get(url, verify=ca)[1]
+    # a connection verified with one CA bundle is not used for another
+    with pytest.raises(requests.exceptions.SSLError):
+        c._http_get(url)
+    assert set(c._sessions) == {ca, True}
@@ -0,0 +1,153 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import Counter
+
+import pytest
+import yaml
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.exceptions import ConnectivityCheckException
+from connectivity_check.plan import PlannedCheck
+from connectivity_check.shard import assign, select_shard
+
+CHECK_IDS = [f"content https://example.com/{index}" for index in range(2000)]
+
+
+def test_assign_balanced():
+    nodes = ["a", "b", "c", "d"]
+    counts = Counter(assign(check_id, nodes) for check_id in CHECK_IDS)
+    assert set(counts) == set(nodes)
+    assert all(400 < count < 600 for count in counts.values())
+
+
+def test_assign_moves_few_checks():
+    before = {
+        check_id: assign(check_id, ["a", "b", "c", "d"]) for check_id in CHECK_IDS
+    }
+    after = {
+        check_id: assign(check_id, ["a", "b", "c", "d", "e"]) for check_id in CHECK_IDS
+    }
+    moved = [check_id for check_id in CHECK_IDS if before[check_id] != after[check_id]]
+    # only the checks of the new node move
+    assert {after[check_id] for check_id in moved} == {"e"}
+    assert 300 < len(moved) < 500
+    # removing a node only moves its own checks
+    removed = {check_id: assign(check_id, ["a", "c", "d"]) for check_id in CHECK_IDS}
+    assert all(
+        before[check_id] == removed[check_id]
+        for check_id in CHECK_IDS
+        if before[check_id] != "b"
+    )
+
+
+def planned_checks() -> list[PlannedCheck]:
+    return [
+        PlannedCheck("content", {"target": f"https://example.com/{index}"}, {})
+        for index in range(30)
+    ] + [
+        PlannedCheck("routing", {"target": "foo"}, {}),
+        PlannedCheck("speed_ookla", {}, {"everywhere": False}),
+        PlannedCheck("cert", {"target": "foo"}, {"everywhere": True}),
+    ]
+
+
+def test_select_shard_by_index(capsys):
+    checks_to_run = planned_checks()
+    c = ConnectivityChecks()
+    assert select_shard(c, checks_to_run) is checks_to_run
+    shards = [select_shard(c, checks_to_run, index, 3) for index in range(3)]
+    runs = Counter(planned.description for shard in shards for planned in shard)
+    everywhere = {
+        "Check check_routing({'target': 'foo'})",
+        "Check check_cert({'target': 'foo'})",
+    }
+    assert {
+        description for description, count in runs.items() if count == 3
+    } == everywhere
+    # all other checks run exactly once
+    assert len(runs) == len(checks_to_run)
+    assert sum(runs.values()) == len(checks_to_run) + 4
+    assert (
+        f"Shard 0 of 3 nodes runs {len(shards[0])} of 33 checks"
+        in capsys.readouterr().out
+    )
+
+
+def test_select_shard_by_node_name(mocker):
+    c = ConnectivityChecks()
+    c._update_config(shard_nodes=["probe-1", "probe-2"])
+    mocker.patch("socket.gethostname", return_value="probe-2")
+    by_host_name = select_shard(c, planned_checks())
+    assert by_host_name == select_shard(c, planned_checks(), shard_node="probe-2")
+    assert by_host_name != select_shard(c, planned_checks(), shard_node="probe-1")
+    # explicit index and count take precedence over the node names
+    assert select_shard(c, planned_checks(), 1, 2) == select_shard(
+        ConnectivityChecks(), planned_checks(), 1, 2
+    )
+
+
+@pytest.mark.parametrize(
+    "shard, message",
+    [
+        ({"shard_index": 1}, "Set both shard_index and shard_count"),
+        ({"shard_count": 2}, "Set both shard_index and shard_count"),
+        ({"shard_index": 2, "shard_count": 2}, "between 0 and 1"),
+        (
+            {"shard_node": "probe-3"},
+            "Node probe-3 is not in shard_nodes probe-1, probe-2",
+        ),
+    ],
+)
+def test_select_shard_errors(shard, message):
+    c = ConnectivityChecks()
+    c._update_config(shard_nodes=["probe-1", "probe-2"])
+    with pytest.raises(ConnectivityCheckException, match=message):
+        select_shard(c, planned_checks(), **shard)
+
+
+def test_checks_shard(mocker, tmp_path, capsys):
+    check_content = mocker.patch.object(
+        ConnectivityChecks, "check_content", return_value="OK"
+    )
+    check_routing = mocker.patch.object(
+        ConnectivityChecks, "check_routing", return_value="OK"
+    )
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump(
+            {
+                "config": {"shard_nodes": ["probe-1", "probe-2"]},
+                "checks": [
+                    {"content": {"target": f"https://example.com/{index}"}}
+                    for index in range(10)
+                ]
+                + [{"routing": {"target": "foo"}}],
+            }
+        )
+    )
+    for node in ("probe-1", "probe-2"):
+        ConnectivityChecks().checks(config_file, shard_node=node)
+    assert check_content.call_count == 10
+    assert check_routing.call_count == 2
+    assert "Shard probe-2 of 2 nodes runs" in capsys.readouterr().out
+
+
+def test_invalid_shard_nodes(tmp_path):
+    config_file = tmp_path / "config.yaml"
+    config_file.write_text(
+        yaml.safe_dump({"config": {"shard_nodes": []}, "checks": [{"cert": {}}]})
+    )
+    with pytest.raises(ConnectivityCheckException, match="shard_nodes must be a list"):
+        ConnectivityChecks().checks(config_file)
@@ -0,0 +1,60 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from freezegun import freeze_time
+
+from connectivity_check import ConnectivityChecks
+from connectivity_check.speed_cache import describe_age, speed_result
+
+
+def measure():
+    return {"download": 100, "upload": 10, "latency": 5, "server": "foo"}
+
+
+def test_speed_result(state_home):
+    c = ConnectivityChecks()
+    results_file = state_home / "connectivity-check" / "speed.json"
+    with freeze_time("2023-06-01 12:00:00"):
+        result = speed_result(c, "speed", "foo", 600, measure)
+    assert result == dict(measure(), measured_at=1685620800.0, age=0)
+    assert json.loads(results_file.read_text()) == {
+        "speed:foo": dict(measure(), measured_at=1685620800.0)
+    }
+    assert describe_age(result) == ""
+
+    with freeze_time("2023-06-01 12:09:59"):
+        result = speed_result(c, "speed", "foo", 600, None)
+    assert result["age"] == 599
+    assert describe_age(result) == " (cached, measured 599s ago)"
+
+    with freeze_time("2023-06-01 12:10:00"):
+        assert speed_result(c, "speed", "foo", 600, measure)["age"] == 0
+        # results from the future are not used
+    with freeze_time("2023-06-01 11:00:00"):
+        assert speed_result(c, "speed", "foo", 600, measure)["age"] == 0
+
+
+def test_speed_result_without_min_interval(state_home):
+    assert speed_result(ConnectivityChecks(), "speed", "foo", 0, measure)["age"] == 0
+    assert not (state_home / "connectivity-check" / "speed.json").exists()
+
+
+def test_speed_result_broken_file(state_home):
+    results_file = state_home / "connectivity-check" / "speed.json"
+    results_file.parent.mkdir(parents=True)
+    results_file.write_text("{broken")
+    assert speed_result(ConnectivityChecks(), "speed", "foo", 60, measure)["age"] == 0
+    assert list(json.loads(results_file.read_text())) == ["speed:foo"]
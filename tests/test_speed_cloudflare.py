@@ -111,3 +111,18 @@ def test_cloudflare_upload_error(mocker, cloudflare_result):
         ConnectivityCheckException, match="Speedtest insufficient.*U:1.1.*Mb/s"
     ):
         c.check_speed_cloudflare()
+
+
+def test_cloudflare_min_interval(mocker, cloudflare_result):
+    runalltests = mocker.patch(
+        "cloudflarepycli.cloudflareclass.cloudflare.runalltests",
+        return_value=cloudflare_result,
+    )
+    c = ConnectivityChecks()
+    c._update_config(speed_min_interval=3600)
+    c.check_speed_cloudflare()
+    result = c.check_speed_cloudflare()
+    assert result.endswith("at 17.94 ms (cached, measured 0s ago)")
+    assert runalltests.call_count == 1
+    c.check_speed_cloudflare(min_interval=0)
+    assert runalltests.call_count == 2
@@ -12,16 +12,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import socket
+import time
+
 import pytest
+import speedtest
 from box import Box
 
 from speedtest import NoMatchedServers
 
 from connectivity_check import ConnectivityChecks
+from connectivity_check.check_speed_ookla import _cache, _probe
 from connectivity_check.exceptions import ConnectivityCheckException
 
 server = {
-    "url": "http://example-speedtest-server.com:8080",
+    "url": "http://example-speedtest-server.com:8080/speedtest/upload.php",
     "lat": "12.34",
     "lon": "56.78",
     "name": "Test Server",
@@ -31,30 +36,55 @@ server = {
     "id": "12345",
     "host": "example-speedtest-server.com:8080",
     "d": 123.123,
-    "latency": 10,
 }
+other_server = dict(server, id="23456", d=234.234, url="http://other.example.com/")
 
-results = Box(
-    {
-        "download": 100 * 1024 * 1024,
-        "upload": 10 * 1024 * 1024,
-        "ping": 10,
-        "server": server,
-    }
-)
+config = {"client": {"ip": "192.0.2.1", "lat": "12.3", "lon": "56.7"}}
 
 
 @pytest.fixture
 def mock_speedtest(mocker):
-    global server, results
-    mock = mocker.patch("speedtest.Speedtest")
-    mock().servers = {123.123: [server]}
-    mock().get_best_server.return_value = server
-    mock().get_closest_servers.return_value = [server]
-    # key is distance and value is a list of servers, usually contains only one server
-    mock().get_servers.return_value = mock().servers
-    mock().results = results
-    return mock
+    "Replace the network access of the speedtest client"
+
+    def get_config(self):
+        self.config = dict(config)
+        self.lat_lon = (12.3, 56.7)
+        return self.config
+
+    def get_servers(self, servers=None, exclude=None):
+        self.servers = {
+            candidate["d"]: [dict(candidate)]
+            for candidate in (server, other_server)
+            if not servers or int(candidate["id"]) in servers
+        }
+        if not self.servers:
+            raise NoMatchedServers()
+        return self.servers
+
+    def download(self):
+        self.results.download = 100 * 1024 * 1024
+
+    def upload(self):
+        self.results.upload = 10 * 1024 * 1024
+
+    mocks = Box(
+        {
+            name: mocker.patch.object(
+                speedtest.Speedtest, name, autospec=True, side_effect=function
+            )
+            for name, function in [
+                ("get_config", get_config),
+                ("get_servers", get_servers),
+                ("download", download),
+                ("upload", upload),
+            ]
+        }
+    )
+    mocks.probe = mocker.patch(
+        "connectivity_check.check_speed_ookla._probe",
+        side_effect=lambda candidate: {"12345": 10.4, "23456": 20}[candidate["id"]],
+    )
+    return mocks
 
 
 def test_speed_ookla(mock_speedtest):
@@ -63,6 +93,8 @@ def test_speed_ookla(mock_speedtest):
         result
         == "Speedtest to 12345 (example-speedtest-server.com:8080 by Test Sponsor in Test Server, Testland) D:100 U:10 MB/s at 10 ms"
     )
+    # the closest servers are measured concurrently
+    assert mock_speedtest.probe.call_count == 2
 
 
 def test_speed_ookla_target(mock_speedtest):
@@ -71,10 +103,10 @@ def test_speed_ookla_target(mock_speedtest):
         result
         == "Speedtest to 12345 (example-speedtest-server.com:8080 by Test Sponsor in Test Server, Testland) D:100 U:10 MB/s at 10 ms"
     )
+    mock_speedtest.probe.assert_called_once()
 
 
 def test_speed_ookla_target_invalid(mock_speedtest):
-    mock_speedtest().get_servers.side_effect = NoMatchedServers
     with pytest.raises(
         ConnectivityCheckException, match="Speedtest server 54321 is invalid"
     ):
@@ -88,7 +120,7 @@ def test_speed_ookla_target_zero(capsys, mock_speedtest):
         captured.out
         == "Set the TARGET to a speedtest.net server ID. Here are the closest servers:\n"
     )
-    assert result == [server]
+    assert result == [server, other_server]
 
 
 def test_speed_ookla_too_slow(mock_speedtest):
@@ -98,3 +130,125 @@ def test_speed_ookla_too_slow(mock_speedtest):
         ConnectivityChecks().check_speed_ookla(
             target=12345, latency=5, download=50, upload=20
         )
+
+
+def test_speed_ookla_unreachable(mock_speedtest):
+    mock_speedtest.probe.side_effect = None
+    mock_speedtest.probe.return_value = None
+    with pytest.raises(
+        ConnectivityCheckException, match="No speedtest server is reachable"
+    ):
+        ConnectivityChecks().check_speed_ookla()
+
+
+def test_speed_ookla_cache(mock_speedtest, state_home):
+    c = ConnectivityChecks()
+    c.check_speed_ookla()
+    assert (state_home / "connectivity-check" / "ookla.json").exists()
+    assert mock_speedtest.get_config.call_count == 1
+    assert mock_speedtest.get_servers.call_count == 1
+    mock_speedtest.probe.reset_mock()
+
+    # config and server list come from the cache, only the best server is measured
+    c.check_speed_ookla()
+    assert mock_speedtest.get_config.call_count == 1
+    assert mock_speedtest.get_servers.call_count == 1
+    assert [args.args[0]["id"] for args in mock_speedtest.probe.call_args_list] == [
+        "12345"
+    ]
+    assert c.check_speed_ookla(target=23456).startswith("Speedtest to 23456")
+
+    # the remembered server is unreachable, all closest servers are measured again
+    mock_speedtest.probe.reset_mock()
+    mock_speedtest.probe.side_effect = lambda candidate: {"23456": 30}.get(
+        candidate["id"]
+    )
+    assert c.check_speed_ookla().startswith("Speedtest to 23456")
+    assert mock_speedtest.probe.call_count == 3
+    mock_speedtest.probe.reset_mock()
+    c.check_speed_ookla()
+    assert mock_speedtest.probe.call_count == 1
+
+
+def test_speed_ookla_cache_expired(mock_speedtest, state_home):
+    c = ConnectivityChecks()
+    c._update_config(ookla_cache_ttl=0.05)
+    c.check_speed_ookla()
+    c.check_speed_ookla()
+    assert mock_speedtest.get_config.call_count == 1
+    time.sleep(0.06)
+    c.check_speed_ookla()
+    assert mock_speedtest.get_config.call_count == 2
+    assert mock_speedtest.get_servers.call_count == 2
+
+
+def test_speed_ookla_without_cache(mock_speedtest, state_home):
+    c = ConnectivityChecks()
+    c.check_speed_ookla(cache_ttl=0)
+    c.check_speed_ookla(cache_ttl=0)
+    assert mock_speedtest.get_config.call_count == 2
+    assert mock_speedtest.probe.call_count == 4
+    assert not (state_home / "connectivity-check" / "ookla.json").exists()
+
+
+def test_speed_ookla_remembered_server_gone(mock_speedtest):
+    c = ConnectivityChecks()
+    c.check_speed_ookla()
+    # the remembered server is no longer in the server list
+    _cache(c).put("best:192.0.2.1", "99999")
+    mock_speedtest.probe.reset_mock()
+    c.check_speed_ookla()
+    assert mock_speedtest.probe.call_count == 2
+
+
+def test_speed_ookla_min_interval(mock_speedtest, mocker, state_home):
+    datadog = mocker.patch.object(ConnectivityChecks, "_datadog")
+    c = ConnectivityChecks()
+    c.check_speed_ookla(target=12345, min_interval=3600)
+    assert (state_home / "connectivity-check" / "speed.json").exists()
+    assert datadog.call_args.kwargs["values"]["age"] == 0
+    mock_speedtest.download.reset_mock()
+    result = c.check_speed_ookla(target=12345, min_interval=3600)
+    assert result.startswith("Speedtest to 12345")
+    assert result.endswith("at 10 ms (cached, measured 0s ago)")
+    mock_speedtest.download.assert_not_called()
+    # the cached result is evaluated against the thresholds again
+    with pytest.raises(ConnectivityCheckException, match=r"\(150\).*cached"):
+        c.check_speed_ookla(target=12345, download=150, min_interval=3600)
+    # other servers are measured
+    c.check_speed_ookla(min_interval=3600)
+    mock_speedtest.download.assert_called_once()
+
+
+@pytest.fixture
+def listening_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen(10)
+        yield listener.getsockname()[1]
+
+
+def test_probe(listening_port):
+    assert _probe({"url": f"http://127.0.0.1:{listening_port}/upload.php"}) > 0
+
+
+def test_probe_unreachable(mocker):
+    mocker.patch(
+        "connectivity_check.check_speed_ookla.gethostbyname",
+        side_effect=socket.gaierror("no such host"),
+    )
+    assert _probe({"url": "http://example.invalid/upload.php"}) is None
+
+
+@pytest.mark.parametrize(
+    "url, port", [("http://foo/upload.php", 80), ("https://foo/upload.php", 443)]
+)
+def test_probe_default_port(mocker, url, port):
+    mocker.patch(
+        "connectivity_check.check_speed_ookla.gethostbyname", return_value="192.0.2.1"
+    )
+    measure = mocker.patch(
+        "connectivity_check.check_speed_ookla.measure", return_value=[None] * 3
+    )
+    assert _probe({"url": url}) is None
+    measure.assert_called_once_with("192.0.2.1", port, 2, 3, wait=0)
@@ -0,0 +1,75 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+# import time budget in seconds for the CLI module including a single check
+STARTUP_BUDGET = 0.5
+
+HEAVY_MODULES = [
+    "speedtest",
+    "cloudflarepycli",
+    "cryptography.x509",
+    "requests",
+    "requests_toolbelt",
+    "datadog",
+    "httpx",
+    "dns.resolver",
+    "scapy",
+    "pyroute2",
+]
+
+STARTUP_BENCHMARK = """
+import json, sys, time
+start = time.perf_counter()
+from connectivity_check.__main__ import ConnectivityChecks
+ConnectivityChecks().{check}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def startup(check: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP_BENCHMARK.format(check=check)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+@pytest.mark.parametrize(
+    "check,allowed",
+    [
+        ("check_latency", []),
+        ("check_cert", ["cryptography.x509"]),
+        ("check_content", ["requests"]),
+    ],
+)
+def test_startup_loads_only_needed_modules(check, allowed):
+    result = startup(check)
+    loaded = [module for module in HEAVY_MODULES if module in result["modules"]]
+    assert loaded == allowed
+
+
+def test_startup_budget():
+    # best of three to ignore noise from other processes
+    elapsed = min(startup("check_latency")["elapsed"] for _ in range(3))
+    assert elapsed < STARTUP_BUDGET, f"start-up took {elapsed:.3f}s"
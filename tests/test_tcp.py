@@ -0,0 +1,79 @@
+#     Copyright 2023 Forto Logistics AG & Co. KG.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import sys
+
+import pytest
+
+from connectivity_check import tcp
+from connectivity_check.tcp import ConnectSample, connect_sample, kernel_rtt, measure
+
+
+@pytest.fixture
+def listening_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        yield server.getsockname()[1]
+
+
+@pytest.fixture
+def closed_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("127.0.0.1", 0))
+        return server.getsockname()[1]
+
+
+def test_connect_sample(listening_port):
+    sample = connect_sample("127.0.0.1", listening_port, 1)
+    assert 0 < sample.connect < 1000
+    if sys.platform == "linux":
+        assert 0 <= sample.rtt < 1000 and sample.rttvar >= 0
+    assert sample.value() == sample.connect
+
+
+def test_connect_sample_failed(closed_port):
+    assert connect_sample("127.0.0.1", closed_port, 1) is None
+
+
+def test_kernel_rtt_unavailable(mocker, monkeypatch):
+    monkeypatch.delattr(socket, "TCP_INFO", raising=False)
+    assert kernel_rtt(mocker.Mock()) == (None, None)
+
+
+@pytest.mark.skipif(not hasattr(socket, "TCP_INFO"), reason="Linux only")
+def test_kernel_rtt_errors(mocker):
+    sock = mocker.Mock()
+    sock.getsockopt.side_effect = OSError("not connected")
+    assert kernel_rtt(sock) == (None, None)
+    sock.getsockopt.side_effect = None
+    sock.getsockopt.return_value = b"\0" * 16
+    assert kernel_rtt(sock) == (None, None)
+
+
+def test_sample_value():
+    assert ConnectSample(2.0, 1.0, 0.5).value(kernel_rtt=True) == 1.0
+    assert ConnectSample(2.0, None, None).value(kernel_rtt=True) == 2.0
+
+
+def test_measure(listening_port, closed_port, capsys):
+    assert len([s for s in measure("127.0.0.1", listening_port, 1, 2, 0) if s]) == 2
+    failed = measure("127.0.0.1", closed_port, 1, 4, concurrency=2, verbose=True)
+    assert failed == [None] * 4
+    assert capsys.readouterr().out.count("failed") == 4
+
+
+def test_describe():
+    assert tcp.describe(ConnectSample(1.5, None, None)) == "time=1.50 ms"